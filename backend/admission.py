@@ -0,0 +1,141 @@
+import asyncio
+import heapq
+import itertools
+import threading
+import time
+
+
+class AdmissionRejected(Exception):
+    def __init__(self, reason: str):
+        super().__init__(reason)
+        self.reason = reason
+
+
+class _Waiter:
+    __slots__ = ('deadline', 'loop', 'future', 'granted', 'cancelled')
+
+    def __init__(self, deadline: float, loop, future):
+        self.deadline = deadline
+        self.loop = loop
+        self.future = future
+        self.granted = False
+        self.cancelled = False
+
+
+def _wake(future):
+    if not future.done():
+        future.set_result(True)
+
+
+class AdmissionController:
+    # Caps concurrent upstream calls per process with an AIMD limit: each
+    # call that finishes under target_latency grows the limit by about one
+    # per limit's worth of calls; a slow, timed-out or throttled call cuts
+    # it by `backoff`. Callers over the limit wait in a bounded queue ordered
+    # by deadline (earliest first). A caller is turned away immediately if
+    # the queue is full or its deadline is closer than the typical latency.
+    # Latency is only measured on admitted calls, so with nothing in flight
+    # such a caller goes through anyway as a probe, and each rejection moves
+    # the estimate toward target_latency; otherwise shedding would never end.
+    #
+    # Async views run on their own event loop per request, so waiters are
+    # woken across threads with call_soon_threadsafe.
+    def __init__(self, initial_limit: float = 4, min_limit: float = 1, max_limit: float = 8,
+                 target_latency: float = 5.0, backoff: float = 0.7, max_queue: int = 4):
+        self.limit = float(initial_limit)
+        self.min_limit = float(min_limit)
+        self.max_limit = float(max_limit)
+        self.target_latency = target_latency
+        self.backoff = backoff
+        self.max_queue = max_queue
+        self.in_flight = 0
+        self.latency = None
+        self.rejected = {"queue_full": 0, "deadline": 0}
+        self._queue = []
+        self._queued = 0
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+
+    def expected_latency(self) -> float:
+        return self.latency if self.latency is not None else 0.0
+
+    async def acquire(self, deadline: float):
+        # deadline is a time.monotonic() value
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            remaining = deadline - time.monotonic()
+            if remaining <= self.expected_latency():
+                if self.in_flight or self._queued or remaining <= 0:
+                    self.rejected["deadline"] += 1
+                    if self.latency is not None:
+                        self.latency = 0.8 * self.latency + 0.2 * min(self.latency, self.target_latency)
+                    raise AdmissionRejected('deadline')
+                self.in_flight += 1
+                return
+            if self.in_flight < int(self.limit) and not self._queued:
+                self.in_flight += 1
+                return
+            if self._queued >= self.max_queue:
+                self.rejected["queue_full"] += 1
+                raise AdmissionRejected('queue_full')
+            waiter = _Waiter(deadline, loop, loop.create_future())
+            heapq.heappush(self._queue, (deadline, next(self._seq), waiter))
+            self._queued += 1
+
+        try:
+            # leave enough time for the call itself once admitted
+            await asyncio.wait_for(asyncio.shield(waiter.future), max(0.0, remaining - self.expected_latency()))
+        except asyncio.TimeoutError:
+            with self._lock:
+                if not waiter.granted:
+                    self._cancel(waiter)
+                    self.rejected["deadline"] += 1
+                    raise AdmissionRejected('deadline')
+        except asyncio.CancelledError:
+            with self._lock:
+                if waiter.granted:
+                    self.in_flight -= 1
+                    self._admit_waiters()
+                else:
+                    self._cancel(waiter)
+            raise
+
+    def _cancel(self, waiter: _Waiter):
+        if not waiter.cancelled:
+            waiter.cancelled = True
+            self._queued -= 1
+
+    def release(self, latency: float, congested: bool = False):
+        with self._lock:
+            self.in_flight -= 1
+            self.latency = latency if self.latency is None else 0.8 * self.latency + 0.2 * latency
+            if congested or latency > self.target_latency:
+                self.limit = max(self.min_limit, self.limit * self.backoff)
+            else:
+                self.limit = min(self.max_limit, self.limit + 1.0 / self.limit)
+            self._admit_waiters()
+
+    def _admit_waiters(self):
+        now = time.monotonic()
+        while self._queue and self.in_flight < int(self.limit):
+            _, _, waiter = heapq.heappop(self._queue)
+            if waiter.cancelled:
+                continue
+            if waiter.deadline <= now:
+                # its own timeout will report the rejection
+                self._cancel(waiter)
+                continue
+            self._queued -= 1
+            waiter.granted = True
+            self.in_flight += 1
+            waiter.loop.call_soon_threadsafe(_wake, waiter.future)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "limit": round(self.limit, 2),
+                "inFlight": self.in_flight,
+                "queued": self._queued,
+                "latencyMs": round(self.latency * 1000, 1) if self.latency is not None else None,
+                "rejected": dict(self.rejected),
+            }
@@ -0,0 +1,380 @@
+import json
+import os
+import shutil
+import sys
+import threading
+from array import array
+from collections import defaultdict
+from datetime import datetime
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Snapshots are directories of flat column files: integers as raw int32
+# arrays, strings dictionary-encoded into int32 codes. A whole column loads
+# with one read. With numpy installed, reports run as vectorized operations
+# over zero-copy views of the columns; otherwise they fall back to single
+# Python passes over the arrays. Neither touches the OLTP database.
+NULL = -2 ** 31
+INT_TYPECODE = 'i'
+MANIFEST = 'manifest.json'
+
+AGE_BANDS = ((18, 'under 18'), (25, '18-24'), (35, '25-34'), (45, '35-44'), (None, '45+'))
+IRREGULAR_RANGE_DAYS = 7
+
+
+def age_band(date_of_birth, today) -> str:
+    if date_of_birth is None:
+        return 'unknown'
+    age = today.year - date_of_birth.year - ((today.month, today.day) < (date_of_birth.month, date_of_birth.day))
+    for upper, label in AGE_BANDS:
+        if upper is None or age < upper:
+            return label
+
+
+class _ColumnBuilder:
+    def __init__(self, kind: str):
+        self.kind = kind
+        self.values = array(INT_TYPECODE)
+        self.dictionary = {} if kind == 'str' else None
+
+    def append(self, value):
+        if value is None:
+            self.values.append(NULL)
+        elif self.dictionary is not None:
+            self.values.append(self.dictionary.setdefault(value, len(self.dictionary)))
+        else:
+            self.values.append(int(value))
+
+
+class SnapshotWriter:
+    # Writes into a temporary directory that is renamed into place on commit,
+    # so readers never see a partial snapshot.
+    def __init__(self, root: str, created_at: datetime = None):
+        self.root = root
+        self.created_at = created_at or datetime.utcnow()
+        self.snapshot_id = self.created_at.strftime('%Y%m%dT%H%M%S')
+        self.tmp_path = os.path.join(root, f'.{self.snapshot_id}.tmp')
+        self.tables = {}
+        os.makedirs(self.tmp_path, exist_ok=True)
+
+    def write_table(self, name: str, columns: tuple, rows) -> int:
+        builders = [_ColumnBuilder(kind) for _, kind in columns]
+        count = 0
+        for row in rows:
+            for builder, value in zip(builders, row):
+                builder.append(value)
+            count += 1
+        spec = {}
+        for (column, kind), builder in zip(columns, builders):
+            with open(os.path.join(self.tmp_path, f'{name}.{column}.bin'), 'wb') as f:
+                builder.values.tofile(f)
+            spec[column] = {"kind": kind}
+            if builder.dictionary is not None:
+                spec[column]["dictionary"] = list(builder.dictionary)
+        self.tables[name] = {"rows": count, "columns": spec}
+        return count
+
+    def commit(self, retention: int = None) -> str:
+        with open(os.path.join(self.tmp_path, MANIFEST), 'w') as f:
+            json.dump({
+                "id": self.snapshot_id,
+                "createdAt": self.created_at.isoformat(),
+                "byteorder": sys.byteorder,
+                "tables": self.tables,
+            }, f)
+        path = os.path.join(self.root, self.snapshot_id)
+        if os.path.exists(path):
+            shutil.rmtree(path)
+        os.rename(self.tmp_path, path)
+        if retention:
+            for old in list_snapshots(self.root)[:-retention]:
+                shutil.rmtree(os.path.join(self.root, old), ignore_errors=True)
+        return path
+
+
+def list_snapshots(root: str) -> list:
+    if not os.path.isdir(root):
+        return []
+    return sorted(
+        name for name in os.listdir(root)
+        if not name.startswith('.') and os.path.isfile(os.path.join(root, name, MANIFEST))
+    )
+
+
+class Snapshot:
+    def __init__(self, path: str):
+        self.path = path
+        with open(os.path.join(path, MANIFEST)) as f:
+            self.manifest = json.load(f)
+        self.id = self.manifest["id"]
+        self.created_at = self.manifest["createdAt"]
+        self._columns = {}
+
+    def rows(self, table: str) -> int:
+        return self.manifest["tables"][table]["rows"]
+
+    def column(self, table: str, name: str) -> array:
+        key = (table, name)
+        values = self._columns.get(key)
+        if values is None:
+            values = array(INT_TYPECODE)
+            with open(os.path.join(self.path, f'{table}.{name}.bin'), 'rb') as f:
+                values.fromfile(f, self.rows(table))
+            if self.manifest["byteorder"] != sys.byteorder:
+                values.byteswap()
+            self._columns[key] = values
+        return values
+
+    def vector(self, table: str, name: str):
+        # numpy view over column(), without copying
+        return np.frombuffer(self.column(table, name), dtype=np.int32)
+
+    def dictionary(self, table: str, name: str) -> list:
+        return self.manifest["tables"][table]["columns"][name].get("dictionary", [])
+
+
+def _percentile(sorted_values, pct: float):
+    if not len(sorted_values):
+        return None
+    return sorted_values[min(len(sorted_values) - 1, int(pct / 100 * len(sorted_values)))]
+
+
+def _lookup(keys, values, wanted):
+    # values[i] for the i where keys[i] == wanted, else NULL (keys are unique)
+    if not len(keys):
+        return np.full(len(wanted), NULL, dtype=np.int32)
+    order = np.argsort(keys)
+    sorted_keys = keys[order]
+    positions = np.minimum(np.searchsorted(sorted_keys, wanted), len(keys) - 1)
+    return np.where(sorted_keys[positions] == wanted, values[order][positions], NULL)
+
+
+def _pair_keys(high, low):
+    # one int64 per (high, low) pair: high a non-negative code, low 32 bits
+    return (high.astype(np.int64) << 32) | low.astype(np.int64)
+
+
+def _distinct(keys):
+    # sorted distinct keys; a plain sort beats np.unique on large int64 keys
+    keys = np.sort(keys)
+    return keys[np.r_[True, keys[1:] != keys[:-1]]] if len(keys) else keys
+
+
+def _length_stats(values, total: int, histogram: dict) -> dict:
+    # values sorted; a list or an int32 array
+    return {
+        "cycles": len(values),
+        "mean": round(total / len(values), 2),
+        "p10": int(_percentile(values, 10)),
+        "p50": int(_percentile(values, 50)),
+        "p90": int(_percentile(values, 90)),
+        "histogram": {f"{start}-{start + 4}" if start < 45 else "45+": n for start, n in sorted(histogram.items())},
+    }
+
+
+def cycle_length_by_age_band(snapshot: Snapshot) -> dict:
+    if np is not None:
+        return _cycle_length_by_age_band_vectorized(snapshot)
+    band_codes = snapshot.column('users', 'age_band')
+    band_of = dict(zip(snapshot.column('users', 'user_id'), band_codes))
+    bands = snapshot.dictionary('users', 'age_band')
+
+    lengths = defaultdict(list)
+    for user_id, length in zip(snapshot.column('cycles', 'user_id'), snapshot.column('cycles', 'cycle_length')):
+        band = band_of.get(user_id, NULL)
+        if length != NULL and band != NULL:
+            lengths[band].append(length)
+
+    result = {}
+    for band, values in lengths.items():
+        values.sort()
+        histogram = defaultdict(int)
+        for value in values:
+            histogram[min(value // 5 * 5, 45)] += 1
+        result[bands[band]] = _length_stats(values, sum(values), histogram)
+    return result
+
+
+def _cycle_length_by_age_band_vectorized(snapshot: Snapshot) -> dict:
+    bands = snapshot.dictionary('users', 'age_band')
+    lengths = snapshot.vector('cycles', 'cycle_length')
+    band = _lookup(snapshot.vector('users', 'user_id'), snapshot.vector('users', 'age_band'),
+                   snapshot.vector('cycles', 'user_id'))
+    keep = (lengths != NULL) & (band != NULL)
+    band, lengths = band[keep], lengths[keep]
+
+    result = {}
+    for code in np.unique(band).tolist():
+        values = np.sort(lengths[band == code])
+        starts, counts = np.unique(np.minimum(values // 5 * 5, 45), return_counts=True)
+        result[bands[code]] = _length_stats(values, int(values.sum(dtype=np.int64)),
+                                            dict(zip(starts.tolist(), counts.tolist())))
+    return result
+
+
+def symptom_prevalence_by_phase(snapshot: Snapshot) -> dict:
+    if np is not None:
+        return _symptom_prevalence_by_phase_vectorized(snapshot)
+    phases = snapshot.dictionary('symptom_rollups', 'phase')
+    symptoms = snapshot.dictionary('symptom_rollups', 'symptom_type')
+    users_in_phase = defaultdict(set)
+    users_with = defaultdict(set)
+    occurrences = defaultdict(int)
+    for user_id, symptom, phase, count in zip(
+        snapshot.column('symptom_rollups', 'user_id'),
+        snapshot.column('symptom_rollups', 'symptom_type'),
+        snapshot.column('symptom_rollups', 'phase'),
+        snapshot.column('symptom_rollups', 'count'),
+    ):
+        if phase == NULL:
+            continue
+        users_in_phase[phase].add(user_id)
+        users_with[(phase, symptom)].add(user_id)
+        occurrences[(phase, symptom)] += count
+
+    result = {}
+    for (phase, symptom), users in users_with.items():
+        reporting = len(users_in_phase[phase])
+        result.setdefault(phases[phase], {})[symptoms[symptom]] = {
+            "users": len(users),
+            "occurrences": occurrences[(phase, symptom)],
+            "prevalence": round(len(users) / reporting, 4),
+        }
+    return result
+
+
+def _symptom_prevalence_by_phase_vectorized(snapshot: Snapshot) -> dict:
+    phases = snapshot.dictionary('symptom_rollups', 'phase')
+    symptoms = snapshot.dictionary('symptom_rollups', 'symptom_type')
+    phase = snapshot.vector('symptom_rollups', 'phase')
+    keep = phase != NULL
+    phase = phase[keep]
+    user = snapshot.vector('symptom_rollups', 'user_id')[keep]
+    symptom = snapshot.vector('symptom_rollups', 'symptom_type')[keep]
+    count = snapshot.vector('symptom_rollups', 'count')[keep]
+
+    # user ids are kept as their unsigned 32-bit pattern in the low half
+    user_bits = user.view(np.uint32)
+    phase_symptom = phase.astype(np.int64) * max(len(symptoms), 1) + symptom
+    groups, inverse = np.unique(phase_symptom, return_inverse=True)
+    occurrences = np.bincount(inverse, weights=count, minlength=len(groups)).astype(np.int64)
+    users_with = np.bincount(_distinct(_pair_keys(inverse, user_bits)) >> 32, minlength=len(groups))
+    reporting = np.bincount(_distinct(_pair_keys(phase, user_bits)) >> 32).tolist()
+
+    result = {}
+    for group, users, total in zip(groups.tolist(), users_with.tolist(), occurrences.tolist()):
+        phase_code, symptom_code = divmod(group, max(len(symptoms), 1))
+        result.setdefault(phases[phase_code], {})[symptoms[symptom_code]] = {
+            "users": users,
+            "occurrences": total,
+            "prevalence": round(users / reporting[phase_code], 4),
+        }
+    return result
+
+
+def irregularity_by_profile_mode(snapshot: Snapshot) -> dict:
+    # A user counts as irregular when their logged cycle lengths span more
+    # than IRREGULAR_RANGE_DAYS; users with fewer than two cycles are skipped.
+    if np is not None:
+        return _irregularity_by_profile_mode_vectorized(snapshot)
+    shortest, longest, counts = {}, {}, defaultdict(int)
+    for user_id, length in zip(snapshot.column('cycles', 'user_id'), snapshot.column('cycles', 'cycle_length')):
+        if length == NULL:
+            continue
+        counts[user_id] += 1
+        shortest[user_id] = min(shortest.get(user_id, length), length)
+        longest[user_id] = max(longest.get(user_id, length), length)
+
+    modes = snapshot.dictionary('users', 'profile_mode')
+    totals = defaultdict(lambda: {"users": 0, "usersWithCycles": 0, "irregularUsers": 0, "selfReportedIrregular": 0})
+    for user_id, mode, self_reported in zip(
+        snapshot.column('users', 'user_id'),
+        snapshot.column('users', 'profile_mode'),
+        snapshot.column('users', 'self_reported_irregular'),
+    ):
+        bucket = totals[modes[mode] if mode != NULL else 'unknown']
+        bucket["users"] += 1
+        bucket["selfReportedIrregular"] += self_reported == 1
+        if counts.get(user_id, 0) >= 2:
+            bucket["usersWithCycles"] += 1
+            bucket["irregularUsers"] += longest[user_id] - shortest[user_id] > IRREGULAR_RANGE_DAYS
+
+    return _irregularity_rates(totals)
+
+
+def _irregularity_rates(totals: dict) -> dict:
+    for bucket in totals.values():
+        bucket["irregularityRate"] = round(bucket["irregularUsers"] / bucket["usersWithCycles"], 4) if bucket["usersWithCycles"] else None
+        bucket["selfReportedRate"] = round(bucket["selfReportedIrregular"] / bucket["users"], 4)
+    return dict(totals)
+
+
+def _irregularity_by_profile_mode_vectorized(snapshot: Snapshot) -> dict:
+    lengths = snapshot.vector('cycles', 'cycle_length')
+    keep = lengths != NULL
+    lengths = lengths[keep]
+    cycle_users = snapshot.vector('cycles', 'user_id')[keep]
+    order = np.argsort(cycle_users, kind='stable')
+    cycle_users, lengths = cycle_users[order], lengths[order]
+    if len(cycle_users):
+        starts = np.flatnonzero(np.r_[True, cycle_users[1:] != cycle_users[:-1]])
+        counts = np.diff(np.r_[starts, len(cycle_users)])
+        spread = np.maximum.reduceat(lengths, starts) - np.minimum.reduceat(lengths, starts)
+        # per distinct user: 1 with two or more cycles, 2 if also irregular
+        status = (counts >= 2).astype(np.int32) * (1 + (spread > IRREGULAR_RANGE_DAYS))
+        status = _lookup(cycle_users[starts], status, snapshot.vector('users', 'user_id'))
+    else:
+        status = np.full(snapshot.rows('users'), NULL, dtype=np.int32)
+
+    modes = snapshot.dictionary('users', 'profile_mode')
+    mode = snapshot.vector('users', 'profile_mode')
+    self_reported = snapshot.vector('users', 'self_reported_irregular')
+    totals = {}
+    for code in np.unique(mode).tolist():
+        in_mode = mode == code
+        bucket_status = status[in_mode]
+        totals[modes[code] if code != NULL else 'unknown'] = {
+            "users": int(in_mode.sum()),
+            "usersWithCycles": int((bucket_status >= 1).sum()),
+            "irregularUsers": int((bucket_status == 2).sum()),
+            "selfReportedIrregular": int((self_reported[in_mode] == 1).sum()),
+        }
+    return _irregularity_rates(totals)
+
+
+REPORTS = {
+    'cycle-length-by-age': cycle_length_by_age_band,
+    'symptom-prevalence-by-phase': symptom_prevalence_by_phase,
+    'irregularity-by-profile-mode': irregularity_by_profile_mode,
+}
+
+
+class SnapshotStore:
+    # Keeps the most recently used snapshot's columns and report results in
+    # memory; a new snapshot on disk replaces them on the next request.
+    def __init__(self, root: str):
+        self.root = root
+        self._snapshot = None
+        self._results = {}
+        self._lock = threading.Lock()
+
+    def report(self, name: str, snapshot_id: str = None) -> dict:
+        snapshots = list_snapshots(self.root)
+        snapshot_id = snapshot_id or (snapshots[-1] if snapshots else None)
+        if snapshot_id not in snapshots:
+            return None
+        with self._lock:
+            if self._snapshot is None or self._snapshot.id != snapshot_id:
+                self._snapshot = Snapshot(os.path.join(self.root, snapshot_id))
+                self._results = {}
+            if name not in self._results:
+                self._results[name] = REPORTS[name](self._snapshot)
+            return {
+                "snapshot": self._snapshot.id,
+                "createdAt": self._snapshot.created_at,
+                "report": name,
+                "result": self._results[name],
+            }
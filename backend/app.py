@@ -1,24 +1,77 @@
 import os
 from dotenv import load_dotenv
 from datetime import datetime, timedelta, date
-from flask import Flask, request, jsonify, send_from_directory
+from flask import Flask, request, jsonify
 from flask_cors import CORS
-from flask_jwt_extended import JWTManager, create_access_token, create_refresh_token, jwt_required, get_jwt_identity, get_jwt
+from flask_jwt_extended import JWTManager, create_access_token, create_refresh_token, decode_token, jwt_required, get_jwt_identity, get_jwt
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy.exc import IntegrityError
 import bcrypt
 from google import genai
 from functools import wraps
+import asyncio
+import base64
+import bisect
+import json
+import logging
 import subprocess
 import threading
+import time
+import click
+import uuid
+from static_assets import StaticManifest
+from daily_jobs import DailyJobScheduler
+from schema_upgrades import add_missing_columns, add_missing_indexes
+from user_cache import LRUCache
+from write_batch import WriteBatch
+from onboarding_fields import (
+    CYCLE_LENGTH_BUCKETS, CYCLE_VARIABILITY, DYNAMIC_PREDICTIONS, FERTILITY_TRACKING, HEALTH_CONDITIONS,
+    PERIOD_DURATION_BUCKETS, SLEEP_PATTERNS, STRESS_LEVELS, TRACK_SYMPTOMS,
+    condition_codes, decode_choice, decode_flags, encode_choice, normalize_onboarding
+)
+from retrieval import BM25Index, Passage, RefreshingIndex, chunk_article, chunk_sections, pack_passages, tokenize
+from content_ingest import backfill_derived_columns, format_for_path, ingest_records, iter_records, open_text
+from analytics import REPORTS as ANALYTICS_REPORTS, SnapshotStore, SnapshotWriter, age_band
+from notifications import (
+    LocalNotificationSink, NotificationDispatcher, WebhookNotificationSink, build_message, fire_time, upcoming_events
+)
+from catalog_cache import CatalogCache, MemoryCacheBackend, RedisCacheBackend
+from profiling import META_SUFFIX, STACK_SUFFIX, RequestProfiler, profile_span
+from token_revocation import MemoryRevocationBackend, SQLAlchemyRevocationBackend, TokenDenylist
+from usage_ledger import UsageBudget, UsageLedger
+from partitioning import PartitionedSession, PartitionRouter, partition_binds
+from idempotency import (IdempotencyStore, MemoryIdempotencyBackend, RedisIdempotencyBackend,
+                         SQLAlchemyIdempotencyBackend, idempotent)
+from admission import AdmissionController, AdmissionRejected
+from structured_logging import configure_logging, install_request_logging, parse_sample_rates
+from request_validation import Field, Schema, validate_json
+from projection import FULL, SUMMARY, FieldSet
+from compression import install_compression
 
 # Load environment variables from .env file (look in parent directory)
 import pathlib
 env_path = pathlib.Path(__file__).parent.parent / '.env'
 load_dotenv(env_path)
-print(f"[Flask] Loading .env from: {env_path}")
-print(f"[Flask] GEMINI_API_KEY loaded: {'Yes' if os.environ.get('GEMINI_API_KEY') else 'No'}")
 
-app = Flask(__name__, static_folder='../dist/public', static_url_path='')
+configure_logging(
+    os.environ.get('LOG_LEVEL', 'INFO'),
+    parse_sample_rates(os.environ.get('LOG_SAMPLE_RATES', 'http.request=0.1,chat.reply=0.25'))
+)
+logger = logging.getLogger('arivai')
+logger.info('startup', extra={"envFile": str(env_path)})
+
+app = Flask(__name__, static_folder=None)
+# Registered first so it runs after every other after_request hook; 0 turns
+# it off (e.g. behind a proxy that compresses).
+COMPRESSION_MIN_BYTES = int(os.environ.get('COMPRESSION_MIN_BYTES', 1024))
+if COMPRESSION_MIN_BYTES > 0:
+    install_compression(
+        app,
+        min_size=COMPRESSION_MIN_BYTES,
+        gzip_level=int(os.environ.get('COMPRESSION_GZIP_LEVEL', 5)),
+        brotli_quality=int(os.environ.get('COMPRESSION_BROTLI_QUALITY', 4))
+    )
+install_request_logging(app, slow_ms=float(os.environ.get('LOG_SLOW_REQUEST_MS', 1000)))
 
 CORS(app, supports_credentials=True, origins=["*"])
 
@@ -40,9 +93,36 @@ app.config['JWT_SECRET_KEY'] = os.environ.get('SESSION_SECRET', 'arivai-secret-k
 app.config['JWT_ACCESS_TOKEN_EXPIRES'] = timedelta(hours=24)
 app.config['JWT_REFRESH_TOKEN_EXPIRES'] = timedelta(days=30)
 
-db = SQLAlchemy(app)
+# Extra databases for per-user tables; the main database is partition 0.
+PARTITION_DATABASE_URLS = [url.strip() for url in os.environ.get('PARTITION_DATABASE_URLS', '').split(',') if url.strip()]
+app.config['SQLALCHEMY_BINDS'] = partition_binds(PARTITION_DATABASE_URLS)
+
+db = SQLAlchemy(app, session_options={"class_": PartitionedSession})
 jwt = JWTManager(app)
 
+user_cache = LRUCache(
+    maxsize=int(os.environ.get('USER_CACHE_SIZE', 10000)),
+    ttl=float(os.environ.get('USER_CACHE_TTL', 60))
+)
+
+catalog_cache = CatalogCache(
+    RedisCacheBackend(os.environ['CATALOG_CACHE_URL']) if os.environ.get('CATALOG_CACHE_URL') else MemoryCacheBackend(
+        maxsize=int(os.environ.get('CATALOG_CACHE_SIZE', 1000))
+    ),
+    ttl=float(os.environ.get('CATALOG_CACHE_TTL', 300)),
+    stale_ttl=float(os.environ.get('CATALOG_CACHE_STALE_TTL', 600))
+)
+
+request_profiler = RequestProfiler(
+    os.environ.get('PROFILE_DIR', str(pathlib.Path(__file__).parent / 'profiles')),
+    sample_rate=float(os.environ.get('PROFILE_SAMPLE_RATE', 0)),
+    token=os.environ.get('PROFILE_TOKEN'),
+    endpoints=[e.strip() for e in os.environ.get('PROFILE_ENDPOINTS', '').split(',') if e.strip()],
+    interval=float(os.environ.get('PROFILE_INTERVAL_MS', 5)) / 1000,
+    retention=int(os.environ.get('PROFILE_RETENTION', 200))
+)
+request_profiler.install(app)
+
 gemini_api_key = os.environ.get('GEMINI_API_KEY')
 gemini_client = None
 if gemini_api_key:
@@ -59,10 +139,14 @@ class User(db.Model):
     avg_cycle_length = db.Column(db.Integer, default=28)
     avg_period_length = db.Column(db.Integer, default=5)
     profile_image_url = db.Column(db.String(500))
+    profile_revision = db.Column(db.Integer, default=0, server_default='0')
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
 class Cycle(db.Model):
     __tablename__ = 'cycles'
+    __table_args__ = (
+        db.Index('ix_cycles_user_updated', 'user_id', 'updated_at'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     start_date = db.Column(db.Date, nullable=False)
@@ -71,9 +155,13 @@ class Cycle(db.Model):
     period_length = db.Column(db.Integer)
     notes = db.Column(db.Text)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
 class Symptom(db.Model):
     __tablename__ = 'symptoms'
+    __table_args__ = (
+        db.Index('ix_symptoms_user_updated', 'user_id', 'updated_at'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     cycle_id = db.Column(db.Integer, db.ForeignKey('cycles.id'))
@@ -82,15 +170,23 @@ class Symptom(db.Model):
     severity = db.Column(db.Integer, default=1)
     notes = db.Column(db.Text)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
 class ChatHistory(db.Model):
     __tablename__ = 'chat_history'
+    __table_args__ = (
+        db.Index('ix_chat_history_user_created', 'user_id', 'created_at'),
+        db.Index('ix_chat_history_user_updated', 'user_id', 'updated_at'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     role = db.Column(db.String(20), nullable=False)
     content = db.Column(db.Text, nullable=False)
     cycle_phase = db.Column(db.String(50))
+    # when the message was sent, which for the user's turn is before the
+    # Gemini call; updated_at is when the row was written, for /api/sync
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
 
 class Recipe(db.Model):
     __tablename__ = 'recipes'
@@ -99,11 +195,15 @@ class Recipe(db.Model):
     description = db.Column(db.Text)
     image_url = db.Column(db.String(500))
     ingredients = db.Column(db.JSON)
-    instructions = db.Column(db.Text)
+    # large and only needed for a full recipe; see RECIPE_FIELDS
+    instructions = db.deferred(db.Column(db.Text))
     phase = db.Column(db.String(50))
     category = db.Column(db.String(100))
     prep_time = db.Column(db.Integer)
     calories = db.Column(db.Integer)
+    slug = db.Column(db.String(255), unique=True, index=True)
+    search_tokens = db.deferred(db.Column(db.Text))
+    summary_length = db.Column(db.Integer)
 
 class MeditationVideo(db.Model):
     __tablename__ = 'meditation_videos'
@@ -115,41 +215,56 @@ class MeditationVideo(db.Model):
     category = db.Column(db.String(100))
     duration_seconds = db.Column(db.Integer)
     phase = db.Column(db.String(50))
+    slug = db.Column(db.String(255), unique=True, index=True)
+    search_tokens = db.deferred(db.Column(db.Text))
+    summary_length = db.Column(db.Integer)
 
 class EducationalContent(db.Model):
     __tablename__ = 'educational_content'
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(255), nullable=False)
     summary = db.Column(db.Text)
-    body = db.Column(db.Text, nullable=False)
+    # large and only needed to read an article; see ARTICLE_FIELDS
+    body = db.deferred(db.Column(db.Text, nullable=False))
     category = db.Column(db.String(100))
     phase = db.Column(db.String(50))
     image_url = db.Column(db.String(500))
+    slug = db.Column(db.String(255), unique=True, index=True)
+    search_tokens = db.deferred(db.Column(db.Text))
+    summary_length = db.Column(db.Integer)
 
 class Favorite(db.Model):
     __tablename__ = 'favorites'
+    __table_args__ = (
+        db.Index('ix_favorites_user_updated', 'user_id', 'updated_at'),
+        db.Index('uq_favorites_user_item', 'user_id', 'item_type', 'item_id', unique=True),
+    )
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     item_type = db.Column(db.String(50), nullable=False)
     item_id = db.Column(db.Integer, nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
 class UserOnboarding(db.Model):
     __tablename__ = 'user_onboarding'
     id = db.Column(db.String(255), primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, unique=True)
     last_period_date = db.Column(db.Date)
-    typical_cycle_length = db.Column(db.String(50))
-    period_duration = db.Column(db.String(50))
-    cycle_variability = db.Column(db.String(50))
-    health_conditions = db.Column(db.JSON)
-    fertility_tracking = db.Column(db.JSON)
-    track_symptoms = db.Column(db.String(50))
-    dynamic_predictions = db.Column(db.String(50))
-    stress_level = db.Column(db.String(50))
-    sleep_pattern = db.Column(db.String(50))
+    # answer codes and bitmasks are defined in onboarding_fields
+    cycle_length_code = db.Column(db.SmallInteger)
+    cycle_length_days = db.Column(db.SmallInteger)
+    period_duration_code = db.Column(db.SmallInteger)
+    period_length_days = db.Column(db.SmallInteger)
+    cycle_variability_code = db.Column(db.SmallInteger)
+    condition_flags = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    fertility_flags = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    track_symptoms_code = db.Column(db.SmallInteger)
+    dynamic_predictions_code = db.Column(db.SmallInteger)
+    stress_level_code = db.Column(db.SmallInteger)
+    sleep_pattern_code = db.Column(db.SmallInteger)
     health_notes = db.Column(db.Text)
-    profile_mode = db.Column(db.String(50), default='regular')
+    profile_mode = db.Column(db.String(50), default='regular', index=True)
     is_irregular = db.Column(db.Boolean, default=False)
     show_buffer_days = db.Column(db.Boolean, default=True)
     is_completed = db.Column(db.Boolean, default=False)
@@ -157,9 +272,154 @@ class UserOnboarding(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow)
 
+class UserCondition(db.Model):
+    # One row per set bit of UserOnboarding.condition_flags, so cohort queries
+    # ("all PCOS users") are an index range scan instead of a table scan.
+    __tablename__ = 'user_conditions'
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'condition', name='uq_user_condition'),
+        db.Index('ix_user_conditions_condition_user', 'condition', 'user_id'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    condition = db.Column(db.SmallInteger, nullable=False)
 
-def calculate_cycle_day(last_period_start: date) -> int:
-    today = date.today()
+class SyncTombstone(db.Model):
+    # Deleted rows, kept for SYNC_TOMBSTONE_DAYS so /api/sync can report them.
+    __tablename__ = 'sync_tombstones'
+    __table_args__ = (
+        db.Index('ix_sync_tombstones_user_deleted', 'user_id', 'deleted_at'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    resource = db.Column(db.String(30), nullable=False)
+    row_id = db.Column(db.Integer, nullable=False)
+    deleted_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+class NotificationSchedule(db.Model):
+    # One row per user and reminder kind. fire_at is the only column the
+    # dispatcher scans (an index range up to now); NULL means nothing pending.
+    __tablename__ = 'notification_schedule'
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'kind', name='uq_notification_user_kind'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    kind = db.Column(db.String(30), nullable=False)
+    event_date = db.Column(db.Date, nullable=False)
+    fire_at = db.Column(db.DateTime, index=True)
+    interval_days = db.Column(db.SmallInteger, nullable=False)
+    last_sent_event_date = db.Column(db.Date)
+
+class RevokedToken(db.Model):
+    __tablename__ = 'revoked_tokens'
+    id = db.Column(db.Integer, primary_key=True)
+    jti = db.Column(db.String(80), nullable=False, unique=True)
+    reason = db.Column(db.String(20), nullable=False)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class IdempotencyKey(db.Model):
+    # key is a hash of (user, method, path, Idempotency-Key header); rows
+    # without a status_code are requests still in flight.
+    __tablename__ = 'idempotency_keys'
+    key = db.Column(db.String(64), primary_key=True)
+    fingerprint = db.Column(db.String(64), nullable=False)
+    status_code = db.Column(db.Integer)
+    response_body = db.Column(db.LargeBinary)
+    content_type = db.Column(db.String(100))
+    locked_until = db.Column(db.DateTime, nullable=False)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+
+class UserDailyState(db.Model):
+    __tablename__ = 'user_daily_state'
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+    state_date = db.Column(db.Date, nullable=False, index=True)
+    cycle_day = db.Column(db.Integer)
+    phase = db.Column(db.String(50), index=True)
+    next_period_date = db.Column(db.Date)
+    insights = db.Column(db.JSON, nullable=False)
+    computed_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class SymptomDailyRollup(db.Model):
+    __tablename__ = 'symptom_daily_rollups'
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'date', 'symptom_type', name='uq_symptom_rollup_user_date_type'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
+    date = db.Column(db.Date, nullable=False)
+    symptom_type = db.Column(db.String(100), nullable=False)
+    cycle_day = db.Column(db.Integer)
+    phase = db.Column(db.String(50))
+    count = db.Column(db.Integer, nullable=False, default=0)
+    severity_sum = db.Column(db.Integer, nullable=False, default=0)
+
+class GeminiUsage(db.Model):
+    # One row per Gemini call, written in batches by usage_ledger.
+    __tablename__ = 'gemini_usage'
+    __table_args__ = (
+        db.Index('ix_gemini_usage_user_created', 'user_id', 'created_at'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    endpoint = db.Column(db.String(50), nullable=False)
+    model = db.Column(db.String(50), nullable=False)
+    outcome = db.Column(db.String(20), nullable=False)
+    prompt_tokens = db.Column(db.Integer, nullable=False, default=0)
+    output_tokens = db.Column(db.Integer, nullable=False, default=0)
+    total_tokens = db.Column(db.Integer, nullable=False, default=0)
+    prompt_chars = db.Column(db.Integer, nullable=False, default=0)
+    latency_ms = db.Column(db.Integer)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, index=True)
+
+class CatalogFacet(db.Model):
+    __tablename__ = 'catalog_facets'
+    __table_args__ = (
+        db.UniqueConstraint('content_type', 'facet', 'value', name='uq_catalog_facet'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    content_type = db.Column(db.String(50), nullable=False)
+    facet = db.Column(db.String(50), nullable=False)
+    value = db.Column(db.String(100))
+    count = db.Column(db.Integer, nullable=False, default=0)
+
+class UserPartition(db.Model):
+    # Which partition holds a user's rows; users without a row are on the
+    # main database.
+    __tablename__ = 'user_partitions'
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+    partition = db.Column(db.Integer, nullable=False, index=True)
+    moving = db.Column(db.Boolean, nullable=False, default=False, server_default='0')
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+# Keyed on user_id and only ever queried for one user at a time (or by
+# cross-user jobs, one partition at a time). Users, tokens, usage and the
+# catalog stay on the main database.
+PARTITIONED_MODELS = (
+    Cycle, Symptom, ChatHistory, Favorite, UserOnboarding, UserCondition,
+    SyncTombstone, NotificationSchedule, UserDailyState, SymptomDailyRollup,
+)
+
+def request_user_id():
+    # the caller's id once @jwt_required has verified their token
+    try:
+        return get_jwt_identity()
+    except RuntimeError:
+        return None
+
+partition_router = PartitionRouter(
+    db, UserPartition, [model.__tablename__ for model in PARTITIONED_MODELS],
+    partitions=1 + len(PARTITION_DATABASE_URLS),
+    identity=request_user_id,
+    cache_ttl=float(os.environ.get('PARTITION_CACHE_TTL', 30)),
+    id_block=int(os.environ.get('PARTITION_ID_BLOCK', 100_000_000))
+)
+partition_router.install(app)
+
+
+def calculate_cycle_day(last_period_start: date, today: date = None) -> int:
+    today = today or date.today()
     return (today - last_period_start).days + 1
 
 def get_phase(cycle_day: int, cycle_length: int = 28) -> str:
@@ -249,14 +509,152 @@ def get_daily_advice(phase: str) -> dict:
     }
     return advice.get(phase, advice["Follicular"])
 
-def get_cycle_insights(user_id: int) -> dict:
+def cycle_position(symptom_date: date, cycle_starts: list, cycle_length: int) -> tuple:
+    index = bisect.bisect_right(cycle_starts, symptom_date) - 1
+    if index < 0:
+        return None, None
+    cycle_day = (symptom_date - cycle_starts[index]).days + 1
+    return cycle_day, get_phase(cycle_day, cycle_length)
+
+def record_symptom_rollups(user_id: int, symptoms: list, cycle_length: int = None):
+    if not symptoms:
+        return
+    user_id = int(user_id)
+    if cycle_length is None:
+        user = User.query.get(user_id)
+        cycle_length = user.avg_cycle_length if user else 28
+    cycle_starts = [row[0] for row in db.session.query(Cycle.start_date).filter(
+        Cycle.user_id == user_id,
+        Cycle.start_date <= max(s["date"] for s in symptoms)
+    ).order_by(Cycle.start_date.asc())]
+
+    increments = {}
+    for s in symptoms:
+        key = (s["date"], s["symptom_type"])
+        count, severity_sum = increments.get(key, (0, 0))
+        increments[key] = (count + 1, severity_sum + (s["severity"] or 1))
+
+    # Counts are added in the upsert itself, so two requests logging the same
+    # symptom on the same day both land instead of one hitting the unique key.
+    batch = WriteBatch(db.session)
+    for (symptom_date, symptom_type), (count, severity_sum) in increments.items():
+        cycle_day, phase = cycle_position(symptom_date, cycle_starts, cycle_length)
+        batch.upsert(SymptomDailyRollup, ('user_id', 'date', 'symptom_type'), ('count', 'severity_sum'),
+                     user_id=user_id, date=symptom_date, symptom_type=symptom_type,
+                     cycle_day=cycle_day, phase=phase, count=count, severity_sum=severity_sum)
+    batch.flush()
+
+def rebuild_symptom_rollups(user_id: int, since: date = None):
+    # Cycle and profile writes move the phase/cycle-day attribution of every
+    # symptom after the change, so those paths re-aggregate instead of patching.
+    user_id = int(user_id)
     user = User.query.get(user_id)
-    if not user:
-        return None
-    
-    latest_cycle = Cycle.query.filter_by(user_id=user_id).order_by(Cycle.start_date.desc()).first()
-    
-    if not latest_cycle:
+    cycle_length = user.avg_cycle_length if user else 28
+    cycle_starts = [row[0] for row in db.session.query(Cycle.start_date).filter(
+        Cycle.user_id == user_id
+    ).order_by(Cycle.start_date.asc())]
+
+    stale = SymptomDailyRollup.query.filter(SymptomDailyRollup.user_id == user_id)
+    grouped = db.session.query(
+        Symptom.date,
+        Symptom.symptom_type,
+        db.func.count(Symptom.id),
+        db.func.sum(db.func.coalesce(Symptom.severity, 1))
+    ).filter(Symptom.user_id == user_id)
+    if since:
+        stale = stale.filter(SymptomDailyRollup.date >= since)
+        grouped = grouped.filter(Symptom.date >= since)
+    stale.delete(synchronize_session=False)
+
+    for symptom_date, symptom_type, count, severity_sum in grouped.group_by(Symptom.date, Symptom.symptom_type):
+        cycle_day, phase = cycle_position(symptom_date, cycle_starts, cycle_length)
+        db.session.add(SymptomDailyRollup(
+            user_id=user_id,
+            date=symptom_date,
+            symptom_type=symptom_type,
+            cycle_day=cycle_day,
+            phase=phase,
+            count=count,
+            severity_sum=int(severity_sum or 0)
+        ))
+
+def get_symptom_stats(user_id: int, days: int = None, weeks: int = 8) -> dict:
+    user_id = int(user_id)
+    today = date.today()
+    R = SymptomDailyRollup
+    window = [R.user_id == user_id]
+    if days:
+        window.append(R.date > today - timedelta(days=days))
+
+    frequency = {}
+    for symptom_type, count, severity_sum, active_days in db.session.query(
+        R.symptom_type, db.func.sum(R.count), db.func.sum(R.severity_sum), db.func.count(R.id)
+    ).filter(*window).group_by(R.symptom_type):
+        frequency[symptom_type] = {
+            "count": int(count),
+            "days": int(active_days),
+            "meanSeverity": round(severity_sum / count, 2) if count else None
+        }
+
+    by_phase = {}
+    for phase, symptom_type, count, severity_sum in db.session.query(
+        R.phase, R.symptom_type, db.func.sum(R.count), db.func.sum(R.severity_sum)
+    ).filter(*window, R.phase.isnot(None)).group_by(R.phase, R.symptom_type):
+        by_phase.setdefault(phase, {})[symptom_type] = {
+            "count": int(count),
+            "meanSeverity": round(severity_sum / count, 2) if count else None
+        }
+
+    by_cycle_day = [{
+        "cycleDay": cycle_day,
+        "count": int(count),
+        "meanSeverity": round(severity_sum / count, 2) if count else None
+    } for cycle_day, count, severity_sum in db.session.query(
+        R.cycle_day, db.func.sum(R.count), db.func.sum(R.severity_sum)
+    ).filter(*window, R.cycle_day.isnot(None)).group_by(R.cycle_day).order_by(R.cycle_day)]
+
+    # Weeks end today so the latest bucket is always a full seven days.
+    trend_start = today - timedelta(days=weeks * 7 - 1)
+    weekly = [{"count": 0, "severitySum": 0, "types": {}} for _ in range(weeks)]
+    for rollup_date, symptom_type, count, severity_sum in db.session.query(
+        R.date, R.symptom_type, R.count, R.severity_sum
+    ).filter(R.user_id == user_id, R.date >= trend_start, R.date <= today):
+        bucket = weekly[(rollup_date - trend_start).days // 7]
+        bucket["count"] += count
+        bucket["severitySum"] += severity_sum
+        bucket["types"][symptom_type] = bucket["types"].get(symptom_type, 0) + count
+
+    weekly_trend = []
+    previous = None
+    for i, bucket in enumerate(weekly):
+        weekly_trend.append({
+            "weekStart": (trend_start + timedelta(days=i * 7)).isoformat(),
+            "count": bucket["count"],
+            "meanSeverity": round(bucket["severitySum"] / bucket["count"], 2) if bucket["count"] else None,
+            "change": round((bucket["count"] - previous) / previous, 2) if previous else None
+        })
+        previous = bucket["count"]
+
+    this_week, last_week = weekly[-1]["types"], weekly[-2]["types"]
+    week_over_week = {
+        symptom_type: {
+            "thisWeek": this_week.get(symptom_type, 0),
+            "lastWeek": last_week.get(symptom_type, 0),
+            "change": this_week.get(symptom_type, 0) - last_week.get(symptom_type, 0)
+        }
+        for symptom_type in sorted(set(this_week) | set(last_week))
+    }
+
+    return {
+        "frequency": frequency,
+        "byPhase": by_phase,
+        "byCycleDay": by_cycle_day,
+        "weeklyTrend": weekly_trend,
+        "weekOverWeek": week_over_week
+    }
+
+def build_cycle_insights(user, recent_cycles: list, today: date) -> dict:
+    if not recent_cycles:
         return {
             "cycleDay": 1,
             "phase": "Follicular",
@@ -268,15 +666,15 @@ def get_cycle_insights(user_id: int) -> dict:
             "dailyAdvice": get_daily_advice("Follicular")
         }
     
-    cycle_day = calculate_cycle_day(latest_cycle.start_date)
+    latest_cycle = recent_cycles[0]
+    cycle_day = calculate_cycle_day(latest_cycle.start_date, today)
     phase = get_phase(cycle_day, user.avg_cycle_length)
     
     user_age = 0
     if user.date_of_birth:
-        user_age = (date.today() - user.date_of_birth).days // 365
+        user_age = (today - user.date_of_birth).days // 365
     
-    cycles = Cycle.query.filter_by(user_id=user_id).order_by(Cycle.start_date.desc()).limit(6).all()
-    cycle_lengths = [c.cycle_length for c in cycles if c.cycle_length]
+    cycle_lengths = [c.cycle_length for c in recent_cycles if c.cycle_length]
     
     return {
         "cycleDay": cycle_day,
@@ -289,12 +687,318 @@ def get_cycle_insights(user_id: int) -> dict:
         "dailyAdvice": get_daily_advice(phase)
     }
 
+def daily_state_row(user_id: int, insights: dict, today: date) -> dict:
+    return {
+        "user_id": user_id,
+        "state_date": today,
+        "cycle_day": insights["cycleDay"],
+        "phase": insights["phase"],
+        "next_period_date": date.fromisoformat(insights["nextPeriodDate"]) if insights["nextPeriodDate"] else None,
+        "insights": insights,
+        "computed_at": datetime.utcnow()
+    }
 
-@app.route('/api/auth/register', methods=['POST'])
-def register():
-    data = request.get_json()
+def refresh_user_daily_state(user_id: int) -> dict:
+    user = User.query.get(user_id)
+    if not user:
+        return None
     
-    if not data.get('email') or not data.get('password'):
+    today = date.today()
+    recent_cycles = Cycle.query.filter_by(user_id=user.id).order_by(Cycle.start_date.desc()).limit(6).all()
+    insights = build_cycle_insights(user, recent_cycles, today)
+    
+    # An upsert, so it can't collide with another request or the nightly
+    # precompute writing the same row.
+    batch = WriteBatch(db.session)
+    batch.upsert(UserDailyState, ('user_id',), **daily_state_row(user.id, insights, today))
+    batch.flush()
+    return insights
+
+def reschedule_user_notifications(user_id: int):
+    # For the write paths that change cycles or cycle length. Reads only
+    # refresh the daily state; the dispatcher moves sent reminders ahead.
+    user = User.query.get(int(user_id))
+    last_period_start = db.session.query(db.func.max(Cycle.start_date)).filter(Cycle.user_id == user.id).scalar()
+    batch = WriteBatch(db.session)
+    schedule_user_notifications(batch, user, last_period_start)
+    batch.flush()
+
+def get_cycle_insights(user_id: int) -> dict:
+    state = UserDailyState.query.get(int(user_id))
+    if state and state.state_date == date.today():
+        return state.insights
+    
+    insights = refresh_user_daily_state(user_id)
+    if insights is not None:
+        db.session.commit()
+    return insights
+
+NOTIFICATION_HOUR = int(os.environ.get('NOTIFICATION_HOUR', 9))
+NOTIFICATION_BATCH_SIZE = int(os.environ.get('NOTIFICATION_BATCH_SIZE', 500))
+# Pregnancy and menopause profiles get no cycle predictions, so no reminders.
+NOTIFICATION_EXCLUDED_MODES = ('ttc', 'menopause')
+
+if os.environ.get('NOTIFICATION_WEBHOOK_URL'):
+    notification_sink = WebhookNotificationSink(os.environ['NOTIFICATION_WEBHOOK_URL'])
+else:
+    notification_sink = LocalNotificationSink()
+
+def schedule_user_notifications(batch: WriteBatch, user, last_period_start: date, today: date = None):
+    # Called wherever a user's cycles or cycle length change; only that
+    # user's rows are rewritten.
+    if last_period_start is None:
+        NotificationSchedule.query.filter_by(user_id=user.id).update({"fire_at": None}, synchronize_session=False)
+        return
+    cycle_length = user.avg_cycle_length or 28
+    pms_start_day = calculate_pms_window(cycle_length)["startDay"]
+    for kind, event_date, fire_date in upcoming_events(last_period_start, cycle_length, pms_start_day, today or date.today()):
+        batch.upsert(NotificationSchedule, ('user_id', 'kind'),
+                     user_id=user.id, kind=kind, event_date=event_date,
+                     fire_at=fire_time(fire_date, NOTIFICATION_HOUR), interval_days=cycle_length)
+
+def dispatch_due_notifications(now: datetime = None, batch_size: int = None) -> int:
+    now = now or datetime.now()
+    batch_size = batch_size or NOTIFICATION_BATCH_SIZE
+    return sum(dispatch_partition_notifications(now, batch_size) for _ in partition_router.each_partition())
+
+def dispatch_partition_notifications(now: datetime, batch_size: int) -> int:
+    # Walks the fire_at index in batches. Each due row is sent (unless that
+    # event was already sent or the profile opts out) and then moved one
+    # cycle ahead, so rows are never rescanned until they are due again.
+    sent = 0
+    while True:
+        due = db.session.query(NotificationSchedule, UserOnboarding.profile_mode).outerjoin(
+            UserOnboarding, UserOnboarding.user_id == NotificationSchedule.user_id
+        ).filter(NotificationSchedule.fire_at <= now).order_by(
+            NotificationSchedule.fire_at
+        ).limit(batch_size).with_for_update(skip_locked=True, of=NotificationSchedule).all()
+        if not due:
+            return sent
+        
+        outgoing, updates = [], []
+        for row, profile_mode in due:
+            event_date, fire_at = row.event_date, row.fire_at
+            deliver = (
+                event_date >= now.date() and
+                row.last_sent_event_date != event_date and
+                profile_mode not in NOTIFICATION_EXCLUDED_MODES
+            )
+            if deliver:
+                outgoing.append({
+                    "userId": row.user_id,
+                    "kind": row.kind,
+                    "eventDate": event_date.isoformat(),
+                    "message": build_message(row.kind, event_date),
+                })
+            step = timedelta(days=row.interval_days or 28)
+            while fire_at <= now:
+                event_date, fire_at = event_date + step, fire_at + step
+            updates.append({
+                "id": row.id,
+                "event_date": event_date,
+                "fire_at": fire_at,
+                "last_sent_event_date": row.event_date if deliver else row.last_sent_event_date,
+            })
+        
+        if outgoing:
+            try:
+                notification_sink.send(outgoing)
+            except Exception:
+                # rows stay due and are retried on the next tick
+                db.session.rollback()
+                raise
+        batch = WriteBatch(db.session)
+        for values in updates:
+            batch.update(NotificationSchedule, **values)
+        batch.commit()
+        sent += len(outgoing)
+
+def schedule_all_notifications(chunk_size: int = 1000, today: date = None) -> int:
+    today = today or date.today()
+    last_id = 0
+    total = 0
+    while True:
+        users = db.session.query(User).filter(User.id > last_id).order_by(User.id).limit(chunk_size).all()
+        if not users:
+            return total
+        user_ids = [u.id for u in users]
+        by_id = {u.id: u for u in users}
+        for key, ids in partition_router.group(user_ids).items():
+            with partition_router.using(key):
+                latest = dict(db.session.query(Cycle.user_id, db.func.max(Cycle.start_date)).filter(
+                    Cycle.user_id.in_(ids)
+                ).group_by(Cycle.user_id))
+                batch = WriteBatch(db.session)
+                for user_id, last_start in latest.items():
+                    schedule_user_notifications(batch, by_id[user_id], last_start, today)
+                batch.commit()
+            total += len(latest)
+        last_id = user_ids[-1]
+
+def precompute_daily_states(chunk_size: int = 1000, today: date = None) -> int:
+    today = today or date.today()
+    last_id = 0
+    total = 0
+    while True:
+        users = db.session.query(User.id, User.avg_cycle_length, User.date_of_birth).filter(
+            User.id > last_id
+        ).order_by(User.id).limit(chunk_size).all()
+        if not users:
+            break
+        user_ids = [u.id for u in users]
+        by_id = {u.id: u for u in users}
+        
+        for key, ids in partition_router.group(user_ids).items():
+            with partition_router.using(key):
+                ranked = db.session.query(
+                    Cycle.user_id,
+                    Cycle.start_date,
+                    Cycle.cycle_length,
+                    db.func.row_number().over(partition_by=Cycle.user_id, order_by=Cycle.start_date.desc()).label('rank')
+                ).filter(Cycle.user_id.in_(ids)).subquery()
+                recent_cycles = {}
+                for c in db.session.query(ranked.c.user_id, ranked.c.start_date, ranked.c.cycle_length).filter(
+                    ranked.c.rank <= 6
+                ).order_by(ranked.c.user_id, ranked.c.start_date.desc()):
+                    recent_cycles.setdefault(c.user_id, []).append(c)
+                
+                # Upserted rather than deleted and reinserted: requests around
+                # the day rollover may be materializing the same rows.
+                batch = WriteBatch(db.session)
+                for user_id in ids:
+                    batch.upsert(UserDailyState, ('user_id',), **daily_state_row(
+                        user_id, build_cycle_insights(by_id[user_id], recent_cycles.get(user_id, []), today), today
+                    ))
+                batch.commit()
+            total += len(ids)
+        last_id = user_ids[-1]
+    return total
+
+
+def serialize_user(user) -> dict:
+    return {
+        "id": user.id,
+        "email": user.email,
+        "firstName": user.first_name,
+        "lastName": user.last_name,
+        "dateOfBirth": user.date_of_birth.isoformat() if user.date_of_birth else None,
+        "avgCycleLength": user.avg_cycle_length,
+        "avgPeriodLength": user.avg_period_length,
+        "profileImageUrl": user.profile_image_url
+    }
+
+def cache_user(user, profile_mode: str = None) -> dict:
+    if profile_mode is None:
+        onboarding = UserOnboarding.query.filter_by(user_id=user.id).first()
+        profile_mode = onboarding.profile_mode if onboarding else 'regular'
+    entry = {
+        "revision": user.profile_revision or 0,
+        "profileMode": profile_mode,
+        "user": serialize_user(user)
+    }
+    user_cache.set(user.id, entry)
+    return entry
+
+if os.environ.get('TOKEN_REVOCATION_BACKEND', 'database') == 'memory':
+    token_denylist = TokenDenylist(MemoryRevocationBackend())
+else:
+    token_denylist = TokenDenylist(
+        SQLAlchemyRevocationBackend(db, RevokedToken),
+        sync_interval=float(os.environ.get('TOKEN_REVOCATION_SYNC_SECONDS', 2))
+    )
+
+if os.environ.get('IDEMPOTENCY_REDIS_URL'):
+    idempotency_backend = RedisIdempotencyBackend(os.environ['IDEMPOTENCY_REDIS_URL'])
+elif os.environ.get('IDEMPOTENCY_BACKEND', 'database') == 'memory':
+    idempotency_backend = MemoryIdempotencyBackend()
+else:
+    idempotency_backend = SQLAlchemyIdempotencyBackend(db, IdempotencyKey)
+idempotency_store = IdempotencyStore(
+    idempotency_backend,
+    identity=request_user_id,
+    ttl=float(os.environ.get('IDEMPOTENCY_TTL_HOURS', 24)) * 3600,
+    # must outlast the slowest request (chat waits up to CHAT_DEADLINE_SECONDS)
+    lock_ttl=float(os.environ.get('IDEMPOTENCY_LOCK_SECONDS', 60)),
+    wait=float(os.environ.get('IDEMPOTENCY_WAIT_SECONDS', 25))
+)
+
+def purge_idempotency_keys() -> int:
+    return idempotency_backend.purge_expired(datetime.utcnow())
+
+def revoke_token_family(family: str):
+    token_denylist.revoke(f"fam:{family}", datetime.utcnow() + app.config['JWT_REFRESH_TOKEN_EXPIRES'], reason='family')
+
+@jwt.token_in_blocklist_loader
+def check_if_token_revoked(jwt_header, jwt_payload: dict) -> bool:
+    jti = jwt_payload["jti"]
+    family = jwt_payload.get("fam")
+    if not token_denylist.is_revoked(jti, f"fam:{family}"):
+        return False
+    # A rotated refresh token presented again is let through to refresh(),
+    # which replays the pair it was rotated to within REFRESH_REUSE_GRACE
+    # and otherwise treats it as leaked.
+    if family and jwt_payload.get("type") == "refresh" and token_denylist.reason(jti) == 'rotated':
+        return token_denylist.is_revoked(f"fam:{family}")
+    return True
+
+def purge_revoked_tokens() -> int:
+    return token_denylist.backend.purge_expired(datetime.utcnow())
+
+def profile_claims(entry: dict) -> dict:
+    return {
+        "profile": {
+            "rev": entry["revision"],
+            "cycleLength": entry["user"]["avgCycleLength"],
+            "periodLength": entry["user"]["avgPeriodLength"],
+            "mode": entry["profileMode"]
+        }
+    }
+
+def issue_access_token(entry: dict, family: str) -> str:
+    return create_access_token(
+        identity=str(entry["user"]["id"]),
+        additional_claims={**profile_claims(entry), "fam": family}
+    )
+
+def issue_refresh_token(user_id, family: str, jti: str = None, exp: int = None) -> str:
+    # jti and exp re-issue a token already handed out (see replay_refresh)
+    claims = {"fam": family} if jti is None else {"fam": family, "jti": jti, "exp": exp}
+    return create_refresh_token(identity=str(user_id), additional_claims=claims)
+
+def get_user_entry(user_id) -> dict:
+    # Tokens carry the profile revision they were minted at; a cached entry
+    # older than the caller's token was written by another worker.
+    user_id = int(user_id)
+    token_revision = (get_jwt().get("profile") or {}).get("rev", 0)
+    entry = user_cache.get(user_id)
+    if entry and entry["revision"] >= token_revision:
+        return entry
+    user = User.query.get(user_id)
+    if not user:
+        return None
+    return cache_user(user)
+
+def bump_profile_revision(user):
+    user.profile_revision = (user.profile_revision or 0) + 1
+    user_cache.pop(user.id)
+
+# bcrypt only looks at the first 72 bytes of a password and refuses longer ones
+PASSWORD_FIELD = Field(str, required=True, max_bytes=72)
+NOTES_MAX_CHARS = 2000
+
+REGISTER_SCHEMA = Schema({
+    "email": Field(str, required=True, max_length=255),
+    "password": PASSWORD_FIELD,
+    "firstName": Field(str, nullable=True, max_length=100, default=''),
+    "lastName": Field(str, nullable=True, max_length=100, default=''),
+    "avgCycleLength": Field(int, min_value=15, max_value=90, default=28),
+    "avgPeriodLength": Field(int, min_value=1, max_value=15, default=5),
+})
+
+@app.route('/api/auth/register', methods=['POST'])
+@validate_json(REGISTER_SCHEMA)
+def register(data):
+    if not data['email'] or not data['password']:
         return jsonify({"error": "Email and password are required"}), 400
     
     if User.query.filter_by(email=data['email']).first():
@@ -305,17 +1009,20 @@ def register():
     user = User(
         email=data['email'],
         password_hash=password_hash,
-        first_name=data.get('firstName', ''),
-        last_name=data.get('lastName', ''),
-        avg_cycle_length=data.get('avgCycleLength', 28),
-        avg_period_length=data.get('avgPeriodLength', 5)
+        first_name=data['firstName'],
+        last_name=data['lastName'],
+        avg_cycle_length=data['avgCycleLength'],
+        avg_period_length=data['avgPeriodLength']
     )
     
     db.session.add(user)
+    db.session.flush()
+    partition_router.assign(user.id)
     db.session.commit()
     
-    access_token = create_access_token(identity=str(user.id))
-    refresh_token = create_refresh_token(identity=str(user.id))
+    family = uuid.uuid4().hex
+    access_token = issue_access_token(cache_user(user, profile_mode='regular'), family)
+    refresh_token = issue_refresh_token(user.id, family)
     
     return jsonify({
         "message": "Registration successful",
@@ -329,11 +1036,15 @@ def register():
         "refreshToken": refresh_token
     }), 201
 
+LOGIN_SCHEMA = Schema({
+    "email": Field(str, required=True, max_length=255),
+    "password": PASSWORD_FIELD,
+})
+
 @app.route('/api/auth/login', methods=['POST'])
-def login():
-    data = request.get_json()
-    
-    if not data.get('email') or not data.get('password'):
+@validate_json(LOGIN_SCHEMA)
+def login(data):
+    if not data['email'] or not data['password']:
         return jsonify({"error": "Email and password are required"}), 400
     
     user = User.query.filter_by(email=data['email']).first()
@@ -341,8 +1052,10 @@ def login():
     if not user or not bcrypt.checkpw(data['password'].encode('utf-8'), user.password_hash.encode('utf-8')):
         return jsonify({"error": "Invalid email or password"}), 401
     
-    access_token = create_access_token(identity=str(user.id))
-    refresh_token = create_refresh_token(identity=str(user.id))
+    family = uuid.uuid4().hex
+    with partition_router.scope(user.id):
+        access_token = issue_access_token(cache_user(user), family)
+    refresh_token = issue_refresh_token(user.id, family)
     
     return jsonify({
         "message": "Login successful",
@@ -358,136 +1071,203 @@ def login():
         "refreshToken": refresh_token
     })
 
+# Parallel requests that all hit an expired access token refresh with the
+# same token; for this long the ones after the first get the same new pair.
+REFRESH_REUSE_GRACE = float(os.environ.get('REFRESH_REUSE_GRACE_SECONDS', 30))
+
+def refresh_replay_record(response) -> bytes:
+    # Only the rotated-to refresh token's claims are stored, never the tokens.
+    if response.status_code != 200:
+        return response.get_data()
+    claims = decode_token(response.get_json()["refreshToken"])
+    return json.dumps({"jti": claims["jti"], "exp": claims["exp"], "fam": claims["fam"]}).encode()
+
+def replay_refresh(status: int, body: bytes):
+    # Mints a fresh access token and the same refresh token (jti and expiry)
+    # the first request rotated to.
+    if status != 200:
+        return body, status, {"Content-Type": "application/json"}
+    record = json.loads(body)
+    entry = get_user_entry(get_jwt_identity())
+    if not entry:
+        return jsonify({"error": "User not found"}), 404
+    return jsonify({
+        "accessToken": issue_access_token(entry, record["fam"]),
+        "refreshToken": issue_refresh_token(get_jwt_identity(), record["fam"], record["jti"], record["exp"])
+    })
+
+refresh_replay_store = IdempotencyStore(
+    idempotency_backend,
+    identity=request_user_id,
+    ttl=REFRESH_REUSE_GRACE,
+    lock_ttl=idempotency_store.lock_ttl,
+    wait=idempotency_store.wait,
+    encode=refresh_replay_record,
+    decode=replay_refresh
+)
+
 @app.route('/api/auth/refresh', methods=['POST'])
 @jwt_required(refresh=True)
+@idempotent(refresh_replay_store, key=lambda: get_jwt()["jti"])
 def refresh():
-    identity = get_jwt_identity()
-    access_token = create_access_token(identity=identity)
-    return jsonify({"accessToken": access_token})
+    payload = get_jwt()
+    family = payload.get("fam") or uuid.uuid4().hex
+    expires_at = datetime.utcfromtimestamp(payload["exp"])
+    if not token_denylist.revoke(payload["jti"], expires_at, reason='rotated'):
+        # rotated before, and the grace window has passed: the token leaked
+        revoke_token_family(family)
+        db.session.commit()
+        return jsonify({"error": "Refresh token reuse detected"}), 401
+    
+    entry = get_user_entry(get_jwt_identity())
+    if not entry:
+        db.session.rollback()
+        return jsonify({"error": "User not found"}), 404
+    db.session.commit()
+    
+    return jsonify({
+        "accessToken": issue_access_token(entry, family),
+        "refreshToken": issue_refresh_token(get_jwt_identity(), family)
+    })
 
 @app.route('/api/auth/logout', methods=['POST'])
 @jwt_required()
 def logout():
+    payload = get_jwt()
+    token_denylist.revoke(payload["jti"], datetime.utcfromtimestamp(payload["exp"]), reason='logout')
+    if payload.get("fam"):
+        revoke_token_family(payload["fam"])
+    db.session.commit()
     return jsonify({"message": "Logout successful"})
 
 @app.route('/api/auth/user', methods=['GET'])
 @jwt_required()
 def get_current_user():
     user_id = get_jwt_identity()
-    user = User.query.get(user_id)
+    entry = get_user_entry(user_id)
     
-    if not user:
+    if not entry:
         return jsonify({"error": "User not found"}), 404
     
     insights = get_cycle_insights(user_id)
     
-    return jsonify({
-        "id": user.id,
-        "email": user.email,
-        "firstName": user.first_name,
-        "lastName": user.last_name,
-        "dateOfBirth": user.date_of_birth.isoformat() if user.date_of_birth else None,
-        "avgCycleLength": user.avg_cycle_length,
-        "avgPeriodLength": user.avg_period_length,
-        "profileImageUrl": user.profile_image_url,
-        "insights": insights
-    })
+    return jsonify({**entry["user"], "insights": insights})
+
+PROFILE_SCHEMA = Schema({
+    "firstName": Field(str, nullable=True, max_length=100),
+    "lastName": Field(str, nullable=True, max_length=100),
+    "dateOfBirth": Field(date, nullable=True),
+    "avgCycleLength": Field(int, min_value=15, max_value=90),
+    "avgPeriodLength": Field(int, min_value=1, max_value=15),
+    "profileImageUrl": Field(str, nullable=True, max_length=500),
+}, partial=True)
 
 @app.route('/api/user/profile', methods=['PATCH'])
 @jwt_required()
-def update_profile():
+@validate_json(PROFILE_SCHEMA)
+def update_profile(data):
     user_id = get_jwt_identity()
     user = User.query.get(user_id)
     
     if not user:
         return jsonify({"error": "User not found"}), 404
     
-    data = request.get_json()
-    
     if 'firstName' in data:
         user.first_name = data['firstName']
     if 'lastName' in data:
         user.last_name = data['lastName']
     if 'dateOfBirth' in data:
-        user.date_of_birth = datetime.fromisoformat(data['dateOfBirth']).date() if data['dateOfBirth'] else None
+        user.date_of_birth = data['dateOfBirth']
     if 'avgCycleLength' in data:
+        cycle_length_changed = user.avg_cycle_length != data['avgCycleLength']
         user.avg_cycle_length = data['avgCycleLength']
+        if cycle_length_changed:
+            rebuild_symptom_rollups(user_id)
     if 'avgPeriodLength' in data:
         user.avg_period_length = data['avgPeriodLength']
     if 'profileImageUrl' in data:
         user.profile_image_url = data['profileImageUrl']
     
+    if 'avgCycleLength' in data or 'dateOfBirth' in data:
+        refresh_user_daily_state(user_id)
+    if 'avgCycleLength' in data:
+        reschedule_user_notifications(user_id)
+    bump_profile_revision(user)
     db.session.commit()
     
-    return jsonify({
-        "id": user.id,
-        "email": user.email,
-        "firstName": user.first_name,
-        "lastName": user.last_name,
-        "dateOfBirth": user.date_of_birth.isoformat() if user.date_of_birth else None,
-        "avgCycleLength": user.avg_cycle_length,
-        "avgPeriodLength": user.avg_period_length,
-        "profileImageUrl": user.profile_image_url
-    })
+    entry = cache_user(user)
+    family = get_jwt().get("fam") or uuid.uuid4().hex
+    return jsonify({**entry["user"], "accessToken": issue_access_token(entry, family)})
 
 
-@app.route('/api/cycles', methods=['GET'])
-@jwt_required()
-def get_cycles():
-    user_id = get_jwt_identity()
-    cycles = Cycle.query.filter_by(user_id=user_id).order_by(Cycle.start_date.desc()).all()
-    
-    return jsonify([{
+def serialize_cycle(c) -> dict:
+    return {
         "id": c.id,
         "startDate": c.start_date.isoformat(),
         "endDate": c.end_date.isoformat() if c.end_date else None,
         "cycleLength": c.cycle_length,
         "periodLength": c.period_length,
         "notes": c.notes
-    } for c in cycles])
+    }
+
+@app.route('/api/cycles', methods=['GET'])
+@jwt_required()
+def get_cycles():
+    user_id = get_jwt_identity()
+    cycles = Cycle.query.filter_by(user_id=user_id).order_by(Cycle.start_date.desc()).all()
+    
+    return jsonify([serialize_cycle(c) for c in cycles])
+
+CYCLE_FIELDS = {
+    "startDate": Field(date, required=True),
+    "endDate": Field(date, nullable=True),
+    "cycleLength": Field(int, nullable=True, min_value=1, max_value=120),
+    "periodLength": Field(int, nullable=True, min_value=1, max_value=30),
+    "notes": Field(str, nullable=True, max_length=NOTES_MAX_CHARS),
+}
+CYCLE_SCHEMA = Schema(CYCLE_FIELDS)
+CYCLE_UPDATE_SCHEMA = Schema({**CYCLE_FIELDS, "startDate": Field(date)}, partial=True)
 
 @app.route('/api/cycles', methods=['POST'])
 @jwt_required()
-def create_cycle():
+@validate_json(CYCLE_SCHEMA)
+@idempotent(idempotency_store)
+def create_cycle(data):
     user_id = get_jwt_identity()
-    data = request.get_json()
     
     cycle = Cycle(
         user_id=user_id,
-        start_date=datetime.fromisoformat(data['startDate']).date(),
-        end_date=datetime.fromisoformat(data['endDate']).date() if data.get('endDate') else None,
+        start_date=data['startDate'],
+        end_date=data.get('endDate'),
         cycle_length=data.get('cycleLength'),
         period_length=data.get('periodLength'),
         notes=data.get('notes')
     )
     
     db.session.add(cycle)
+    rebuild_symptom_rollups(user_id, since=cycle.start_date)
+    refresh_user_daily_state(user_id)
+    reschedule_user_notifications(user_id)
     db.session.commit()
     
-    return jsonify({
-        "id": cycle.id,
-        "startDate": cycle.start_date.isoformat(),
-        "endDate": cycle.end_date.isoformat() if cycle.end_date else None,
-        "cycleLength": cycle.cycle_length,
-        "periodLength": cycle.period_length,
-        "notes": cycle.notes
-    }), 201
+    return jsonify(serialize_cycle(cycle)), 201
 
 @app.route('/api/cycles/<int:cycle_id>', methods=['PUT'])
 @jwt_required()
-def update_cycle(cycle_id):
+@validate_json(CYCLE_UPDATE_SCHEMA)
+def update_cycle(cycle_id, data):
     user_id = get_jwt_identity()
     cycle = Cycle.query.filter_by(id=cycle_id, user_id=user_id).first()
     
     if not cycle:
         return jsonify({"error": "Cycle not found"}), 404
     
-    data = request.get_json()
+    previous_start = cycle.start_date
     
     if 'startDate' in data:
-        cycle.start_date = datetime.fromisoformat(data['startDate']).date()
+        cycle.start_date = data['startDate']
     if 'endDate' in data:
-        cycle.end_date = datetime.fromisoformat(data['endDate']).date() if data['endDate'] else None
+        cycle.end_date = data['endDate']
     if 'cycleLength' in data:
         cycle.cycle_length = data['cycleLength']
     if 'periodLength' in data:
@@ -495,18 +1275,24 @@ def update_cycle(cycle_id):
     if 'notes' in data:
         cycle.notes = data['notes']
     
+    if cycle.start_date != previous_start:
+        rebuild_symptom_rollups(user_id, since=min(cycle.start_date, previous_start))
+    refresh_user_daily_state(user_id)
+    reschedule_user_notifications(user_id)
     db.session.commit()
     
-    return jsonify({
-        "id": cycle.id,
-        "startDate": cycle.start_date.isoformat(),
-        "endDate": cycle.end_date.isoformat() if cycle.end_date else None,
-        "cycleLength": cycle.cycle_length,
-        "periodLength": cycle.period_length,
-        "notes": cycle.notes
-    })
+    return jsonify(serialize_cycle(cycle))
 
 
+def serialize_symptom(s) -> dict:
+    return {
+        "id": s.id,
+        "date": s.date.isoformat(),
+        "symptomType": s.symptom_type,
+        "severity": s.severity,
+        "notes": s.notes
+    }
+
 @app.route('/api/symptoms', methods=['GET'])
 @jwt_required()
 def get_symptoms():
@@ -520,53 +1306,224 @@ def get_symptoms():
     
     symptoms = query.order_by(Symptom.date.desc()).all()
     
-    return jsonify([{
-        "id": s.id,
-        "date": s.date.isoformat(),
-        "symptomType": s.symptom_type,
-        "severity": s.severity,
-        "notes": s.notes
-    } for s in symptoms])
+    return jsonify([serialize_symptom(s) for s in symptoms])
+
+SYMPTOM_SCHEMA = Schema({
+    "date": Field(date, required=True),
+    "symptomType": Field(str, required=True, max_length=100),
+    "severity": Field(int, min_value=1, max_value=5, default=1),
+    "notes": Field(str, nullable=True, max_length=NOTES_MAX_CHARS),
+})
 
 @app.route('/api/symptoms', methods=['POST'])
 @jwt_required()
-def create_symptom():
-    user_id = get_jwt_identity()
-    data = request.get_json()
-    
-    symptom = Symptom(
-        user_id=user_id,
-        date=datetime.fromisoformat(data['date']).date(),
-        symptom_type=data['symptomType'],
-        severity=data.get('severity', 1),
-        notes=data.get('notes')
-    )
-    
-    db.session.add(symptom)
+@validate_json(SYMPTOM_SCHEMA, many='symptoms')
+@idempotent(idempotency_store)
+def create_symptom(data):
+    # One symptom, or {"symptoms": [...]} for several logged together
+    user_id = int(get_jwt_identity())
+    items = data if isinstance(data, list) else [data]
+    
+    batch = WriteBatch(db.session)
+    rows = [
+        batch.insert(Symptom, user_id=user_id, date=item['date'], symptom_type=item['symptomType'],
+                     severity=item['severity'], notes=item.get('notes'))
+        for item in items
+    ]
+    batch.flush()
+    # Read from the database rather than the token's profile claims: a client
+    # may still hold a token minted before the user changed their cycle length.
+    cycle_length = db.session.query(User.avg_cycle_length).filter(User.id == user_id).scalar()
+    record_symptom_rollups(user_id, rows, cycle_length=cycle_length)
     db.session.commit()
     
-    return jsonify({
-        "id": symptom.id,
-        "date": symptom.date.isoformat(),
-        "symptomType": symptom.symptom_type,
-        "severity": symptom.severity,
-        "notes": symptom.notes
-    }), 201
+    created = [serialize_symptom(Symptom(**row)) for row in rows]
+    return jsonify(created if isinstance(data, list) else created[0]), 201
 
-
-@app.route('/api/chat', methods=['GET'])
+@app.route('/api/symptoms/stats', methods=['GET'])
 @jwt_required()
-def get_chat_history():
+def get_symptoms_stats():
     user_id = get_jwt_identity()
-    messages = ChatHistory.query.filter_by(user_id=user_id).order_by(ChatHistory.created_at.asc()).all()
-    
-    return jsonify([{
+    days = request.args.get('days', type=int)
+    weeks = min(max(request.args.get('weeks', 8, type=int), 2), 52)
+    return jsonify(get_symptom_stats(user_id, days=days, weeks=weeks))
+
+@app.cli.command('rebuild-symptom-rollups')
+def rebuild_symptom_rollups_command():
+    user_ids = [row[0] for row in db.session.query(User.id)]
+    for user_id in user_ids:
+        with partition_router.scope(user_id):
+            rebuild_symptom_rollups(user_id)
+            db.session.commit()
+    print(f"Rebuilt symptom rollups for {len(user_ids)} users")
+
+@app.cli.command('schedule-notifications')
+@click.option('--chunk-size', default=1000, show_default=True)
+def schedule_notifications_command(chunk_size):
+    total = schedule_all_notifications(chunk_size=chunk_size)
+    print(f"Scheduled reminders for {total} users")
+
+@app.cli.command('dispatch-notifications')
+def dispatch_notifications_command():
+    print(f"Dispatched {dispatch_due_notifications()} notifications")
+
+@app.cli.command('precompute-daily-state')
+@click.option('--chunk-size', default=1000, show_default=True)
+def precompute_daily_state_command(chunk_size):
+    total = precompute_daily_states(chunk_size=chunk_size)
+    print(f"Precomputed daily state for {total} users")
+
+def replace_user_conditions(user_id: int, condition_flags: int):
+    UserCondition.query.filter_by(user_id=user_id).delete(synchronize_session=False)
+    rows = [{"user_id": user_id, "condition": code} for code in condition_codes(condition_flags)]
+    if rows:
+        db.session.execute(db.insert(UserCondition), rows)
+
+def cohort_query(condition: str = None, phase: str = None, profile_mode: str = None, today=None):
+    # User ids of completed onboardings matching every given filter; each
+    # filter is served by an index (user_conditions, user_daily_state.phase,
+    # user_onboarding.profile_mode).
+    query = db.session.query(UserOnboarding.user_id).filter(UserOnboarding.is_completed.is_(True))
+    if condition:
+        query = query.join(UserCondition, db.and_(
+            UserCondition.user_id == UserOnboarding.user_id,
+            UserCondition.condition == encode_choice(condition, HEALTH_CONDITIONS)
+        ))
+    if phase:
+        query = query.join(UserDailyState, UserDailyState.user_id == UserOnboarding.user_id).filter(
+            UserDailyState.phase == phase,
+            UserDailyState.state_date == (today or date.today())
+        )
+    if profile_mode:
+        query = query.filter(UserOnboarding.profile_mode == profile_mode)
+    return query
+
+LEGACY_ONBOARDING_COLUMNS = (
+    'typical_cycle_length', 'period_duration', 'cycle_variability', 'health_conditions',
+    'fertility_tracking', 'track_symptoms', 'dynamic_predictions', 'stress_level', 'sleep_pattern',
+)
+
+def backfill_onboarding(chunk_size: int = 1000) -> int:
+    return sum(backfill_partition_onboarding(db.engines[key], chunk_size) for key in partition_router.each_partition())
+
+def backfill_partition_onboarding(engine, chunk_size: int) -> int:
+    # Older databases still carry the free-text answer columns; rows written
+    # before the typed columns existed are converted from them in chunks.
+    existing = {c['name'] for c in db.inspect(engine).get_columns(UserOnboarding.__tablename__)}
+    if not existing.issuperset(LEGACY_ONBOARDING_COLUMNS):
+        return 0
+    legacy = db.table(
+        UserOnboarding.__tablename__,
+        db.column('id'), db.column('user_id'), db.column('cycle_length_days'),
+        *[db.column(name, db.JSON if name in ('health_conditions', 'fertility_tracking') else db.String)
+          for name in LEGACY_ONBOARDING_COLUMNS]
+    )
+    total = 0
+    while True:
+        rows = db.session.execute(
+            db.select(legacy).where(legacy.c.cycle_length_days.is_(None)).limit(chunk_size)
+        ).mappings().all()
+        if not rows:
+            return total
+        batch = WriteBatch(db.session)
+        for row in rows:
+            fields = normalize_onboarding(**{name: row[name] for name in LEGACY_ONBOARDING_COLUMNS})
+            # profile_mode and the derived flags were already stored correctly
+            for name in ('profile_mode', 'is_irregular', 'show_buffer_days'):
+                fields.pop(name)
+            batch.update(UserOnboarding, id=row['id'], **fields)
+            replace_user_conditions(row['user_id'], fields['condition_flags'])
+        batch.commit()
+        total += len(rows)
+
+@app.cli.command('backfill-onboarding')
+@click.option('--chunk-size', default=1000, show_default=True)
+def backfill_onboarding_command(chunk_size):
+    total = backfill_onboarding(chunk_size=chunk_size)
+    print(f"Backfilled typed onboarding answers for {total} users")
+
+def plan_rebalance(chunk_size: int = 1000):
+    # Yields (user_id, current, target) for every user whose hashed
+    # partition differs from the one holding their rows.
+    last_id = 0
+    while True:
+        user_ids = [row[0] for row in db.session.query(User.id).filter(
+            User.id > last_id
+        ).order_by(User.id).limit(chunk_size)]
+        if not user_ids:
+            return
+        placed = partition_router.lookup(user_ids)
+        for user_id in user_ids:
+            current = placed.get(user_id, (0, False))[0]
+            target = partition_router.target_for(user_id)
+            if current != target:
+                yield user_id, current, target
+        last_id = user_ids[-1]
+
+@app.cli.command('rebalance-partitions')
+@click.option('--batch-size', default=100, show_default=True, help='Users fenced off and moved per settle wait')
+@click.option('--limit', type=int, help='Move at most this many users')
+@click.option('--settle-seconds', type=float, help='Wait after fencing users off (default: cache TTL + 30s)')
+@click.option('--dry-run', is_flag=True)
+def rebalance_partitions_command(batch_size, limit, settle_seconds, dry_run):
+    planned, moved, pending = {}, 0, []
+    for user_id, current, target in plan_rebalance():
+        if limit is not None and sum(planned.values()) >= limit:
+            break
+        planned[(current, target)] = planned.get((current, target), 0) + 1
+        if dry_run:
+            continue
+        pending.append((user_id, target))
+        if len(pending) >= batch_size:
+            moved += len(partition_router.move_users(pending, settle=settle_seconds))
+            pending = []
+    if pending:
+        moved += len(partition_router.move_users(pending, settle=settle_seconds))
+    for (current, target), count in sorted(planned.items()):
+        print(f"partition {current} -> {target}: {count} users")
+    print(f"Planned {sum(planned.values())} moves" if dry_run else f"Moved {moved} users")
+
+@app.cli.command('move-user-partition')
+@click.argument('user_id', type=int)
+@click.argument('partition', type=int)
+@click.option('--settle-seconds', type=float, help='Wait after fencing the user off (default: cache TTL + 30s)')
+def move_user_partition_command(user_id, partition, settle_seconds):
+    if not 0 <= partition < len(partition_router.keys):
+        raise click.BadParameter(f"must be between 0 and {len(partition_router.keys) - 1}", param_hint='PARTITION')
+    copied = partition_router.move_users([(user_id, partition)], settle=settle_seconds)
+    print(f"Moved user {user_id} ({copied[user_id]} rows)" if copied else f"User {user_id} is already on partition {partition}")
+
+
+def serialize_chat_message(m) -> dict:
+    return {
         "id": m.id,
         "role": m.role,
         "content": m.content,
         "cyclePhase": m.cycle_phase,
         "createdAt": m.created_at.isoformat()
-    } for m in messages])
+    }
+
+# same shape as serialize_chat_message; ?fields=id,role,createdAt skips the content
+CHAT_MESSAGE_FIELDS = FieldSet(ChatHistory, {
+    "id": "id",
+    "role": "role",
+    "content": "content",
+    "cyclePhase": "cycle_phase",
+    "createdAt": ("created_at", datetime.isoformat),
+})
+
+@app.route('/api/chat', methods=['GET'])
+@jwt_required()
+def get_chat_history():
+    names, error = CHAT_MESSAGE_FIELDS.from_request()
+    if error:
+        return error
+    user_id = get_jwt_identity()
+    messages = ChatHistory.query.filter_by(user_id=user_id).options(
+        CHAT_MESSAGE_FIELDS.load_options(names)
+    ).order_by(ChatHistory.created_at.asc()).all()
+    
+    return jsonify([CHAT_MESSAGE_FIELDS.serialize(m, names) for m in messages])
 
 ARIVAI_KNOWLEDGE_BASE = """
 ARIVAI AI WELLNESS KNOWLEDGE BASE - CORE PRINCIPLES
@@ -646,45 +1603,155 @@ MANDATORY DISCLAIMER (include when relevant):
 "I can't provide medical advice or suggest medication. If this symptom feels unusual, severe, or persistent, it's important to consult a qualified healthcare professional."
 """
 
+# Rules that apply to every answer stay in the prompt; the reference sections
+# are retrieved per message alongside the article and recipe tables.
+CORE_SECTION_PREFIXES = ('WHAT ARIVAI', 'RED-FLAG', 'EMOTIONAL SAFETY', 'MANDATORY')
+KNOWLEDGE_BASE_SECTIONS = chunk_sections(ARIVAI_KNOWLEDGE_BASE, 'knowledge_base')
+ARIVAI_CORE_PRINCIPLES = "\n\n".join(
+    f"{p.title}:\n{p.text}" for p in KNOWLEDGE_BASE_SECTIONS if p.title.startswith(CORE_SECTION_PREFIXES)
+)
+
+CHAT_CONTEXT_TOP_K = int(os.environ.get('CHAT_CONTEXT_TOP_K', 6))
+CHAT_CONTEXT_TOKEN_BUDGET = int(os.environ.get('CHAT_CONTEXT_TOKEN_BUDGET', 700))
+
+def load_chat_context_passages() -> list:
+    passages = [p for p in KNOWLEDGE_BASE_SECTIONS if not p.title.startswith(CORE_SECTION_PREFIXES)]
+    
+    articles = db.session.query(EducationalContent.title, EducationalContent.body, EducationalContent.phase)
+    for title, body, phase in articles:
+        passages += chunk_article(title, body or '', 'education', phase)
+    
+    recipes = db.session.query(Recipe.title, Recipe.description, Recipe.ingredients, Recipe.phase)
+    for title, description, ingredients, phase in recipes:
+        text = f"{description or ''}\nIngredients: {', '.join(ingredients or [])}"
+        passages.append(Passage('recipe', f"Recipe: {title}", text, phase))
+    return passages
+
+def build_chat_context(message: str, phase: str) -> str:
+    hits = chat_context_index.get().search(message, k=CHAT_CONTEXT_TOP_K, phase=phase)
+    passages = pack_passages(hits, CHAT_CONTEXT_TOKEN_BUDGET)
+    if not passages:
+        return "- No specific reference material matched; rely on the principles above."
+    return "\n\n".join(f"{p.title}:\n{p.text}" for p in passages)
+
+GEMINI_CHAT_MODEL = "gemini-2.0-flash"
+GEMINI_USAGE_RETENTION_DAYS = int(os.environ.get('GEMINI_USAGE_RETENTION_DAYS', 90))
+
+def write_gemini_usage(rows: list):
+    db.session.execute(db.insert(GeminiUsage), rows)
+    db.session.commit()
+
+def load_gemini_tokens_used(user_ids: list, day: date) -> dict:
+    return dict(db.session.query(GeminiUsage.user_id, db.func.sum(GeminiUsage.total_tokens)).filter(
+        GeminiUsage.user_id.in_(user_ids),
+        GeminiUsage.created_at >= datetime.combine(day, datetime.min.time())
+    ).group_by(GeminiUsage.user_id))
+
+usage_budget = UsageBudget(int(os.environ.get('GEMINI_DAILY_TOKEN_BUDGET', 0)), load_gemini_tokens_used)
+usage_ledger = UsageLedger(
+    app, write_gemini_usage,
+    interval=float(os.environ.get('GEMINI_USAGE_FLUSH_SECONDS', 5)),
+    batch_size=int(os.environ.get('GEMINI_USAGE_BATCH_SIZE', 500)),
+    after_flush=usage_budget.flushed
+)
+
+def record_gemini_usage(user_id, outcome: str, prompt: str = '', started: float = None, usage=None):
+    # usage is the SDK's usage_metadata; counts are missing on failed calls
+    prompt_tokens = (usage and usage.prompt_token_count) or 0
+    output_tokens = (usage and usage.candidates_token_count) or 0
+    total_tokens = (usage and usage.total_token_count) or prompt_tokens + output_tokens
+    now = datetime.utcnow()
+    # charged before it is queued, so the ledger can't write it first
+    usage_budget.charge(int(user_id), total_tokens, now.date())
+    usage_ledger.record(
+        user_id=int(user_id), endpoint='chat', model=GEMINI_CHAT_MODEL, outcome=outcome,
+        prompt_tokens=prompt_tokens, output_tokens=output_tokens, total_tokens=total_tokens,
+        prompt_chars=len(prompt),
+        latency_ms=int((time.perf_counter() - started) * 1000) if started is not None else None,
+        created_at=now
+    )
+
+def purge_gemini_usage() -> int:
+    cutoff = datetime.utcnow() - timedelta(days=GEMINI_USAGE_RETENTION_DAYS)
+    deleted = GeminiUsage.query.filter(GeminiUsage.created_at < cutoff).delete(synchronize_session=False)
+    db.session.commit()
+    return deleted
+
+CHAT_DEADLINE_SECONDS = float(os.environ.get('CHAT_DEADLINE_SECONDS', 20))
+
+gemini_admission = AdmissionController(
+    initial_limit=float(os.environ.get('GEMINI_CONCURRENCY_INITIAL', 4)),
+    min_limit=float(os.environ.get('GEMINI_CONCURRENCY_MIN', 1)),
+    max_limit=float(os.environ.get('GEMINI_CONCURRENCY_MAX', 8)),
+    target_latency=float(os.environ.get('GEMINI_TARGET_LATENCY_MS', 6000)) / 1000,
+    max_queue=int(os.environ.get('GEMINI_QUEUE_SIZE', 4))
+)
+
+def chat_deadline() -> float:
+    # A client with a shorter timeout can send X-Request-Deadline-Ms so we
+    # don't spend an upstream call on an answer it will never read.
+    budget = CHAT_DEADLINE_SECONDS
+    requested = request.headers.get('X-Request-Deadline-Ms', type=int)
+    if requested and requested > 0:
+        budget = min(budget, requested / 1000)
+    return time.monotonic() + budget
+
+def is_upstream_overloaded(error: Exception) -> bool:
+    code = getattr(error, 'code', None)
+    return code in (429, 503) or any(s in str(error) for s in ('RESOURCE_EXHAUSTED', 'UNAVAILABLE'))
+
+CHAT_MESSAGE_MAX_CHARS = int(os.environ.get('CHAT_MESSAGE_MAX_CHARS', 4000))
+CHAT_SCHEMA = Schema({
+    "content": Field(str, nullable=True, max_length=CHAT_MESSAGE_MAX_CHARS, default=''),
+    "message": Field(str, nullable=True, max_length=CHAT_MESSAGE_MAX_CHARS, default=''),
+})
+
 @app.route('/api/chat', methods=['POST'])
 @jwt_required()
-def send_chat_message():
+@validate_json(CHAT_SCHEMA)
+@idempotent(idempotency_store)
+async def send_chat_message(data):
     user_id = get_jwt_identity()
-    data = request.get_json()
-    user_message = data.get('content', '') or data.get('message', '')
+    user_message = (data['content'] or data['message'] or '').strip()
+    if not user_message:
+        return jsonify({"error": "content is required", "fields": {"content": "is required"}}), 400
     
     insights = get_cycle_insights(user_id)
     phase = insights.get('phase', 'Follicular') if insights else 'Follicular'
-    
-    import uuid
-    user_chat = ChatHistory(
-        id=str(uuid.uuid4()),
-        user_id=user_id,
-        role='user',
-        content=user_message,
-        cycle_phase=phase
-    )
-    db.session.add(user_chat)
+    user_sent_at = datetime.utcnow()
     
     current_api_key = os.environ.get('GEMINI_API_KEY')
-    print(f"[Chat] GEMINI_API_KEY available: {bool(current_api_key)}")
+    deadline = chat_deadline()
+    reply_started = time.perf_counter()
+    source = 'fallback'
     
     try:
-        if current_api_key:
-            print("[Chat] Calling Gemini API...")
+        if current_api_key and not usage_budget.allow(int(user_id), datetime.utcnow().date()):
+            source = 'budget_exhausted'
+            record_gemini_usage(user_id, 'budget_exhausted')
+            ai_response = get_fallback_response(phase, user_message)
+        elif current_api_key:
             client = genai.Client(api_key=current_api_key)
             
-            recent_messages = ChatHistory.query.filter_by(user_id=user_id).order_by(ChatHistory.created_at.desc()).limit(10).all()
+            # Nothing is pending in the session, so this read can't trigger an
+            # autoflush; the current turn is appended from memory instead.
+            recent_messages = db.session.query(ChatHistory.role, ChatHistory.content).filter_by(
+                user_id=user_id
+            ).order_by(ChatHistory.created_at.desc()).limit(9).all()
             recent_messages.reverse()
+            recent_messages.append(('user', user_message))
             
             conversation_history = ""
-            for msg in recent_messages:
-                role = "User" if msg.role == "user" else "ARIVAI"
-                conversation_history += f"{role}: {msg.content}\n"
+            for msg_role, msg_content in recent_messages:
+                role = "User" if msg_role == "user" else "ARIVAI"
+                conversation_history += f"{role}: {msg_content}\n"
             
             system_prompt = f"""You are ARIVAI, a warm, empathetic AI wellness companion specializing in menstrual health and women's wellness.
 
-{ARIVAI_KNOWLEDGE_BASE}
+{ARIVAI_CORE_PRINCIPLES}
+
+RELEVANT KNOWLEDGE:
+{build_chat_context(user_message, phase)}
 
 CURRENT USER CONTEXT:
 - Current cycle phase: {phase}
@@ -706,38 +1773,109 @@ User: {user_message}
 
 Respond naturally and helpfully:"""
             
-            response = client.models.generate_content(
-                model="gemini-2.0-flash",
-                contents=system_prompt
-            )
-            ai_response = response.text
-            print(f"[Chat] Gemini response received: {len(ai_response)} chars")
+            try:
+                await gemini_admission.acquire(deadline)
+            except AdmissionRejected as e:
+                # over capacity or out of time: answer locally instead of queueing
+                source = f'shed_{e.reason}'
+                record_gemini_usage(user_id, 'shed', prompt=system_prompt)
+                ai_response = get_fallback_response(phase, user_message)
+            else:
+                started = time.perf_counter()
+                congested = False
+                try:
+                    with profile_span('gemini'):
+                        response = await asyncio.wait_for(
+                            client.aio.models.generate_content(
+                                model=GEMINI_CHAT_MODEL,
+                                contents=system_prompt
+                            ),
+                            timeout=max(0.0, deadline - time.monotonic())
+                        )
+                except asyncio.TimeoutError:
+                    congested = True
+                    record_gemini_usage(user_id, 'deadline_exceeded', prompt=system_prompt, started=started)
+                    source = 'deadline_exceeded'
+                    response = None
+                except Exception as e:
+                    congested = is_upstream_overloaded(e)
+                    record_gemini_usage(user_id, 'error', prompt=system_prompt, started=started)
+                    raise
+                finally:
+                    gemini_admission.release(time.perf_counter() - started, congested)
+                if response is None:
+                    ai_response = get_fallback_response(phase, user_message)
+                else:
+                    record_gemini_usage(user_id, 'ok', prompt=system_prompt, started=started,
+                                        usage=getattr(response, 'usage_metadata', None))
+                    ai_response = response.text
+                    source = 'gemini'
         else:
-            print("[Chat] No API key, using fallback")
             ai_response = get_fallback_response(phase, user_message)
-    except Exception as e:
-        print(f"[Chat] Gemini API error: {type(e).__name__}: {e}")
-        import traceback
-        traceback.print_exc()
+    except Exception:
+        logger.exception('chat.gemini_error', extra={"userId": int(user_id)})
+        source = 'gemini_error'
         ai_response = get_fallback_response(phase, user_message)
+    logger.info('chat.reply', extra={
+        "userId": int(user_id), "source": source, "chars": len(ai_response),
+        "durationMs": round((time.perf_counter() - reply_started) * 1000, 2)
+    })
     
-    assistant_chat = ChatHistory(
-        id=str(uuid.uuid4()),
-        user_id=user_id,
-        role='assistant',
-        content=ai_response,
-        cycle_phase=phase
-    )
-    db.session.add(assistant_chat)
-    db.session.commit()
+    batch = WriteBatch(db.session)
+    batch.insert(ChatHistory, user_id=int(user_id), role='user', content=user_message,
+                 cycle_phase=phase, created_at=user_sent_at)
+    batch.insert(ChatHistory, user_id=int(user_id), role='assistant', content=ai_response,
+                 cycle_phase=phase, created_at=datetime.utcnow())
+    batch.commit()
     
     return jsonify({
         "message": ai_response,
         "phase": phase
     })
 
+MEDICAL_DISCLAIMER = "I can't provide medical advice or suggest medication. If this symptom feels unusual, severe, or persistent, it's important to consult a qualified healthcare professional."
+
+FALLBACK_ADVICE_TOPICS = [
+    ("nutrition", set(tokenize("eat food foods diet nutrition craving cravings hungry meal snack recipe iron magnesium hydration water"))),
+    ("exercise", set(tokenize("exercise workout gym run running yoga walk training sport movement active"))),
+    ("meditation", set(tokenize("meditation meditate breathing breathe calm relax relaxation sleep insomnia stress"))),
+    ("mood", set(tokenize("mood sad anxious anxiety irritable emotional cry crying angry low motivation energy tired"))),
+]
+
+RED_FLAG_TERMS = set(tokenize(
+    "severe unbearable heavy clot clots faint fainting dizzy dizziness depressed depression "
+    "hopeless suicidal missed unusual emergency"
+))
+
+def build_fallback_index() -> BM25Index:
+    passages = chunk_sections(ARIVAI_KNOWLEDGE_BASE, 'knowledge_base', skip_prefixes=('WHAT ARIVAI', 'MANDATORY'))
+    for article in get_default_educational_content():
+        passages += chunk_article(article['title'], article['body'], 'education', article['phase'])
+    return BM25Index(passages)
+
+def format_fallback_passage(passage: Passage, query_tokens: set) -> str:
+    lines = passage.text.splitlines()
+    relevant = [line for line in lines if query_tokens & set(tokenize(line))]
+    title = passage.title.capitalize() if passage.title.split()[0].isupper() else passage.title
+    return f"From {title}:\n" + "\n".join((relevant or lines)[:4])
+
 def get_fallback_response(phase: str, message: str) -> str:
     advice = get_daily_advice(phase)
+    query_tokens = set(tokenize(message or ''))
+    hits = fallback_index.search(message, k=2, phase=phase, min_score=1.0) if query_tokens else []
+    
+    if hits:
+        parts = [f"I'm here to support you during your {phase} phase. Here's what may help:"]
+        parts += [format_fallback_passage(passage, query_tokens) for _, passage in hits]
+        for topic, keywords in FALLBACK_ADVICE_TOPICS:
+            if query_tokens & keywords:
+                parts.append(f"For your {phase} phase: {advice[topic]}")
+                break
+        if query_tokens & RED_FLAG_TERMS:
+            parts.append(MEDICAL_DISCLAIMER)
+        parts.append("Is there anything else about your cycle or wellness I can help you with?")
+        return "\n\n".join(parts)
+    
     return f"""I'm here to support you during your {phase} phase! 
 
 {advice['mood']}
@@ -749,37 +1887,55 @@ For exercise: {advice['exercise']}
 Is there something specific about your cycle or wellness I can help you with?"""
 
 
+def cached_catalog(key: str, loader, fields: FieldSet, names: tuple, phase: str = None, category: str = None):
+    # One entry per view; other field lists are cut from the smallest view
+    # that has them.
+    view = fields.smallest_view(names)
+    loaded = fields.views[view]
+    items = catalog_cache.get_or_compute(f"{key}:{view}:{phase}:{category}", lambda: loader(phase, category, names=loaded))
+    return fields.project(items, names, loaded)
+
+RECIPE_FIELDS = FieldSet(Recipe, {
+    "id": "id",
+    "title": "title",
+    "description": "description",
+    "imageUrl": "image_url",
+    "ingredients": "ingredients",
+    "instructions": "instructions",
+    "phase": "phase",
+    "category": "category",
+    "prepTime": "prep_time",
+    "calories": "calories"
+}, summary=("id", "title", "description", "imageUrl", "phase", "category", "prepTime", "calories"))
+
 @app.route('/api/recipes', methods=['GET'])
 @jwt_required()
 def get_recipes():
+    names, error = RECIPE_FIELDS.from_request()
+    if error:
+        return error
     phase = request.args.get('phase')
     category = request.args.get('category')
-    
-    query = Recipe.query
+    search = request.args.get('q')
+    if search:
+        # free-text queries are too varied to be worth caching
+        return jsonify(load_recipes(phase, category, search, names))
+    return jsonify(cached_catalog('recipes', load_recipes, RECIPE_FIELDS, names, phase, category))
+
+def load_recipes(phase: str = None, category: str = None, search: str = None, names: tuple = RECIPE_FIELDS.views[FULL]):
+    query = Recipe.query.options(RECIPE_FIELDS.load_options(names))
     
     if phase:
         query = query.filter_by(phase=phase)
     if category:
         query = query.filter_by(category=category)
     
+    if search:
+        query = filter_by_search_tokens(query, Recipe, search)
+    
     recipes = query.all()
     
-    if not recipes:
-        recipes = get_default_recipes(phase)
-        return jsonify(recipes)
-    
-    return jsonify([{
-        "id": r.id,
-        "title": r.title,
-        "description": r.description,
-        "imageUrl": r.image_url,
-        "ingredients": r.ingredients,
-        "instructions": r.instructions,
-        "phase": r.phase,
-        "category": r.category,
-        "prepTime": r.prep_time,
-        "calories": r.calories
-    } for r in recipes])
+    return [RECIPE_FIELDS.serialize(r, names) for r in recipes]
 
 def get_default_recipes(phase: str = None):
     default_recipes = [
@@ -850,35 +2006,47 @@ def get_default_recipes(phase: str = None):
     return default_recipes
 
 
+MEDITATION_FIELDS = FieldSet(MeditationVideo, {
+    "id": "id",
+    "title": "title",
+    "description": "description",
+    "url": "url",
+    "thumbnailUrl": "thumbnail_url",
+    "category": "category",
+    "durationSeconds": "duration_seconds",
+    "phase": "phase"
+}, summary=("id", "title", "url", "thumbnailUrl", "category", "durationSeconds", "phase"))
+
 @app.route('/api/meditation-videos', methods=['GET'])
 @jwt_required()
 def get_meditation_videos():
+    names, error = MEDITATION_FIELDS.from_request()
+    if error:
+        return error
     phase = request.args.get('phase')
     category = request.args.get('category')
-    
-    query = MeditationVideo.query
+    search = request.args.get('q')
+    if search:
+        # free-text queries are too varied to be worth caching
+        return jsonify(load_meditation_videos(phase, category, search, names))
+    return jsonify(cached_catalog('meditation', load_meditation_videos, MEDITATION_FIELDS, names, phase, category))
+
+def load_meditation_videos(phase: str = None, category: str = None, search: str = None,
+                           names: tuple = MEDITATION_FIELDS.views[FULL]):
+    query = MeditationVideo.query.options(MEDITATION_FIELDS.load_options(names))
     
     if phase:
-        query = query.filter_by(phase=phase)
+        # videos without a phase suit every phase
+        query = query.filter(db.or_(MeditationVideo.phase == phase, MeditationVideo.phase.is_(None)))
     if category:
         query = query.filter_by(category=category)
     
+    if search:
+        query = filter_by_search_tokens(query, MeditationVideo, search)
+    
     videos = query.all()
     
-    if not videos:
-        videos = get_default_meditation_videos(phase)
-        return jsonify(videos)
-    
-    return jsonify([{
-        "id": v.id,
-        "title": v.title,
-        "description": v.description,
-        "url": v.url,
-        "thumbnailUrl": v.thumbnail_url,
-        "category": v.category,
-        "durationSeconds": v.duration_seconds,
-        "phase": v.phase
-    } for v in videos])
+    return [MEDITATION_FIELDS.serialize(v, names) for v in videos]
 
 def get_default_meditation_videos(phase: str = None):
     default_videos = [
@@ -939,34 +2107,45 @@ def get_default_meditation_videos(phase: str = None):
     return default_videos
 
 
+ARTICLE_FIELDS = FieldSet(EducationalContent, {
+    "id": "id",
+    "title": "title",
+    "summary": "summary",
+    "body": "body",
+    "category": "category",
+    "phase": "phase",
+    "imageUrl": "image_url"
+}, summary=("id", "title", "summary", "category", "phase", "imageUrl"))
+
 @app.route('/api/educational-content', methods=['GET'])
 @jwt_required()
 def get_educational_content():
+    names, error = ARTICLE_FIELDS.from_request()
+    if error:
+        return error
     category = request.args.get('category')
     phase = request.args.get('phase')
-    
-    query = EducationalContent.query
+    search = request.args.get('q')
+    if search:
+        # free-text queries are too varied to be worth caching
+        return jsonify(load_educational_content(phase, category, search, names))
+    return jsonify(cached_catalog('education', load_educational_content, ARTICLE_FIELDS, names, phase, category))
+
+def load_educational_content(phase: str = None, category: str = None, search: str = None,
+                             names: tuple = ARTICLE_FIELDS.views[FULL]):
+    query = EducationalContent.query.options(ARTICLE_FIELDS.load_options(names))
     
     if category:
         query = query.filter_by(category=category)
     if phase:
         query = query.filter_by(phase=phase)
     
-    content = query.all()
+    if search:
+        query = filter_by_search_tokens(query, EducationalContent, search)
     
-    if not content:
-        content = get_default_educational_content(category)
-        return jsonify(content)
+    content = query.all()
     
-    return jsonify([{
-        "id": c.id,
-        "title": c.title,
-        "summary": c.summary,
-        "body": c.body,
-        "category": c.category,
-        "phase": c.phase,
-        "imageUrl": c.image_url
-    } for c in content])
+    return [ARTICLE_FIELDS.serialize(c, names) for c in content]
 
 def get_default_educational_content(category: str = None):
     default_content = [
@@ -1061,6 +2240,247 @@ def get_default_educational_content(category: str = None):
     return default_content
 
 
+CATALOG_MODELS = {
+    'recipes': Recipe,
+    'meditation_videos': MeditationVideo,
+    'educational_content': EducationalContent,
+}
+
+ADMIN_EMAILS = {email.strip().lower() for email in os.environ.get('ADMIN_EMAILS', '').split(',') if email.strip()}
+
+def admin_required(view):
+    @wraps(view)
+    @jwt_required()
+    def wrapper(*args, **kwargs):
+        entry = get_user_entry(get_jwt_identity())
+        if not entry or entry["user"]["email"].lower() not in ADMIN_EMAILS:
+            return jsonify({"error": "Admin access required"}), 403
+        return view(*args, **kwargs)
+    return wrapper
+
+def filter_by_search_tokens(query, model, search: str):
+    # search_tokens is a sorted, space-separated token set written at ingest
+    for token in set(tokenize(search)):
+        query = query.filter(db.literal(' ').concat(model.search_tokens).concat(' ').like(f'% {token} %'))
+    return query
+
+def rebuild_catalog_facets(content_type: str):
+    model = CATALOG_MODELS[content_type]
+    CatalogFacet.query.filter_by(content_type=content_type).delete(synchronize_session=False)
+    rows = []
+    for facet in ('phase', 'category'):
+        column = getattr(model, facet)
+        for value, count in db.session.query(column, db.func.count(model.id)).group_by(column):
+            rows.append({"content_type": content_type, "facet": facet, "value": value, "count": count})
+    if rows:
+        db.session.execute(db.insert(CatalogFacet), rows)
+    db.session.commit()
+
+def catalog_content_changed(content_type: str):
+    rebuild_catalog_facets(content_type)
+    catalog_cache.clear()
+    chat_context_index.invalidate()
+
+def default_catalog_records(content_type: str):
+    defaults = {
+        'recipes': get_default_recipes,
+        'meditation_videos': get_default_meditation_videos,
+        'educational_content': get_default_educational_content,
+    }[content_type]()
+    return enumerate(defaults)
+
+def backfill_catalog_search():
+    for content_type, model in CATALOG_MODELS.items():
+        filled = backfill_derived_columns(db.session, model, content_type)
+        if filled:
+            logger.info('catalog.backfilled', extra={"contentType": content_type, "items": filled})
+
+def seed_default_catalog():
+    # Tables that are still empty get the built-in items once, so listings
+    # never have to fall back to the hard-coded lists per request.
+    for content_type, model in CATALOG_MODELS.items():
+        if db.session.query(model.id).first() is not None:
+            continue
+        report = ingest_records(db.session, model, content_type, default_catalog_records(content_type))
+        rebuild_catalog_facets(content_type)
+        logger.info('catalog.seeded', extra={"contentType": content_type, "items": report.upserted})
+
+@app.route('/api/catalog/facets', methods=['GET'])
+@jwt_required()
+def get_catalog_facets():
+    def load():
+        facets = {content_type: {"phase": [], "category": []} for content_type in CATALOG_MODELS}
+        for f in CatalogFacet.query.order_by(CatalogFacet.content_type, CatalogFacet.facet, CatalogFacet.count.desc()):
+            facets[f.content_type][f.facet].append({"value": f.value, "count": f.count})
+        return facets
+    return jsonify(catalog_cache.get_or_compute("facets", load))
+
+@app.route('/api/admin/content/<content_type>', methods=['POST'])
+@admin_required
+def ingest_content(content_type):
+    model = CATALOG_MODELS.get(content_type)
+    if model is None:
+        return jsonify({"error": f"Unknown content type {content_type}"}), 404
+    
+    # JSON bodies are parsed whole; CSV and JSON Lines are streamed
+    if request.is_json:
+        data = request.get_json()
+        records = enumerate(data if isinstance(data, list) else [data])
+    elif request.mimetype in ('text/csv', 'application/x-ndjson', 'application/jsonl'):
+        fmt = 'csv' if request.mimetype == 'text/csv' else 'jsonl'
+        records = iter_records(open_text(request.stream), fmt)
+    else:
+        return jsonify({"error": "Send application/json, application/x-ndjson or text/csv"}), 415
+    
+    report = ingest_records(db.session, model, content_type, records,
+                            batch_size=request.args.get('batchSize', 500, type=int))
+    catalog_content_changed(content_type)
+    return jsonify(report.to_dict())
+
+@app.cli.command('ingest-content')
+@click.argument('content_type', type=click.Choice(list(CATALOG_MODELS)))
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--batch-size', default=500, show_default=True)
+def ingest_content_command(content_type, path, batch_size):
+    with open(path, encoding='utf-8', newline='') as f:
+        report = ingest_records(db.session, CATALOG_MODELS[content_type], content_type,
+                                iter_records(f, format_for_path(path)), batch_size=batch_size)
+    catalog_content_changed(content_type)
+    print(f"Upserted {report.upserted} {content_type}, rejected {report.rejected}")
+    for error in report.errors:
+        print(f"  {error['position']}: {error['error']}")
+
+@app.cli.command('seed-catalog')
+def seed_catalog_command():
+    for content_type, model in CATALOG_MODELS.items():
+        report = ingest_records(db.session, model, content_type, default_catalog_records(content_type))
+        catalog_content_changed(content_type)
+        print(f"Upserted {report.upserted} default {content_type}")
+
+
+ANALYTICS_SNAPSHOT_DIR = os.environ.get(
+    'ANALYTICS_SNAPSHOT_DIR', str(pathlib.Path(__file__).parent / 'analytics_snapshots')
+)
+ANALYTICS_SNAPSHOT_RETENTION = int(os.environ.get('ANALYTICS_SNAPSHOT_RETENTION', 7))
+
+analytics_store = SnapshotStore(ANALYTICS_SNAPSHOT_DIR)
+
+def export_analytics_snapshot() -> str:
+    # One streamed pass per table; reports then run against the files only.
+    today = date.today()
+    writer = SnapshotWriter(ANALYTICS_SNAPSHOT_DIR)
+    # Users are on the main database and onboarding answers on the
+    # partitions, so only the non-default answers are held in memory.
+    profiles = {}
+    for _ in partition_router.each_partition():
+        profiles.update((user_id, (mode or 'regular', bool(irregular))) for user_id, mode, irregular in db.session.query(
+            UserOnboarding.user_id, UserOnboarding.profile_mode, UserOnboarding.is_irregular
+        ).filter(db.or_(
+            UserOnboarding.profile_mode != 'regular', UserOnboarding.is_irregular.is_(True)
+        )).execution_options(yield_per=5000))
+    users = db.session.query(User.id, User.date_of_birth).execution_options(yield_per=5000)
+    writer.write_table(
+        'users',
+        (('user_id', 'int'), ('age_band', 'str'), ('profile_mode', 'str'), ('self_reported_irregular', 'int')),
+        ((user_id, age_band(dob, today), *profiles.get(user_id, ('regular', False))) for user_id, dob in users)
+    )
+    writer.write_table(
+        'cycles',
+        (('user_id', 'int'), ('cycle_length', 'int'), ('start_date', 'int')),
+        ((user_id, length, start.toordinal()) for _ in partition_router.each_partition()
+         for user_id, length, start in db.session.query(
+            Cycle.user_id, Cycle.cycle_length, Cycle.start_date
+        ).execution_options(yield_per=5000))
+    )
+    writer.write_table(
+        'symptom_rollups',
+        (('user_id', 'int'), ('symptom_type', 'str'), ('phase', 'str'), ('count', 'int')),
+        (row for _ in partition_router.each_partition() for row in db.session.query(
+            SymptomDailyRollup.user_id, SymptomDailyRollup.symptom_type,
+            SymptomDailyRollup.phase, SymptomDailyRollup.count
+        ).execution_options(yield_per=5000))
+    )
+    db.session.rollback()
+    return writer.commit(retention=ANALYTICS_SNAPSHOT_RETENTION)
+
+@app.route('/api/admin/analytics/<report>', methods=['GET'])
+@admin_required
+def get_analytics_report(report):
+    if report not in ANALYTICS_REPORTS:
+        return jsonify({"error": f"Unknown report {report}", "reports": sorted(ANALYTICS_REPORTS)}), 404
+    result = analytics_store.report(report, request.args.get('snapshot'))
+    if result is None:
+        return jsonify({"error": "No analytics snapshot available"}), 404
+    return jsonify(result)
+
+@app.route('/api/admin/profiles', methods=['GET'])
+@admin_required
+def list_request_profiles():
+    return jsonify({"profiles": request_profiler.list_profiles(request.args.get('limit', 100, type=int))})
+
+@app.route('/api/admin/profiles/<profile_id>', methods=['GET'])
+@admin_required
+def get_request_profile(profile_id):
+    # ?format=folded returns the collapsed stacks for flamegraph tools
+    folded = request.args.get('format') == 'folded'
+    content = request_profiler.read(profile_id, STACK_SUFFIX if folded else META_SUFFIX)
+    if content is None:
+        return jsonify({"error": "Profile not found"}), 404
+    return app.response_class(content, mimetype='text/plain' if folded else 'application/json')
+
+@app.route('/api/admin/usage', methods=['GET'])
+@admin_required
+def get_gemini_usage():
+    days = min(max(request.args.get('days', 1, type=int), 1), GEMINI_USAGE_RETENTION_DAYS)
+    since = datetime.combine(datetime.utcnow().date() - timedelta(days=days - 1), datetime.min.time())
+    tokens = db.func.sum(GeminiUsage.total_tokens)
+    by_day = db.session.query(
+        db.func.date(GeminiUsage.created_at), GeminiUsage.outcome, db.func.count(GeminiUsage.id),
+        db.func.sum(GeminiUsage.prompt_tokens), db.func.sum(GeminiUsage.output_tokens), db.func.avg(GeminiUsage.latency_ms)
+    ).filter(GeminiUsage.created_at >= since).group_by(
+        db.func.date(GeminiUsage.created_at), GeminiUsage.outcome
+    ).order_by(db.func.date(GeminiUsage.created_at)).all()
+    top_users = db.session.query(
+        GeminiUsage.user_id, db.func.count(GeminiUsage.id), tokens, db.func.avg(GeminiUsage.prompt_chars)
+    ).filter(GeminiUsage.created_at >= since).group_by(GeminiUsage.user_id).order_by(
+        tokens.desc()
+    ).limit(request.args.get('limit', 20, type=int)).all()
+    return jsonify({
+        "since": since.isoformat(),
+        "dailyTokenBudget": usage_budget.daily_tokens,
+        "admission": gemini_admission.snapshot(),
+        "byDay": [{
+            "date": str(day), "outcome": outcome, "calls": calls,
+            "promptTokens": int(prompt or 0), "outputTokens": int(output or 0),
+            "avgLatencyMs": round(float(latency), 1) if latency is not None else None
+        } for day, outcome, calls, prompt, output, latency in by_day],
+        "topUsers": [{
+            "userId": user_id, "calls": calls, "totalTokens": int(total or 0),
+            "avgPromptChars": round(float(chars or 0))
+        } for user_id, calls, total, chars in top_users]
+    })
+
+@app.cli.command('analytics-snapshot')
+def analytics_snapshot_command():
+    print(f"Wrote analytics snapshot {export_analytics_snapshot()}")
+
+@app.cli.command('analytics-report')
+@click.argument('report', type=click.Choice(sorted(ANALYTICS_REPORTS)))
+@click.option('--snapshot', default=None, help='Snapshot id; defaults to the latest')
+def analytics_report_command(report, snapshot):
+    result = analytics_store.report(report, snapshot)
+    if result is None:
+        raise click.ClickException(f"No analytics snapshot in {ANALYTICS_SNAPSHOT_DIR}")
+    print(json.dumps(result, indent=2, sort_keys=True))
+
+
+def serialize_favorite(f) -> dict:
+    return {
+        "id": f.id,
+        "itemType": f.item_type,
+        "itemId": f.item_id
+    }
+
 @app.route('/api/favorites', methods=['GET'])
 @jwt_required()
 def get_favorites():
@@ -1074,17 +2494,19 @@ def get_favorites():
     
     favorites = query.all()
     
-    return jsonify([{
-        "id": f.id,
-        "itemType": f.item_type,
-        "itemId": f.item_id
-    } for f in favorites])
+    return jsonify([serialize_favorite(f) for f in favorites])
+
+FAVORITE_SCHEMA = Schema({
+    "itemType": Field(str, required=True, max_length=50),
+    "itemId": Field(int, required=True, min_value=1),
+})
 
 @app.route('/api/favorites', methods=['POST'])
 @jwt_required()
-def add_favorite():
+@validate_json(FAVORITE_SCHEMA)
+@idempotent(idempotency_store)
+def add_favorite(data):
     user_id = get_jwt_identity()
-    data = request.get_json()
     
     existing = Favorite.query.filter_by(
         user_id=user_id,
@@ -1102,13 +2524,24 @@ def add_favorite():
     )
     
     db.session.add(favorite)
-    db.session.commit()
+    try:
+        db.session.commit()
+    except IntegrityError:
+        # a concurrent request added the same item after our check
+        db.session.rollback()
+        return jsonify({"error": "Already in favorites"}), 400
     
-    return jsonify({
-        "id": favorite.id,
-        "itemType": favorite.item_type,
-        "itemId": favorite.item_id
-    }), 201
+    return jsonify(serialize_favorite(favorite)), 201
+
+def dedupe_favorites(engine) -> int:
+    # Favorites added twice before uq_favorites_user_item existed would stop
+    # the index from being built; the oldest copy of each is kept.
+    if 'uq_favorites_user_item' in {i['name'] for i in db.inspect(engine).get_indexes(Favorite.__tablename__)}:
+        return 0
+    table = Favorite.__table__
+    keep = db.select(db.func.min(table.c.id)).group_by(table.c.user_id, table.c.item_type, table.c.item_id)
+    with engine.begin() as conn:
+        return conn.execute(db.delete(table).where(table.c.id.not_in(keep))).rowcount
 
 @app.route('/api/favorites/<int:favorite_id>', methods=['DELETE'])
 @jwt_required()
@@ -1120,11 +2553,90 @@ def remove_favorite(favorite_id):
         return jsonify({"error": "Favorite not found"}), 404
     
     db.session.delete(favorite)
+    db.session.add(SyncTombstone(user_id=favorite.user_id, resource='favorites', row_id=favorite.id))
     db.session.commit()
     
     return jsonify({"message": "Favorite removed"})
 
 
+SYNC_OVERLAP = timedelta(seconds=int(os.environ.get('SYNC_OVERLAP_SECONDS', 5)))
+SYNC_TOMBSTONE_DAYS = int(os.environ.get('SYNC_TOMBSTONE_DAYS', 90))
+
+SYNC_RESOURCES = {
+    'cycles': (Cycle, Cycle.updated_at, serialize_cycle),
+    'symptoms': (Symptom, Symptom.updated_at, serialize_symptom),
+    'favorites': (Favorite, Favorite.updated_at, serialize_favorite),
+    'chat': (ChatHistory, ChatHistory.updated_at, serialize_chat_message),
+}
+
+def encode_sync_token(watermark: datetime) -> str:
+    return base64.urlsafe_b64encode(json.dumps({"v": 1, "t": watermark.isoformat()}).encode()).decode().rstrip('=')
+
+def decode_sync_token(token: str) -> datetime:
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)))
+        return datetime.fromisoformat(payload["t"])
+    except (ValueError, KeyError, TypeError):
+        return None
+
+@app.route('/api/sync', methods=['GET'])
+@jwt_required()
+def sync_changes():
+    # The next token is taken before reading and backed off by SYNC_OVERLAP,
+    # so rows from transactions still committing are picked up next time;
+    # clients apply upserts by id, so the few rows sent twice are harmless.
+    user_id = int(get_jwt_identity())
+    next_watermark = datetime.utcnow() - SYNC_OVERLAP
+    
+    since = None
+    token = request.args.get('since')
+    if token:
+        since = decode_sync_token(token)
+        if since is None:
+            return jsonify({"error": "Invalid sync token"}), 400
+        if since < datetime.utcnow() - timedelta(days=SYNC_TOMBSTONE_DAYS):
+            # deletions this old have been purged; start over
+            since = None
+    
+    response = {"full": since is None}
+    for resource, (model, changed_at, serialize) in SYNC_RESOURCES.items():
+        query = model.query.filter(model.user_id == user_id)
+        if since is not None:
+            query = query.filter(changed_at > since)
+        response[resource] = {"upserted": [serialize(row) for row in query.order_by(model.id)], "deleted": []}
+    
+    if since is not None:
+        for resource, row_id in db.session.query(SyncTombstone.resource, SyncTombstone.row_id).filter(
+            SyncTombstone.user_id == user_id, SyncTombstone.deleted_at > since
+        ):
+            response[resource]["deleted"].append(row_id)
+    
+    onboarding = UserOnboarding.query.filter_by(user_id=user_id).first()
+    changed = onboarding is not None and (since is None or (onboarding.updated_at or datetime.min) > since)
+    response["onboarding"] = serialize_onboarding(onboarding) if changed else None
+    response["token"] = encode_sync_token(next_watermark)
+    return jsonify(response)
+
+def backfill_chat_updated_at(engine, added_columns: list) -> int:
+    # Rows written before chat_history.updated_at existed were synced by
+    # their creation time.
+    if 'chat_history.updated_at' not in added_columns:
+        return 0
+    table = ChatHistory.__table__
+    with engine.begin() as conn:
+        return conn.execute(
+            db.update(table).where(table.c.updated_at.is_(None)).values(updated_at=table.c.created_at)
+        ).rowcount
+
+def purge_sync_tombstones() -> int:
+    cutoff = datetime.utcnow() - timedelta(days=SYNC_TOMBSTONE_DAYS)
+    deleted = 0
+    for _ in partition_router.each_partition():
+        deleted += SyncTombstone.query.filter(SyncTombstone.deleted_at < cutoff).delete(synchronize_session=False)
+        db.session.commit()
+    return deleted
+
+
 @app.route('/api/insights', methods=['GET'])
 @jwt_required()
 def get_insights():
@@ -1137,155 +2649,203 @@ def get_insights():
     return jsonify(insights)
 
 
-@app.route('/api/onboarding', methods=['GET'])
-@jwt_required()
-def get_onboarding():
-    user_id = get_jwt_identity()
-    onboarding = UserOnboarding.query.filter_by(user_id=user_id).first()
-    
-    if not onboarding:
-        return jsonify({"isCompleted": False})
-    
-    return jsonify({
+def serialize_onboarding(onboarding) -> dict:
+    return {
         "id": onboarding.id,
         "userId": onboarding.user_id,
         "lastPeriodDate": onboarding.last_period_date.isoformat() if onboarding.last_period_date else None,
-        "typicalCycleLength": onboarding.typical_cycle_length,
-        "periodDuration": onboarding.period_duration,
-        "cycleVariability": onboarding.cycle_variability,
-        "healthConditions": onboarding.health_conditions or [],
-        "fertilityTracking": onboarding.fertility_tracking or [],
-        "trackSymptoms": onboarding.track_symptoms,
-        "dynamicPredictions": onboarding.dynamic_predictions,
-        "stressLevel": onboarding.stress_level,
-        "sleepPattern": onboarding.sleep_pattern,
+        "typicalCycleLength": decode_choice(onboarding.cycle_length_code, CYCLE_LENGTH_BUCKETS),
+        "periodDuration": decode_choice(onboarding.period_duration_code, PERIOD_DURATION_BUCKETS),
+        "cycleVariability": decode_choice(onboarding.cycle_variability_code, CYCLE_VARIABILITY),
+        "healthConditions": decode_flags(onboarding.condition_flags, HEALTH_CONDITIONS),
+        "fertilityTracking": decode_flags(onboarding.fertility_flags, FERTILITY_TRACKING),
+        "trackSymptoms": decode_choice(onboarding.track_symptoms_code, TRACK_SYMPTOMS),
+        "dynamicPredictions": decode_choice(onboarding.dynamic_predictions_code, DYNAMIC_PREDICTIONS),
+        "stressLevel": decode_choice(onboarding.stress_level_code, STRESS_LEVELS),
+        "sleepPattern": decode_choice(onboarding.sleep_pattern_code, SLEEP_PATTERNS),
         "healthNotes": onboarding.health_notes,
         "profileMode": onboarding.profile_mode,
         "isIrregular": onboarding.is_irregular,
         "showBufferDays": onboarding.show_buffer_days,
         "isCompleted": onboarding.is_completed,
         "completedAt": onboarding.completed_at.isoformat() if onboarding.completed_at else None
-    })
-
+    }
 
-@app.route('/api/onboarding', methods=['POST'])
+@app.route('/api/onboarding', methods=['GET'])
 @jwt_required()
-def save_onboarding():
+def get_onboarding():
     user_id = get_jwt_identity()
-    data = request.get_json()
-    
-    if not data:
-        return jsonify({"error": "No data provided"}), 400
-    
     onboarding = UserOnboarding.query.filter_by(user_id=user_id).first()
     
-    health_conditions = data.get('healthConditions') or []
-    typical_cycle = data.get('typicalCycleLength', '')
-    cycle_variability = data.get('cycleVariability', '')
-    
-    is_irregular = (
-        cycle_variability in ['often', 'always_irregular'] or
-        typical_cycle in ['irregular', '>40'] or
-        'pcos' in health_conditions
-    )
-    
-    profile_mode = 'regular'
-    if 'pregnant_ttc' in health_conditions:
-        profile_mode = 'ttc'
-    elif 'menopause' in health_conditions:
-        profile_mode = 'menopause'
-    elif is_irregular:
-        profile_mode = 'irregular'
+    if not onboarding:
+        return jsonify({"isCompleted": False})
     
-    dynamic_pref = data.get('dynamicPredictions', 'yes')
-    show_buffer = dynamic_pref != 'no'
+    return jsonify(serialize_onboarding(onboarding))
+
+
+DASHBOARD_FIELDS = ('user', 'insights', 'onboarding', 'favorites', 'recipes', 'meditationVideos', 'educationalContent')
+# Catalog sections are filtered by the user's current phase and come from
+# the same cache entries as the listing endpoints.
+DASHBOARD_CATALOG = {
+    'recipes': ('recipes', load_recipes, RECIPE_FIELDS),
+    'meditationVideos': ('meditation', load_meditation_videos, MEDITATION_FIELDS),
+    'educationalContent': ('education', load_educational_content, ARTICLE_FIELDS),
+}
+
+@app.route('/api/dashboard', methods=['GET'])
+@jwt_required()
+def get_dashboard():
+    # One round trip for everything the dashboard renders: the user is
+    # loaded and the insights computed once. ?fields=a,b limits the sections
+    # and ?view=summary trims the catalog sections as on their own endpoints.
+    view = request.args.get('view', FULL)
+    if view not in (FULL, SUMMARY):
+        return jsonify({"error": "view must be one of full, summary"}), 400
+    fields = request.args.get('fields')
+    requested = [f.strip() for f in fields.split(',') if f.strip()] if fields else list(DASHBOARD_FIELDS)
+    unknown = [f for f in requested if f not in DASHBOARD_FIELDS]
+    if unknown:
+        return jsonify({"error": f"Unknown fields: {', '.join(unknown)}", "fields": list(DASHBOARD_FIELDS)}), 400
+
+    user_id = get_jwt_identity()
+    entry = get_user_entry(user_id)
+    if not entry:
+        return jsonify({"error": "User not found"}), 404
+
+    result = {}
+    if 'user' in requested:
+        result["user"] = entry["user"]
+    insights = None
+    if 'insights' in requested or any(f in DASHBOARD_CATALOG for f in requested):
+        insights = get_cycle_insights(user_id)
+        if 'insights' in requested:
+            result["insights"] = insights
+    if 'onboarding' in requested:
+        onboarding = UserOnboarding.query.filter_by(user_id=user_id).first()
+        result["onboarding"] = serialize_onboarding(onboarding) if onboarding else {"isCompleted": False}
+    if 'favorites' in requested:
+        result["favorites"] = [serialize_favorite(f) for f in Favorite.query.filter_by(user_id=user_id).all()]
+    for field, (key, loader, catalog_fields) in DASHBOARD_CATALOG.items():
+        if field in requested:
+            result[field] = cached_catalog(key, loader, catalog_fields, catalog_fields.views[view],
+                                           insights["phase"] if insights else None)
+
+    return jsonify(result)
+
+
+# '' is how the client sends an unanswered question
+ONBOARDING_SCHEMA = Schema({
+    "lastPeriodDate": Field(date, nullable=True),
+    "typicalCycleLength": Field(str, nullable=True, choices=('',) + CYCLE_LENGTH_BUCKETS, default=''),
+    "periodDuration": Field(str, nullable=True, choices=('',) + PERIOD_DURATION_BUCKETS, default=''),
+    "cycleVariability": Field(str, nullable=True, choices=('',) + CYCLE_VARIABILITY, default=''),
+    "healthConditions": Field(list, nullable=True, choices=HEALTH_CONDITIONS, default=[]),
+    "fertilityTracking": Field(list, nullable=True, choices=FERTILITY_TRACKING, default=[]),
+    "trackSymptoms": Field(str, nullable=True, choices=('',) + TRACK_SYMPTOMS, default=''),
+    "dynamicPredictions": Field(str, nullable=True, choices=('',) + DYNAMIC_PREDICTIONS, default='yes'),
+    "stressLevel": Field(str, nullable=True, choices=('',) + STRESS_LEVELS, default=''),
+    "sleepPattern": Field(str, nullable=True, choices=('',) + SLEEP_PATTERNS, default=''),
+    "healthNotes": Field(str, nullable=True, max_length=NOTES_MAX_CHARS, default=''),
+})
+
+@app.route('/api/onboarding', methods=['POST'])
+@jwt_required()
+@validate_json(ONBOARDING_SCHEMA)
+def save_onboarding(data):
+    user_id = get_jwt_identity()
     
-    import uuid
+    # Load everything the handler reads up front so the mutations below are
+    # flushed together at the end instead of by interleaved queries.
+    # (users and onboarding answers can live on different partitions)
+    user = User.query.get(user_id)
+    if not user:
+        return jsonify({"error": "User not found"}), 404
+    onboarding = UserOnboarding.query.filter_by(user_id=user.id).first()
+    recent_cycles = Cycle.query.filter_by(user_id=user.id).order_by(Cycle.start_date.desc()).limit(6).all()
+    
+    fields = normalize_onboarding(
+        typical_cycle_length=data['typicalCycleLength'],
+        period_duration=data['periodDuration'],
+        cycle_variability=data['cycleVariability'],
+        health_conditions=data['healthConditions'] or [],
+        fertility_tracking=data['fertilityTracking'] or [],
+        track_symptoms=data['trackSymptoms'],
+        dynamic_predictions=data['dynamicPredictions'],
+        stress_level=data['stressLevel'],
+        sleep_pattern=data['sleepPattern']
+    )
+    profile_mode = fields["profile_mode"]
+    is_irregular = fields["is_irregular"]
     
     if not onboarding:
         onboarding = UserOnboarding(
             id=str(uuid.uuid4()),
-            user_id=user_id
+            user_id=user.id
         )
         db.session.add(onboarding)
     
     last_period = data.get('lastPeriodDate')
     if last_period:
-        try:
-            onboarding.last_period_date = datetime.fromisoformat(last_period).date()
-        except (ValueError, TypeError):
-            onboarding.last_period_date = None
-    
-    onboarding.typical_cycle_length = typical_cycle
-    onboarding.period_duration = data.get('periodDuration', '')
-    onboarding.cycle_variability = cycle_variability
-    onboarding.health_conditions = health_conditions
-    onboarding.fertility_tracking = data.get('fertilityTracking') or []
-    onboarding.track_symptoms = data.get('trackSymptoms', '')
-    onboarding.dynamic_predictions = dynamic_pref
-    onboarding.stress_level = data.get('stressLevel', '')
-    onboarding.sleep_pattern = data.get('sleepPattern', '')
-    onboarding.health_notes = data.get('healthNotes', '')
-    onboarding.profile_mode = profile_mode
-    onboarding.is_irregular = is_irregular
-    onboarding.show_buffer_days = show_buffer
+        onboarding.last_period_date = last_period
+    
+    previous_condition_flags = onboarding.condition_flags or 0
+    for name, value in fields.items():
+        setattr(onboarding, name, value)
+    onboarding.health_notes = data['healthNotes']
     onboarding.is_completed = True
     onboarding.completed_at = datetime.utcnow()
     onboarding.updated_at = datetime.utcnow()
     
-    cycle_length_map = {
-        '21-25': 23,
-        '26-30': 28,
-        '31-35': 33,
-        '36-40': 38,
-        '>40': 42,
-        'irregular': 28,
-        'unknown': 28
-    }
-    
-    period_length_map = {
-        '2-4': 3,
-        '5-7': 5,
-        '8+': 8,
-        'irregular': 5
-    }
+    previous_cycle_length = user.avg_cycle_length
+    user.avg_cycle_length = fields["cycle_length_days"]
+    user.avg_period_length = fields["period_length_days"]
     
-    user = User.query.get(user_id)
-    if user:
-        user.avg_cycle_length = cycle_length_map.get(typical_cycle, 28)
-        user.avg_period_length = period_length_map.get(data.get('periodDuration', ''), 5)
-        
-        if last_period:
-            try:
-                period_date = datetime.fromisoformat(last_period).date()
-                existing_cycle = Cycle.query.filter_by(user_id=user_id).order_by(Cycle.start_date.desc()).first()
-                if not existing_cycle or existing_cycle.start_date != period_date:
-                    new_cycle = Cycle(
-                        user_id=user_id,
-                        start_date=period_date,
-                        cycle_length=user.avg_cycle_length,
-                        period_length=user.avg_period_length
-                    )
-                    db.session.add(new_cycle)
-            except (ValueError, TypeError):
-                pass
+    cycle_added = False
+    if last_period:
+        existing_cycle = recent_cycles[0] if recent_cycles else None
+        if not existing_cycle or existing_cycle.start_date != last_period:
+            new_cycle = Cycle(
+                user_id=user.id,
+                start_date=last_period,
+                cycle_length=user.avg_cycle_length,
+                period_length=user.avg_period_length
+            )
+            db.session.add(new_cycle)
+            recent_cycles = sorted(recent_cycles + [new_cycle], key=lambda c: c.start_date, reverse=True)[:6]
+            cycle_added = True
     
+    today = date.today()
+    batch = WriteBatch(db.session)
+    batch.upsert(UserDailyState, ('user_id',), **daily_state_row(
+        user.id, build_cycle_insights(user, recent_cycles, today), today
+    ))
+    schedule_user_notifications(batch, user, recent_cycles[0].start_date if recent_cycles else None, today)
+    bump_profile_revision(user)
+    batch.flush()
+    
+    if fields["condition_flags"] != previous_condition_flags:
+        replace_user_conditions(user.id, fields["condition_flags"])
+    if cycle_added or user.avg_cycle_length != previous_cycle_length:
+        rebuild_symptom_rollups(user.id)
     db.session.commit()
     
+    family = get_jwt().get("fam") or uuid.uuid4().hex
     return jsonify({
         "message": "Onboarding completed successfully",
         "isCompleted": True,
         "profileMode": profile_mode,
         "isIrregular": is_irregular,
-        "showBufferDays": show_buffer
+        "showBufferDays": fields["show_buffer_days"],
+        "accessToken": issue_access_token(cache_user(user, profile_mode=profile_mode), family)
     }), 201
 
+PREGNANCY_SCHEMA = Schema({"lmp": Field(date, required=True)})
+
 @app.route('/api/pregnancy/calculate', methods=['POST'])
 @jwt_required()
-def calculate_pregnancy_info():
-    data = request.get_json()
-    lmp = datetime.fromisoformat(data['lmp']).date()
-    pregnancy_info = calculate_pregnancy(lmp)
+@validate_json(PREGNANCY_SCHEMA)
+def calculate_pregnancy_info(data):
+    pregnancy_info = calculate_pregnancy(data['lmp'])
     return jsonify(pregnancy_info)
 
 
@@ -1297,12 +2857,9 @@ def health_check():
 @app.route('/', defaults={'path': ''})
 @app.route('/<path:path>')
 def serve_frontend(path):
-    static_folder = app.static_folder
-    if static_folder and os.path.exists(os.path.join(static_folder, path)):
-        return send_from_directory(static_folder, path)
-    if static_folder and os.path.exists(os.path.join(static_folder, 'index.html')):
-        return send_from_directory(static_folder, 'index.html')
-    return jsonify({"error": "Frontend not built. Run 'npm run build' first."}), 404
+    if not static_manifest.has_frontend:
+        return jsonify({"error": "Frontend not built. Run 'npm run build' first."}), 404
+    return static_manifest.serve(path)
 
 
 def run_vite_dev():
@@ -1311,7 +2868,54 @@ def run_vite_dev():
 
 with app.app_context():
     db.create_all()
+    backfill_chat_updated_at(db.engine, add_missing_columns(db.engine, db.metadata))
+    dedupe_favorites(db.engine)
+    add_missing_indexes(db.engine, db.metadata)
+    if partition_router.enabled:
+        partition_schema = partition_router.partition_metadata()
+        for index, key in enumerate(partition_router.keys[1:], start=1):
+            partition_schema.create_all(db.engines[key])
+            backfill_chat_updated_at(db.engines[key], add_missing_columns(db.engines[key], partition_schema))
+            dedupe_favorites(db.engines[key])
+            add_missing_indexes(db.engines[key], partition_schema)
+            partition_router.reserve_id_range(db.engines[key], partition_schema, index)
+    backfill_onboarding()
+    backfill_catalog_search()
+    seed_default_catalog()
+
+daily_jobs = DailyJobScheduler(app)
+daily_jobs.add(precompute_daily_states)
+daily_jobs.add(purge_revoked_tokens)
+daily_jobs.add(export_analytics_snapshot)
+daily_jobs.add(purge_sync_tombstones)
+daily_jobs.add(purge_gemini_usage)
+daily_jobs.add(purge_idempotency_keys)
+app.extensions['daily_jobs'] = daily_jobs
+
+notification_dispatcher = NotificationDispatcher(
+    app, dispatch_due_notifications, interval=float(os.environ.get('NOTIFICATION_INTERVAL_SECONDS', 60))
+)
+app.extensions['notification_dispatcher'] = notification_dispatcher
+
+fallback_index = build_fallback_index()
+chat_context_index = RefreshingIndex(
+    load_chat_context_passages,
+    ttl=float(os.environ.get('CHAT_CONTEXT_REFRESH_SECONDS', 300))
+)
+
+static_manifest = StaticManifest(str(pathlib.Path(__file__).parent.parent / 'dist' / 'public'))
 
 if __name__ == '__main__':
     is_dev = os.environ.get('NODE_ENV') == 'development'
-    app.run(host='0.0.0.0', port=5001, debug=is_dev)
+    if is_dev:
+        if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+            daily_jobs.start_if_enabled()
+            notification_dispatcher.start_if_enabled()
+        app.run(host='0.0.0.0', port=5001, debug=True)
+    else:
+        from serving import run_gunicorn
+        if not run_gunicorn(app):
+            logger.warning('startup.no_gunicorn', extra={"fallback": "development server"})
+            daily_jobs.start_if_enabled()
+            notification_dispatcher.start_if_enabled()
+            app.run(host='0.0.0.0', port=5001, debug=False)
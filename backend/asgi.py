@@ -0,0 +1,6 @@
+from asgiref.wsgi import WsgiToAsgi
+
+from app import app
+
+# uvicorn --app-dir backend asgi:asgi_app --workers $WEB_CONCURRENCY
+asgi_app = WsgiToAsgi(app)
@@ -0,0 +1,148 @@
+import json
+import math
+import random
+import threading
+import time
+
+from user_cache import LRUCache
+
+
+class MemoryCacheBackend:
+    # In-process store; also stands in for a shared store in tests, since any
+    # number of CatalogCache instances can be pointed at the same object.
+    # Keys come from query parameters, so entries are bounded and expire.
+    def __init__(self, maxsize: int = 1000):
+        self._entries = LRUCache(maxsize=maxsize)
+        self._locks = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str):
+        return self._entries.get(key)
+
+    def set(self, key: str, entry: dict, ttl: float):
+        self._entries.set(key, entry, ttl)
+
+    def try_lock(self, key: str, ttl: float) -> bool:
+        now = time.time()
+        with self._lock:
+            if self._locks.get(key, 0.0) > now:
+                return False
+            self._locks[key] = now + ttl
+            return True
+
+    def unlock(self, key: str):
+        with self._lock:
+            self._locks.pop(key, None)
+
+    def clear(self):
+        self._entries.clear()
+        with self._lock:
+            self._locks.clear()
+
+
+class RedisCacheBackend:
+    # Shared across workers and hosts; entries are JSON so only plain
+    # serializable values can be cached.
+    def __init__(self, url: str, prefix: str = 'catalog:'):
+        import redis
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+
+    def get(self, key: str):
+        raw = self.client.get(self.prefix + key)
+        return json.loads(raw) if raw is not None else None
+
+    def set(self, key: str, entry: dict, ttl: float):
+        self.client.set(self.prefix + key, json.dumps(entry), ex=max(1, math.ceil(ttl)))
+
+    def try_lock(self, key: str, ttl: float) -> bool:
+        return bool(self.client.set(f"{self.prefix}lock:{key}", b'1', nx=True, ex=max(1, math.ceil(ttl))))
+
+    def unlock(self, key: str):
+        self.client.delete(f"{self.prefix}lock:{key}")
+
+    def clear(self):
+        keys = list(self.client.scan_iter(match=self.prefix + '*'))
+        if keys:
+            self.client.delete(*keys)
+
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class CatalogCache:
+    # Read-through cache for data that is identical for every user. An entry
+    # is fresh for ttl seconds, then served stale for up to stale_ttl while one
+    # caller recomputes it. Before expiry, callers volunteer to recompute early
+    # with a probability that rises near the deadline and with how long the
+    # last computation took, so hot keys rarely expire at all. Concurrent
+    # misses in one process share one computation; the backend lock limits
+    # stale refreshes to one across processes.
+    def __init__(self, backend, ttl: float = 300.0, stale_ttl: float = 600.0, beta: float = 1.0,
+                 lock_timeout: float = 30.0):
+        self.backend = backend
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.beta = beta
+        self.lock_timeout = lock_timeout
+        self._flights = {}
+        self._flights_lock = threading.Lock()
+
+    def get_or_compute(self, key: str, compute):
+        entry = self.backend.get(key)
+        now = time.time()
+        if entry is not None:
+            if now < entry['expires_at'] and not self._should_refresh_early(entry, now):
+                return entry['value']
+            if now < entry['expires_at'] + self.stale_ttl:
+                # Someone has to refresh; everyone else keeps the old value.
+                if self.backend.try_lock(key, self.lock_timeout):
+                    try:
+                        return self._single_flight(key, compute)
+                    finally:
+                        self.backend.unlock(key)
+                return entry['value']
+        return self._single_flight(key, compute)
+
+    def clear(self):
+        self.backend.clear()
+
+    def _should_refresh_early(self, entry: dict, now: float) -> bool:
+        # XFetch: -log(U) is exponential, so the gap grows with recompute time.
+        gap = entry['delta'] * self.beta * -math.log(1.0 - random.random())
+        return now + gap >= entry['expires_at']
+
+    def _single_flight(self, key: str, compute):
+        with self._flights_lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value
+
+        try:
+            started = time.time()
+            flight.value = compute()
+            delta = time.time() - started
+            self.backend.set(key, {
+                'value': flight.value,
+                'delta': delta,
+                'expires_at': time.time() + self.ttl,
+            }, self.ttl + self.stale_ttl)
+            return flight.value
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._flights_lock:
+                self._flights.pop(key, None)
+            flight.done.set()
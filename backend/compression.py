@@ -0,0 +1,57 @@
+import gzip
+
+from flask import request
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Preferred first when the client accepts several; br only with the brotli package.
+ENCODINGS = ('br', 'gzip') if brotli is not None else ('gzip',)
+COMPRESSIBLE_MIMETYPES = ('application/json', 'text/plain', 'text/csv', 'application/x-ndjson')
+UNCOMPRESSED_STATUSES = (204, 206, 304)
+
+
+def install_compression(flask_app, min_size: int = 1024, gzip_level: int = 5, brotli_quality: int = 4):
+    # Compresses API responses of at least min_size bytes for clients that
+    # accept it. Levels are kept low: these bodies are built per request,
+    # and past these levels CPU time grows much faster than the savings.
+    # Static assets are precompressed (see static_assets) and streamed or
+    # already-encoded responses are left alone.
+    encoders = {
+        'gzip': lambda body: gzip.compress(body, compresslevel=gzip_level, mtime=0),
+    }
+    if brotli is not None:
+        encoders['br'] = lambda body: brotli.compress(body, quality=brotli_quality)
+
+    def accepted() -> str:
+        accept = request.accept_encodings
+        for encoding in ENCODINGS:
+            if accept.quality(encoding) > 0:
+                return encoding
+        return None
+
+    @flask_app.after_request
+    def compress_response(response):
+        if (response.direct_passthrough or response.is_streamed
+                or response.status_code in UNCOMPRESSED_STATUSES or response.status_code < 200
+                or 'Content-Encoding' in response.headers
+                or response.mimetype not in COMPRESSIBLE_MIMETYPES):
+            return response
+        body = response.get_data()
+        if len(body) < min_size:
+            return response
+        response.vary.add('Accept-Encoding')
+        encoding = accepted()
+        if encoding is None:
+            return response
+        compressed = encoders[encoding](body)
+        if len(compressed) >= len(body):
+            return response
+        response.set_data(compressed)
+        response.content_encoding = encoding
+        etag, weak = response.get_etag()
+        if etag:
+            response.set_etag(f"{etag}-{encoding}", weak)
+        return response
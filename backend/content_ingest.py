@@ -0,0 +1,233 @@
+import csv
+import io
+import json
+import re
+
+from sqlalchemy import or_, update
+
+from retrieval import PHASES, tokenize
+from write_batch import WriteBatch
+
+# Per content type: accepted columns with their types, which of them are
+# required, which feed the search tokens, and which one is the summary.
+CONTENT_TYPES = {
+    'recipes': {
+        'fields': {
+            'title': str, 'description': str, 'image_url': str, 'ingredients': list,
+            'instructions': str, 'phase': str, 'category': str, 'prep_time': int, 'calories': int,
+        },
+        'required': ('title',),
+        'search': ('title', 'description', 'ingredients', 'category'),
+        'summary': 'description',
+    },
+    'meditation_videos': {
+        'fields': {
+            'title': str, 'description': str, 'url': str, 'thumbnail_url': str,
+            'category': str, 'duration_seconds': int, 'phase': str,
+        },
+        'required': ('title', 'url'),
+        'search': ('title', 'description', 'category'),
+        'summary': 'description',
+    },
+    'educational_content': {
+        'fields': {
+            'title': str, 'summary': str, 'body': str, 'category': str, 'phase': str, 'image_url': str,
+        },
+        'required': ('title', 'body'),
+        'search': ('title', 'summary', 'body', 'category'),
+        'summary': 'summary',
+    },
+}
+
+MAX_REPORTED_ERRORS = 50
+
+CAMEL_RE = re.compile(r'(?<!^)(?=[A-Z])')
+SLUG_RE = re.compile(r'[^a-z0-9]+')
+
+
+class ContentValidationError(ValueError):
+    pass
+
+
+def snake_case(key: str) -> str:
+    return CAMEL_RE.sub('_', key.strip()).lower()
+
+
+def slugify(text: str) -> str:
+    return SLUG_RE.sub('-', text.lower()).strip('-')[:255]
+
+
+def iter_records(stream, fmt: str):
+    # Yields (position, record) one at a time so large files are never held
+    # in memory; "json" accepts a single array and is the exception.
+    if fmt == 'csv':
+        for line_no, row in enumerate(csv.DictReader(stream), start=2):
+            yield line_no, row
+    elif fmt == 'jsonl':
+        for line_no, line in enumerate(stream, start=1):
+            if line.strip():
+                try:
+                    yield line_no, json.loads(line)
+                except json.JSONDecodeError as e:
+                    yield line_no, ContentValidationError(f"invalid JSON: {e.msg}")
+    elif fmt == 'json':
+        data = json.load(stream)
+        for index, record in enumerate(data if isinstance(data, list) else [data]):
+            yield index, record
+    else:
+        raise ValueError(f"unsupported format {fmt!r}")
+
+
+def format_for_path(path: str) -> str:
+    lowered = path.lower()
+    if lowered.endswith('.csv'):
+        return 'csv'
+    if lowered.endswith(('.jsonl', '.ndjson')):
+        return 'jsonl'
+    return 'json'
+
+
+def _coerce(name: str, kind, value):
+    if value is None or (isinstance(value, str) and not value.strip()):
+        return None
+    if kind is int:
+        try:
+            return int(value)
+        except (TypeError, ValueError):
+            raise ContentValidationError(f"{name} must be an integer")
+    if kind is list:
+        if isinstance(value, str):
+            # CSV cells carry lists as "a; b; c"
+            return [item.strip() for item in re.split(r'[;|]', value) if item.strip()]
+        if not isinstance(value, list):
+            raise ContentValidationError(f"{name} must be a list")
+        return [str(item) for item in value]
+    if not isinstance(value, str):
+        raise ContentValidationError(f"{name} must be a string")
+    return value.strip()
+
+
+def normalize_record(content_type: str, record) -> dict:
+    if isinstance(record, Exception):
+        raise record
+    if not isinstance(record, dict):
+        raise ContentValidationError("record must be an object")
+    spec = CONTENT_TYPES[content_type]
+    values = {}
+    for key, value in record.items():
+        name = snake_case(key)
+        if name in spec['fields']:
+            values[name] = _coerce(name, spec['fields'][name], value)
+
+    missing = [name for name in spec['required'] if not values.get(name)]
+    if missing:
+        raise ContentValidationError(f"missing {', '.join(missing)}")
+    if values.get('phase') is not None:
+        phase = values['phase'].capitalize()
+        if phase not in PHASES:
+            raise ContentValidationError(f"phase must be one of {', '.join(PHASES)}")
+        values['phase'] = phase
+
+    slug = record.get('slug') or slugify(values['title'])
+    if not slug:
+        raise ContentValidationError("title must contain letters or digits")
+
+    # Unset optional columns are written as NULL so a re-ingest fully
+    # replaces the previous version of the item.
+    row = {name: values.get(name) for name in spec['fields']}
+    row.update(derived_columns(content_type, values, slug))
+    return row
+
+
+def derived_columns(content_type: str, values: dict, slug: str) -> dict:
+    spec = CONTENT_TYPES[content_type]
+    searchable = []
+    for name in spec['search']:
+        value = values.get(name)
+        searchable.append(' '.join(value) if isinstance(value, list) else (value or ''))
+    return {
+        'slug': slug,
+        'search_tokens': ' '.join(sorted(set(tokenize(' '.join(searchable))))),
+        'summary_length': len(values.get(spec['summary']) or ''),
+    }
+
+
+def backfill_derived_columns(session, model, content_type: str, batch_size: int = 500) -> int:
+    # Rows written before ingestion existed have no slug or search tokens,
+    # so they never match ?q= and a re-ingest would duplicate them instead of
+    # upserting. Their own columns are used as they are; a slug already taken
+    # by another row gets the row id appended.
+    spec = CONTENT_TYPES[content_type]
+    columns = [getattr(model, name) for name in spec['fields']]
+    taken = {slug for (slug,) in session.query(model.slug).filter(model.slug.isnot(None))}
+    filled = 0
+    last_id = 0
+    while True:
+        rows = session.query(model.id, model.slug, *columns).filter(
+            model.id > last_id, or_(model.slug.is_(None), model.search_tokens.is_(None))
+        ).order_by(model.id).limit(batch_size).all()
+        if not rows:
+            return filled
+        updates = []
+        for row in rows:
+            slug = row.slug
+            if slug is None:
+                slug = slugify(row.title or '') or f"{content_type}-{row.id}"
+                if slug in taken:
+                    slug = f"{slug[:240]}-{row.id}"
+                taken.add(slug)
+            updates.append({"id": row.id, **derived_columns(content_type, row._asdict(), slug)})
+        session.execute(update(model), updates)
+        session.commit()
+        filled += len(rows)
+        last_id = rows[-1].id
+
+
+class IngestReport:
+    def __init__(self):
+        self.upserted = 0
+        self.rejected = 0
+        self.errors = []
+
+    def reject(self, position, message: str):
+        self.rejected += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({"position": position, "error": message})
+
+    def to_dict(self) -> dict:
+        return {"upserted": self.upserted, "rejected": self.rejected, "errors": self.errors}
+
+
+def ingest_records(session, model, content_type: str, records, batch_size: int = 500,
+                   report: IngestReport = None) -> IngestReport:
+    # Valid rows are upserted on slug in batches; invalid ones are reported
+    # and skipped without failing the rest of the file.
+    report = report or IngestReport()
+    pending = {}
+
+    def flush():
+        if not pending:
+            return
+        batch = WriteBatch(session)
+        for row in pending.values():
+            batch.upsert(model, ('slug',), **row)
+        batch.commit()
+        report.upserted += len(pending)
+        pending.clear()
+
+    for position, record in records:
+        try:
+            row = normalize_record(content_type, record)
+        except ContentValidationError as e:
+            report.reject(position, str(e))
+            continue
+        # one statement can't touch the same conflict key twice; last one wins
+        pending[row['slug']] = row
+        if len(pending) >= batch_size:
+            flush()
+    flush()
+    return report
+
+
+def open_text(binary_stream):
+    return io.TextIOWrapper(binary_stream, encoding='utf-8', newline='')
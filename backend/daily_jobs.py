@@ -0,0 +1,52 @@
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+
+logger = logging.getLogger('arivai.jobs')
+
+
+class DailyJobScheduler:
+    def __init__(self, flask_app, run_at_minute: int = 5):
+        self.app = flask_app
+        self.run_at_minute = run_at_minute
+        self.jobs = []
+        self._thread = None
+
+    def add(self, job):
+        self.jobs.append(job)
+        return job
+
+    def seconds_until_next_run(self, now: datetime = None) -> float:
+        now = now or datetime.now()
+        next_run = now.replace(hour=0, minute=self.run_at_minute, second=0, microsecond=0)
+        if next_run <= now:
+            next_run += timedelta(days=1)
+        return (next_run - now).total_seconds()
+
+    def run_now(self):
+        with self.app.app_context():
+            for job in self.jobs:
+                started = time.perf_counter()
+                try:
+                    result = job()
+                    logger.info('job.finished', extra={
+                        "job": job.__name__, "durationS": round(time.perf_counter() - started, 1), "result": result
+                    })
+                except Exception:
+                    logger.exception('job.failed', extra={"job": job.__name__})
+
+    def _loop(self):
+        while True:
+            time.sleep(self.seconds_until_next_run())
+            self.run_now()
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._loop, name='daily-jobs', daemon=True)
+            self._thread.start()
+
+    def start_if_enabled(self):
+        if os.environ.get('ENABLE_DAILY_JOBS', '').lower() in ('1', 'true', 'yes'):
+            self.start()
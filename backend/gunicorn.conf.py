@@ -0,0 +1,38 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from serving import bind_address, default_threads, default_workers
+
+bind = bind_address()
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'gthread')
+workers = default_workers()
+threads = default_threads()
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 60))
+graceful_timeout = 30
+keepalive = 5
+max_requests = 2000
+max_requests_jitter = 200
+preload_app = True
+# Requests are logged as sampled http.request events by the app; set
+# GUNICORN_ACCESS_LOG=- to also get gunicorn's synchronous access log.
+accesslog = os.environ.get('GUNICORN_ACCESS_LOG')
+
+
+def when_ready(server):
+    # Daily jobs and the reminder dispatcher run once, in the master, rather
+    # than in every worker.
+    extensions = server.app.wsgi().extensions
+    extensions['daily_jobs'].start_if_enabled()
+    extensions['notification_dispatcher'].start_if_enabled()
+
+
+def post_fork(server, worker):
+    # The preloaded app ran db.create_all() in the master; forget the pooled
+    # connections it opened (without closing the master's sockets) so forked
+    # workers open their own.
+    flask_app = server.app.wsgi()
+    with flask_app.app_context():
+        for engine in flask_app.extensions['sqlalchemy'].engines.values():
+            engine.dispose(close=False)
@@ -0,0 +1,317 @@
+import asyncio
+import base64
+import hashlib
+import inspect
+import json
+import math
+import threading
+import time
+from datetime import datetime, timedelta
+from functools import wraps
+
+from flask import Response, current_app, jsonify, request
+
+HEADER = 'Idempotency-Key'
+MAX_KEY_LENGTH = 255
+# Outcomes a retry could change are not kept: the retry runs again.
+UNSTORED_STATUSES = (408, 409, 429)
+
+
+class MemoryIdempotencyBackend:
+    # Process-local stand-in for the shared store, used in tests and
+    # single-process development.
+    def __init__(self):
+        self._records = {}
+        self._lock = threading.Lock()
+
+    def claim(self, key: str, fingerprint: str, lock_ttl: float, ttl: float):
+        now = time.time()
+        with self._lock:
+            record = self._records.get(key)
+            if record is None or record["expiresAt"] <= now or (
+                    record["status"] is None and record["lockedUntil"] <= now):
+                self._records[key] = {
+                    "fingerprint": fingerprint, "status": None, "body": None, "contentType": None,
+                    "lockedUntil": now + lock_ttl, "expiresAt": now + ttl,
+                }
+                return True, None
+            return False, dict(record)
+
+    def get(self, key: str):
+        with self._lock:
+            record = self._records.get(key)
+            return dict(record) if record and record["expiresAt"] > time.time() else None
+
+    def complete(self, key: str, fingerprint: str, status: int, body: bytes, content_type: str, ttl: float):
+        with self._lock:
+            record = self._records.get(key)
+            if record is not None:
+                record.update(status=status, body=body, contentType=content_type, expiresAt=time.time() + ttl)
+
+    def release(self, key: str):
+        with self._lock:
+            record = self._records.get(key)
+            if record is not None and record["status"] is None:
+                del self._records[key]
+
+    def purge_expired(self, now: datetime = None) -> int:
+        cutoff = time.time()
+        with self._lock:
+            expired = [key for key, record in self._records.items() if record["expiresAt"] <= cutoff]
+            for key in expired:
+                del self._records[key]
+            return len(expired)
+
+
+class SQLAlchemyIdempotencyBackend:
+    # Claims are committed on their own connection, outside the request's
+    # session, so other workers see them at once and a rollback in the view
+    # doesn't take the claim with it.
+    def __init__(self, db, model):
+        self.db = db
+        self.model = model
+
+    def _record(self, row) -> dict:
+        return {
+            "fingerprint": row.fingerprint, "status": row.status_code,
+            "body": row.response_body, "contentType": row.content_type,
+        }
+
+    def claim(self, key: str, fingerprint: str, lock_ttl: float, ttl: float):
+        from sqlalchemy import and_, insert, or_, select, update
+        from sqlalchemy.exc import IntegrityError
+        m = self.model
+        now = datetime.utcnow()
+        values = {
+            "fingerprint": fingerprint, "status_code": None, "response_body": None, "content_type": None,
+            "locked_until": now + timedelta(seconds=lock_ttl), "expires_at": now + timedelta(seconds=ttl),
+        }
+        try:
+            with self.db.engine.begin() as conn:
+                conn.execute(insert(m).values(key=key, **values))
+            return True, None
+        except IntegrityError:
+            pass
+        with self.db.engine.begin() as conn:
+            # take over an expired record, or one whose worker died mid-request
+            taken = conn.execute(update(m).where(m.key == key, or_(
+                m.expires_at <= now, and_(m.status_code.is_(None), m.locked_until <= now)
+            )).values(**values)).rowcount
+            if taken:
+                return True, None
+            row = conn.execute(select(m).where(m.key == key)).first()
+        if row is None:
+            # released between the two statements
+            return self.claim(key, fingerprint, lock_ttl, ttl)
+        return False, self._record(row)
+
+    def get(self, key: str):
+        from sqlalchemy import select
+        with self.db.engine.connect() as conn:
+            row = conn.execute(select(self.model).where(self.model.key == key)).first()
+        return self._record(row) if row is not None else None
+
+    def complete(self, key: str, fingerprint: str, status: int, body: bytes, content_type: str, ttl: float):
+        from sqlalchemy import update
+        with self.db.engine.begin() as conn:
+            conn.execute(update(self.model).where(self.model.key == key).values(
+                status_code=status, response_body=body, content_type=content_type,
+                expires_at=datetime.utcnow() + timedelta(seconds=ttl)
+            ))
+
+    def release(self, key: str):
+        from sqlalchemy import delete
+        with self.db.engine.begin() as conn:
+            conn.execute(delete(self.model).where(self.model.key == key, self.model.status_code.is_(None)))
+
+    def purge_expired(self, now: datetime = None) -> int:
+        from sqlalchemy import delete
+        with self.db.engine.begin() as conn:
+            return conn.execute(delete(self.model).where(self.model.expires_at <= (now or datetime.utcnow()))).rowcount
+
+
+class RedisIdempotencyBackend:
+    # In-flight claims expire with lock_ttl and completed records with ttl,
+    # so nothing needs purging.
+    def __init__(self, url: str, prefix: str = 'idempotency:'):
+        import redis
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+
+    def claim(self, key: str, fingerprint: str, lock_ttl: float, ttl: float):
+        record = {"fingerprint": fingerprint, "status": None, "body": None, "contentType": None}
+        if self.client.set(self.prefix + key, json.dumps(record), nx=True, ex=max(1, math.ceil(lock_ttl))):
+            return True, None
+        existing = self.get(key)
+        if existing is None:
+            # expired between the two calls
+            return self.claim(key, fingerprint, lock_ttl, ttl)
+        return False, existing
+
+    def get(self, key: str):
+        raw = self.client.get(self.prefix + key)
+        if raw is None:
+            return None
+        record = json.loads(raw)
+        if record["body"] is not None:
+            record["body"] = base64.b64decode(record["body"])
+        return record
+
+    def complete(self, key: str, fingerprint: str, status: int, body: bytes, content_type: str, ttl: float):
+        record = {
+            "fingerprint": fingerprint, "status": status,
+            "body": base64.b64encode(body).decode('ascii'), "contentType": content_type,
+        }
+        self.client.set(self.prefix + key, json.dumps(record), ex=max(1, math.ceil(ttl)))
+
+    def release(self, key: str):
+        record = self.get(key)
+        if record is not None and record["status"] is None:
+            self.client.delete(self.prefix + key)
+
+    def purge_expired(self, now: datetime = None) -> int:
+        return 0
+
+
+class IdempotencyStore:
+    # A request carrying Idempotency-Key claims (user, method, path, key)
+    # before the view runs. A retry of a finished request gets the stored
+    # response back; a retry arriving while the first is still running waits
+    # for it (up to `wait` seconds). Reusing a key with a different body is
+    # refused. Failed (5xx or raised) requests drop their claim so the
+    # client's next retry runs again. A route whose response must not be
+    # stored as is passes `encode(response) -> bytes` to pick what is kept
+    # and `decode(status, body)` to rebuild a response from it on replay.
+    def __init__(self, backend, identity, ttl: float = 86400.0, lock_ttl: float = 60.0, wait: float = 25.0,
+                 encode=None, decode=None):
+        self.backend = backend
+        self.identity = identity
+        self.ttl = ttl
+        self.lock_ttl = lock_ttl
+        self.wait = wait
+        self.encode = encode
+        self.decode = decode
+
+    def request_key(self, header: str) -> str:
+        scope = f"{self.identity()}\n{request.method}\n{request.path}\n{header}"
+        return hashlib.sha256(scope.encode('utf-8')).hexdigest()
+
+    def begin(self, key: str = None):
+        # Returns (ticket, response). With no header both are None and the
+        # view runs as usual. Otherwise the view runs under the claim in
+        # `ticket` when response is None, `response` is sent instead when
+        # set, and PENDING means another request holds the key. Routes keyed
+        # on something other than the header pass `key`.
+        if key is None:
+            key = request.headers.get(HEADER)
+            if key is None:
+                return None, None
+            if not key or len(key) > MAX_KEY_LENGTH or not key.isprintable():
+                return None, (jsonify({"error": f"{HEADER} must be 1-{MAX_KEY_LENGTH} printable characters"}), 400)
+        ticket = (self.request_key(key), hashlib.sha256(request.get_data()).hexdigest())
+        claimed, record = self.backend.claim(*ticket, self.lock_ttl, self.ttl)
+        return ticket, None if claimed else self.replay(record, ticket[1])
+
+    def check(self, ticket):
+        # Re-checks a PENDING key; claims it if the holder gave it up.
+        record = self.backend.get(ticket[0])
+        if record is None:
+            claimed, record = self.backend.claim(*ticket, self.lock_ttl, self.ttl)
+            if claimed:
+                return None
+        return self.replay(record, ticket[1])
+
+    def replay(self, record: dict, fingerprint: str):
+        if record["fingerprint"] != fingerprint:
+            return jsonify({"error": f"{HEADER} was already used with a different request body"}), 422
+        if record["status"] is None:
+            return PENDING
+        if self.decode is not None:
+            response = current_app.make_response(self.decode(record["status"], record["body"]))
+        else:
+            response = Response(record["body"], status=record["status"], content_type=record["contentType"])
+        response.headers['Idempotent-Replayed'] = 'true'
+        return response
+
+    def in_progress(self):
+        response = jsonify({"error": f"A request with this {HEADER} is still in progress"})
+        response.headers['Retry-After'] = '1'
+        return response, 409
+
+    def abandon(self, ticket):
+        self.backend.release(ticket[0])
+
+    def finish(self, ticket, rv):
+        response = current_app.make_response(rv)
+        if response.status_code >= 500 or response.status_code in UNSTORED_STATUSES:
+            self.backend.release(ticket[0])
+        else:
+            body = self.encode(response) if self.encode is not None else response.get_data()
+            self.backend.complete(ticket[0], ticket[1], response.status_code, body,
+                                  response.content_type, self.ttl)
+        return response
+
+    def poll_delays(self):
+        # 50ms doubling up to 500ms, until `wait` seconds have passed
+        deadline = time.monotonic() + self.wait
+        delay = 0.05
+        while time.monotonic() < deadline:
+            yield min(delay, deadline - time.monotonic())
+            delay = min(delay * 2, 0.5)
+
+
+PENDING = object()
+
+
+def idempotent(store: IdempotencyStore, key=None):
+    # Goes below @jwt_required (the key is scoped to the caller) and
+    # @validate_json (invalid bodies are rejected before anything is stored).
+    # `key` is a function returning the key to use instead of the header.
+    def decorator(view):
+        if inspect.iscoroutinefunction(view):
+            @wraps(view)
+            async def async_wrapper(*args, **kwargs):
+                ticket, response = store.begin(key() if key else None)
+                if response is PENDING:
+                    for delay in store.poll_delays():
+                        await asyncio.sleep(delay)
+                        response = store.check(ticket)
+                        if response is not PENDING:
+                            break
+                    else:
+                        return store.in_progress()
+                if response is not None:
+                    return response
+                if ticket is None:
+                    return await view(*args, **kwargs)
+                try:
+                    rv = await view(*args, **kwargs)
+                except BaseException:
+                    store.abandon(ticket)
+                    raise
+                return store.finish(ticket, rv)
+            return async_wrapper
+
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            ticket, response = store.begin(key() if key else None)
+            if response is PENDING:
+                for delay in store.poll_delays():
+                    time.sleep(delay)
+                    response = store.check(ticket)
+                    if response is not PENDING:
+                        break
+                else:
+                    return store.in_progress()
+            if response is not None:
+                return response
+            if ticket is None:
+                return view(*args, **kwargs)
+            try:
+                rv = view(*args, **kwargs)
+            except BaseException:
+                store.abandon(ticket)
+                raise
+            return store.finish(ticket, rv)
+        return wrapper
+    return decorator
@@ -0,0 +1,100 @@
+import json
+import logging
+import os
+import threading
+import time
+import urllib.request
+from collections import deque
+from datetime import date, datetime, time as clock, timedelta
+
+logger = logging.getLogger('arivai.notifications')
+
+PERIOD_REMINDER_LEAD_DAYS = 2
+
+MESSAGES = {
+    'period_soon': "Your period is expected in {lead} days, around {date}. A good time to stock up and plan some rest.",
+    'pms_start': "Your PMS window starts today. Be gentle with yourself and keep an eye on how you feel.",
+}
+
+
+def upcoming_events(last_period_start: date, cycle_length: int, pms_start_day: int, today: date) -> list:
+    # Returns (kind, event_date, fire_date) for the next period and the PMS
+    # window before it. Predictions roll forward a cycle at a time, so a
+    # user who hasn't logged a period still gets the next expected one.
+    next_period = last_period_start + timedelta(days=cycle_length)
+    while next_period < today:
+        next_period += timedelta(days=cycle_length)
+    pms_start = next_period - timedelta(days=cycle_length - pms_start_day + 1)
+    if pms_start < today:
+        pms_start += timedelta(days=cycle_length)
+    return [
+        ('period_soon', next_period, next_period - timedelta(days=PERIOD_REMINDER_LEAD_DAYS)),
+        ('pms_start', pms_start, pms_start),
+    ]
+
+
+def fire_time(fire_date: date, hour: int) -> datetime:
+    return datetime.combine(fire_date, clock(hour=hour))
+
+
+def build_message(kind: str, event_date: date) -> str:
+    return MESSAGES[kind].format(lead=PERIOD_REMINDER_LEAD_DAYS, date=event_date.strftime('%b %d'))
+
+
+class LocalNotificationSink:
+    # Stand-in for a push provider: logs each batch and keeps the most recent
+    # notifications in memory so tests and local runs can inspect them.
+    def __init__(self, keep: int = 1000):
+        self.sent = deque(maxlen=keep)
+
+    def send(self, notifications: list):
+        self.sent.extend(notifications)
+        logger.info('notifications.sent', extra={"count": len(notifications)})
+
+
+class WebhookNotificationSink:
+    # POSTs each batch as {"notifications": [...]} to a push gateway.
+    def __init__(self, url: str, timeout: float = 10.0):
+        self.url = url
+        self.timeout = timeout
+
+    def send(self, notifications: list):
+        req = urllib.request.Request(
+            self.url,
+            data=json.dumps({"notifications": notifications}).encode('utf-8'),
+            headers={"Content-Type": "application/json"},
+            method='POST'
+        )
+        with urllib.request.urlopen(req, timeout=self.timeout) as response:
+            response.read()
+
+
+class NotificationDispatcher:
+    def __init__(self, flask_app, dispatch, interval: float = 60.0):
+        self.app = flask_app
+        self.dispatch = dispatch
+        self.interval = interval
+        self._thread = None
+
+    def run_once(self) -> int:
+        with self.app.app_context():
+            try:
+                return self.dispatch()
+            except Exception:
+                logger.exception('notifications.dispatch_failed')
+                return 0
+
+    def _loop(self):
+        while True:
+            started = time.monotonic()
+            self.run_once()
+            time.sleep(max(0.0, self.interval - (time.monotonic() - started)))
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._loop, name='notifications', daemon=True)
+            self._thread.start()
+
+    def start_if_enabled(self):
+        if os.environ.get('ENABLE_NOTIFICATIONS', '').lower() in ('1', 'true', 'yes'):
+            self.start()
@@ -0,0 +1,76 @@
+# Onboarding answers are stored as small integer codes: the 1-based position
+# in these tuples. Append new options at the end; never reorder or remove.
+CYCLE_LENGTH_BUCKETS = ('21-25', '26-30', '31-35', '36-40', '>40', 'irregular', 'unknown')
+PERIOD_DURATION_BUCKETS = ('2-4', '5-7', '8+', 'irregular')
+CYCLE_VARIABILITY = ('rarely', 'sometimes', 'often', 'always_irregular')
+TRACK_SYMPTOMS = ('yes', 'no', 'maybe')
+DYNAMIC_PREDICTIONS = ('yes', 'no', 'not_sure')
+STRESS_LEVELS = ('low', 'medium', 'high')
+SLEEP_PATTERNS = ('regular', 'irregular')
+
+# Multi-select answers are bitmasks over these tuples (bit i = option i).
+HEALTH_CONDITIONS = ('pcos', 'hormonal_imbalance', 'pregnant_ttc', 'contraceptives', 'menopause', 'none')
+FERTILITY_TRACKING = ('bbt', 'cervical_mucus', 'ovulation_kit', 'none')
+
+CYCLE_LENGTH_DAYS = {'21-25': 23, '26-30': 28, '31-35': 33, '36-40': 38, '>40': 42}
+PERIOD_LENGTH_DAYS = {'2-4': 3, '5-7': 5, '8+': 8}
+DEFAULT_CYCLE_LENGTH = 28
+DEFAULT_PERIOD_LENGTH = 5
+
+
+def encode_choice(value, choices: tuple):
+    return choices.index(value) + 1 if value in choices else None
+
+
+def decode_choice(code, choices: tuple):
+    return choices[code - 1] if code and code <= len(choices) else None
+
+
+def encode_flags(values, choices: tuple) -> int:
+    values = values or ()
+    return sum(1 << i for i, choice in enumerate(choices) if choice in values)
+
+
+def decode_flags(mask, choices: tuple) -> list:
+    return [choice for i, choice in enumerate(choices) if (mask or 0) & (1 << i)]
+
+
+def condition_codes(mask) -> list:
+    # Codes for the user_conditions join table share numbering with encode_choice.
+    return [i + 1 for i in range(len(HEALTH_CONDITIONS)) if (mask or 0) & (1 << i)]
+
+
+def normalize_onboarding(typical_cycle_length=None, period_duration=None, cycle_variability=None,
+                         health_conditions=None, fertility_tracking=None, track_symptoms=None,
+                         dynamic_predictions=None, stress_level=None, sleep_pattern=None) -> dict:
+    conditions = health_conditions or []
+    is_irregular = (
+        cycle_variability in ('often', 'always_irregular') or
+        typical_cycle_length in ('irregular', '>40') or
+        'pcos' in conditions
+    )
+
+    profile_mode = 'regular'
+    if 'pregnant_ttc' in conditions:
+        profile_mode = 'ttc'
+    elif 'menopause' in conditions:
+        profile_mode = 'menopause'
+    elif is_irregular:
+        profile_mode = 'irregular'
+
+    return {
+        "cycle_length_code": encode_choice(typical_cycle_length, CYCLE_LENGTH_BUCKETS),
+        "cycle_length_days": CYCLE_LENGTH_DAYS.get(typical_cycle_length, DEFAULT_CYCLE_LENGTH),
+        "period_duration_code": encode_choice(period_duration, PERIOD_DURATION_BUCKETS),
+        "period_length_days": PERIOD_LENGTH_DAYS.get(period_duration, DEFAULT_PERIOD_LENGTH),
+        "cycle_variability_code": encode_choice(cycle_variability, CYCLE_VARIABILITY),
+        "condition_flags": encode_flags(conditions, HEALTH_CONDITIONS),
+        "fertility_flags": encode_flags(fertility_tracking, FERTILITY_TRACKING),
+        "track_symptoms_code": encode_choice(track_symptoms, TRACK_SYMPTOMS),
+        "dynamic_predictions_code": encode_choice(dynamic_predictions, DYNAMIC_PREDICTIONS),
+        "stress_level_code": encode_choice(stress_level, STRESS_LEVELS),
+        "sleep_pattern_code": encode_choice(sleep_pattern, SLEEP_PATTERNS),
+        "profile_mode": profile_mode,
+        "is_irregular": is_irregular,
+        "show_buffer_days": dynamic_predictions != 'no',
+    }
@@ -0,0 +1,294 @@
+import contextvars
+import logging
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+import sqlalchemy as sa
+from flask import current_app, has_request_context, jsonify
+from flask_sqlalchemy.session import Session
+from sqlalchemy.sql.util import find_tables
+
+from user_cache import LRUCache
+
+logger = logging.getLogger('arivai.partitioning')
+
+# Partition 0 is always the main database (bind key None), which keeps the
+# shared tables and every user who was never placed or moved elsewhere.
+MAIN = None
+DEFAULT_ID_BLOCK = 100_000_000
+SETTLE_GRACE_SECONDS = 30.0
+
+_UNSET = object()
+# Set by PartitionRouter.using()/scope(); otherwise the partition of the
+# request's JWT identity is used.
+_partition = contextvars.ContextVar('partition', default=_UNSET)
+
+
+class PartitionMoving(Exception):
+    def __init__(self, user_id: int):
+        super().__init__(f"user {user_id} is being moved between partitions")
+        self.user_id = user_id
+
+
+class PartitionMoveError(RuntimeError):
+    pass
+
+
+def jump_hash(key: int, buckets: int) -> int:
+    # Jump consistent hash (Lamping & Veach): going from N to N+1 buckets
+    # only moves about 1/(N+1) of the keys.
+    key &= 0xFFFFFFFFFFFFFFFF
+    b, j = -1, 0
+    while j < buckets:
+        b = j
+        key = (key * 2862933555777941757 + 1) & 0xFFFFFFFFFFFFFFFF
+        j = int((b + 1) * ((1 << 31) / ((key >> 33) + 1)))
+    return b
+
+
+def partition_binds(urls: list) -> dict:
+    # SQLALCHEMY_BINDS entries for partitions 1..N; partition 0 is the main database.
+    binds = {}
+    for i, url in enumerate(urls, start=1):
+        if url.startswith("postgres://"):
+            url = url.replace("postgres://", "postgresql://", 1)
+        binds[f'partition_{i}'] = url
+    return binds
+
+
+class PartitionedSession(Session):
+    # Sends statements on partitioned tables to the current partition's
+    # engine; everything else keeps Flask-SQLAlchemy's bind selection.
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        router = current_app.extensions.get('partition_router') if bind is None else None
+        if router is not None and router.enabled and router.routes(mapper, clause):
+            return self._db.engines[router.current_key()]
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+class PartitionRouter:
+    # Maps users to database partitions. The directory table on the main
+    # database is authoritative; a user without a row lives on partition 0.
+    # New users are placed with jump_hash() when more than one partition is
+    # configured. Lookups are cached per process for cache_ttl seconds, which
+    # is why moves fence the user off before copying (see move_users).
+    def __init__(self, db, directory, tables, partitions: int = 1, identity=None,
+                 cache_ttl: float = 30.0, cache_size: int = 100000, id_block: int = DEFAULT_ID_BLOCK):
+        self.db = db
+        self.directory = directory
+        self.tables = frozenset(tables)
+        self.keys = [MAIN] + [f'partition_{i}' for i in range(1, partitions)]
+        self.identity = identity
+        self.cache_ttl = cache_ttl
+        self.id_block = id_block
+        self._cache = LRUCache(maxsize=cache_size, ttl=cache_ttl)
+
+    @property
+    def enabled(self) -> bool:
+        return len(self.keys) > 1
+
+    def install(self, flask_app):
+        flask_app.extensions['partition_router'] = self
+        flask_app.register_error_handler(PartitionMoving, self._moving_response)
+
+    def _moving_response(self, e):
+        response = jsonify({"error": "Your data is being moved; please retry shortly"})
+        response.headers['Retry-After'] = str(int(self.cache_ttl))
+        return response, 503
+
+    # -- routing --
+
+    def routes(self, mapper, clause) -> bool:
+        if mapper is not None and sa.inspect(mapper).local_table.name in self.tables:
+            return True
+        if clause is not None:
+            return any(getattr(t, 'name', None) in self.tables for t in find_tables(clause, include_crud=True))
+        return False
+
+    def current_key(self):
+        key = _partition.get()
+        if key is not _UNSET:
+            return key
+        user_id = self.identity() if has_request_context() and self.identity else None
+        if user_id is None:
+            raise RuntimeError("query on a partitioned table outside a user or partition scope")
+        return self.key_for(user_id)
+
+    def key_for(self, user_id) -> str:
+        user_id = int(user_id)
+        entry = self._cache.get(user_id)
+        if entry is None:
+            entry = self.lookup([user_id]).get(user_id, (0, False))
+            self._cache.set(user_id, entry)
+        index, moving = entry
+        if moving:
+            raise PartitionMoving(user_id)
+        return self.keys[index]
+
+    def lookup(self, user_ids: list) -> dict:
+        # {user_id: (partition index, moving)} for users with a directory row
+        d = self.directory
+        with self.db.engine.connect() as conn:
+            rows = conn.execute(
+                sa.select(d.user_id, d.partition, d.moving).where(d.user_id.in_(user_ids))
+            )
+            return {user_id: (index, bool(moving)) for user_id, index, moving in rows}
+
+    @contextmanager
+    def using(self, key):
+        token = _partition.set(key)
+        try:
+            yield key
+        finally:
+            _partition.reset(token)
+
+    @contextmanager
+    def scope(self, user_id):
+        # Routes partitioned queries to this user's partition outside a
+        # request made with their token (e.g. login, CLI commands).
+        if not self.enabled:
+            yield MAIN
+            return
+        with self.using(self.key_for(user_id)) as key:
+            yield key
+
+    def each_partition(self):
+        for key in self.keys:
+            with self.using(key):
+                yield key
+
+    def group(self, user_ids: list) -> dict:
+        # {bind key: [user ids]} for cross-user jobs, in the given order
+        placed = self.lookup(user_ids) if self.enabled else {}
+        groups = {}
+        for user_id in user_ids:
+            groups.setdefault(self.keys[placed.get(user_id, (0, False))[0]], []).append(user_id)
+        return groups
+
+    def assign(self, user_id: int) -> int:
+        # Called in the registration transaction, once the user has an id.
+        if not self.enabled:
+            return 0
+        index = jump_hash(user_id, len(self.keys))
+        self.db.session.add(self.directory(user_id=user_id, partition=index, moving=False))
+        self._cache.set(user_id, (index, False))
+        return index
+
+    # -- schema --
+
+    def partition_metadata(self) -> sa.MetaData:
+        # The partitioned tables without foreign keys to tables that only
+        # exist on the main database (users), for creating partitions 1..N.
+        metadata = sa.MetaData()
+        for table in self.db.metadata.sorted_tables:
+            if table.name not in self.tables:
+                continue
+            copy = table.to_metadata(metadata)
+            # lets SQLite keep a per-table id counter (see reserve_id_range)
+            copy.dialect_kwargs['sqlite_autoincrement'] = True
+            for constraint in list(copy.foreign_key_constraints):
+                if constraint.elements[0].target_fullname.split('.')[0] in self.tables:
+                    continue
+                copy.constraints.discard(constraint)
+                for fk in constraint.elements:
+                    copy.foreign_keys.discard(fk)
+                    fk.parent.foreign_keys.discard(fk)
+        return metadata
+
+    def reserve_id_range(self, engine, metadata: sa.MetaData, index: int):
+        # Each partition draws new ids from its own block so rows can keep
+        # their ids when a user is moved. PostgreSQL sequences stay in their
+        # block; SQLite's counter follows the largest id ever inserted, so a
+        # move can still clash there and move_users() refuses it.
+        start = index * self.id_block
+        with engine.begin() as conn:
+            for table in metadata.sorted_tables:
+                column = table.autoincrement_column
+                if column is None:
+                    continue
+                if engine.dialect.name == 'postgresql':
+                    conn.execute(sa.text(
+                        f"SELECT setval(pg_get_serial_sequence('{table.name}', '{column.name}'), "
+                        f"GREATEST((SELECT COALESCE(MAX({column.name}), 0) FROM {table.name}), :start))"
+                    ), {"start": start})
+                elif engine.dialect.name == 'sqlite':
+                    conn.execute(sa.text(
+                        "INSERT INTO sqlite_sequence (name, seq) SELECT :name, 0 "
+                        "WHERE NOT EXISTS (SELECT 1 FROM sqlite_sequence WHERE name = :name)"
+                    ), {"name": table.name})
+                    conn.execute(sa.text(
+                        "UPDATE sqlite_sequence SET seq = :start WHERE name = :name AND seq < :start"
+                    ), {"name": table.name, "start": start})
+
+    # -- rebalancing --
+
+    def target_for(self, user_id: int) -> int:
+        return jump_hash(user_id, len(self.keys))
+
+    def _set_directory(self, conn, user_id: int, index: int, moving: bool):
+        d = self.directory
+        values = {"partition": index, "moving": moving, "updated_at": datetime.utcnow()}
+        if not conn.execute(sa.update(d).where(d.user_id == user_id).values(**values)).rowcount:
+            conn.execute(sa.insert(d).values(user_id=user_id, **values))
+
+    def move_users(self, moves: list, settle: float = None, sleep=time.sleep) -> dict:
+        # moves: [(user_id, target partition index)]. The users are marked as
+        # moving (their requests get 503 + Retry-After), and we wait until
+        # every worker's cached directory entry has expired and in-flight
+        # requests have finished. Then each user's rows are copied to the
+        # target, the directory is pointed at it, and the source rows are
+        # deleted.
+        placed = self.lookup([user_id for user_id, _ in moves])
+        sources = {user_id: placed.get(user_id, (0, False))[0] for user_id, _ in moves}
+        moves = [(user_id, target) for user_id, target in moves if sources[user_id] != target]
+        if not moves:
+            return {}
+        with self.db.engine.begin() as conn:
+            for user_id, _ in moves:
+                self._set_directory(conn, user_id, sources[user_id], moving=True)
+        sleep(self.cache_ttl + SETTLE_GRACE_SECONDS if settle is None else settle)
+
+        tables = self.partition_metadata().sorted_tables
+        copied = {}
+        for user_id, target in moves:
+            source = sources[user_id]
+            try:
+                copied[user_id] = self._copy_user(user_id, tables, self.keys[source], self.keys[target])
+            except Exception:
+                with self.db.engine.begin() as conn:
+                    self._set_directory(conn, user_id, source, moving=False)
+                raise
+            with self.db.engine.begin() as conn:
+                self._set_directory(conn, user_id, target, moving=False)
+            with self.db.engines[self.keys[source]].begin() as conn:
+                for table in reversed(tables):
+                    conn.execute(sa.delete(table).where(table.c.user_id == user_id))
+            self._cache.pop(user_id)
+            logger.info('partition.user_moved', extra={
+                "userId": user_id, "source": source, "target": target, "rows": copied[user_id]
+            })
+        return copied
+
+    def _copy_user(self, user_id: int, tables: list, source_key, target_key) -> int:
+        total = 0
+        engines = self.db.engines
+        with engines[source_key].connect() as src, engines[target_key].begin() as dst:
+            for table in tables:
+                rows = [dict(row) for row in src.execute(
+                    sa.select(table).where(table.c.user_id == user_id)
+                ).mappings()]
+                if not rows:
+                    continue
+                column = table.autoincrement_column
+                if column is not None:
+                    clash = dst.execute(sa.select(column).where(
+                        column.in_([row[column.name] for row in rows])
+                    ).limit(1)).first()
+                    if clash:
+                        raise PartitionMoveError(
+                            f"{table.name}.{column.name}={clash[0]} already exists on the target partition"
+                        )
+                dst.execute(sa.insert(table), rows)
+                total += len(rows)
+        return total
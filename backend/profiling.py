@@ -0,0 +1,260 @@
+import contextvars
+import hmac
+import json
+import logging
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime
+
+from flask import g, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger('arivai.profiling')
+
+MAX_RECORDED_STATEMENTS = 200
+STACK_SUFFIX = '.folded'
+META_SUFFIX = '.json'
+
+# Set for the duration of a profiled request. contextvars follow the request
+# into the event-loop thread that runs async views, so SQL and spans issued
+# there are attributed to the right profile.
+_active = contextvars.ContextVar('request_profile', default=None)
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def collapse_stack(frame) -> str:
+    labels = []
+    while frame is not None:
+        labels.append(_frame_label(frame))
+        frame = frame.f_back
+    return ';'.join(reversed(labels))
+
+
+class RequestProfile:
+    def __init__(self, method: str, path: str, endpoint: str, reason: str):
+        self.id = f"{datetime.utcnow().strftime('%Y%m%dT%H%M%S%f')}-{uuid.uuid4().hex[:8]}"
+        self.method = method
+        self.path = path
+        self.endpoint = endpoint
+        self.reason = reason
+        self.started_at = datetime.utcnow()
+        self.started = time.perf_counter()
+        self.duration_ms = None
+        self.status = None
+        self.threads = {threading.get_ident()}
+        self.samples = Counter()
+        self.statements = []
+        self.sql_ms = 0.0
+        self.sql_count = 0
+        self.spans = []
+        self._lock = threading.Lock()
+
+    def attach_current_thread(self):
+        self.threads.add(threading.get_ident())
+
+    def add_statement(self, statement: str, ms: float):
+        with self._lock:
+            self.sql_count += 1
+            self.sql_ms += ms
+            if len(self.statements) < MAX_RECORDED_STATEMENTS:
+                self.statements.append({"statement": statement, "ms": round(ms, 3)})
+
+    def add_span(self, name: str, ms: float):
+        with self._lock:
+            self.spans.append({"name": name, "ms": round(ms, 3)})
+
+    def summary(self) -> dict:
+        return {
+            "id": self.id,
+            "method": self.method,
+            "path": self.path,
+            "endpoint": self.endpoint,
+            "reason": self.reason,
+            "status": self.status,
+            "startedAt": self.started_at.isoformat(),
+            "durationMs": self.duration_ms,
+            "samples": sum(self.samples.values()),
+            "sql": {
+                "count": self.sql_count,
+                "totalMs": round(self.sql_ms, 3),
+                "slowest": sorted(self.statements, key=lambda s: s["ms"], reverse=True)[:20],
+            },
+            "spans": self.spans,
+        }
+
+
+class _Sampler:
+    # Wall-clock sampler: every interval it reads the current frame of each
+    # thread working on the request, so blocked time shows up as well as CPU.
+    def __init__(self, profile: RequestProfile, interval: float):
+        self.profile = profile
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='request-profiler', daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frames = sys._current_frames()
+            for thread_id in list(self.profile.threads):
+                frame = frames.get(thread_id)
+                if frame is not None:
+                    self.profile.samples[collapse_stack(frame)] += 1
+
+
+@contextmanager
+def profile_span(name: str):
+    # Times a block (e.g. the Gemini call) on the active profile; a no-op
+    # for requests that aren't being profiled.
+    profile = _active.get()
+    if profile is None:
+        yield
+        return
+    profile.attach_current_thread()
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        profile.add_span(name, (time.perf_counter() - started) * 1000)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _active.get() is not None:
+        conn.info.setdefault('profile_started', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    profile = _active.get()
+    if profile is None:
+        return
+    starts = conn.info.get('profile_started')
+    if starts:
+        profile.attach_current_thread()
+        profile.add_statement(statement, (time.perf_counter() - starts.pop()) * 1000)
+
+
+class RequestProfiler:
+    # Profiles a sampled fraction of requests, or any request carrying
+    # X-Profile-Token equal to the configured token. Each profile is written
+    # as <id>.folded (collapsed stacks for flamegraph.pl or speedscope) and
+    # <id>.json (timings, SQL and spans).
+    def __init__(self, directory: str, sample_rate: float = 0.0, token: str = None, endpoints=None,
+                 interval: float = 0.005, retention: int = 200):
+        self.directory = directory
+        self.sample_rate = sample_rate
+        self.token = token
+        self.endpoints = set(endpoints or ())
+        self.interval = interval
+        self.retention = retention
+
+    @property
+    def enabled(self) -> bool:
+        return self.sample_rate > 0 or bool(self.token)
+
+    def install(self, flask_app):
+        if not self.enabled:
+            return
+        event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+        flask_app.before_request(self._start)
+        flask_app.after_request(self._record_status)
+        flask_app.teardown_request(self._finish)
+
+    def _reason(self):
+        if self.endpoints and request.endpoint not in self.endpoints:
+            return None
+        header = request.headers.get('X-Profile-Token')
+        if header and self.token and hmac.compare_digest(header, self.token):
+            return 'header'
+        if self.sample_rate and random.random() < self.sample_rate:
+            return 'sampled'
+        return None
+
+    def _start(self):
+        reason = self._reason()
+        if reason is None:
+            return
+        profile = RequestProfile(request.method, request.path, request.endpoint, reason)
+        sampler = _Sampler(profile, self.interval)
+        g.request_profile = (profile, sampler, _active.set(profile))
+        sampler.start()
+
+    def _record_status(self, response):
+        state = g.get('request_profile')
+        if state:
+            state[0].status = response.status_code
+        return response
+
+    def _finish(self, exc):
+        state = g.pop('request_profile', None)
+        if not state:
+            return
+        profile, sampler, token = state
+        sampler.stop()
+        _active.reset(token)
+        profile.duration_ms = round((time.perf_counter() - profile.started) * 1000, 3)
+        try:
+            self.write(profile)
+        except OSError as e:
+            logger.warning('profile.write_failed', extra={"profileId": profile.id, "error": str(e)})
+
+    def write(self, profile: RequestProfile):
+        os.makedirs(self.directory, exist_ok=True)
+        with open(os.path.join(self.directory, profile.id + STACK_SUFFIX), 'w') as f:
+            for stack, count in profile.samples.most_common():
+                f.write(f"{stack} {count}\n")
+        with open(os.path.join(self.directory, profile.id + META_SUFFIX), 'w') as f:
+            json.dump({**profile.summary(), "statements": profile.statements}, f)
+        logger.info('profile.written', extra={"profileId": profile.id, "path": profile.path, "durationMs": profile.duration_ms})
+        self.prune()
+
+    def prune(self):
+        for profile_id in self.list_ids()[:-self.retention]:
+            for suffix in (STACK_SUFFIX, META_SUFFIX):
+                try:
+                    os.remove(os.path.join(self.directory, profile_id + suffix))
+                except FileNotFoundError:
+                    pass
+
+    def list_ids(self) -> list:
+        if not os.path.isdir(self.directory):
+            return []
+        return sorted(name[:-len(META_SUFFIX)] for name in os.listdir(self.directory) if name.endswith(META_SUFFIX))
+
+    def list_profiles(self, limit: int = 100) -> list:
+        profiles = []
+        for profile_id in reversed(self.list_ids()):
+            if len(profiles) >= limit:
+                break
+            try:
+                with open(os.path.join(self.directory, profile_id + META_SUFFIX)) as f:
+                    meta = json.load(f)
+            except (OSError, ValueError):
+                continue
+            meta.pop("statements", None)
+            profiles.append(meta)
+        return profiles
+
+    def read(self, profile_id: str, suffix: str):
+        # ids are generated here; anything else is rejected rather than joined
+        if profile_id not in self.list_ids():
+            return None
+        with open(os.path.join(self.directory, profile_id + suffix)) as f:
+            return f.read()
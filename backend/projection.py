@@ -0,0 +1,67 @@
+from flask import request
+from sqlalchemy.orm import load_only
+
+from request_validation import ValidationError, error_response
+
+FULL = 'full'
+SUMMARY = 'summary'
+
+
+class FieldSet:
+    # The JSON fields a list endpoint can return, in output order, mapped to
+    # model attributes (or (attribute, convert) pairs). Clients can ask for a
+    # subset with ?fields=a,b or ?view=summary. Only the requested columns are
+    # selected, so large text columns the model defers are read only when
+    # asked for.
+    def __init__(self, model, fields: dict, summary: tuple = None):
+        self.model = model
+        self.fields = {
+            name: (spec, None) if isinstance(spec, str) else spec for name, spec in fields.items()
+        }
+        self.views = {FULL: tuple(fields)}
+        if summary is not None:
+            self.views[SUMMARY] = tuple(name for name in fields if name in summary)
+
+    def requested(self, args) -> tuple:
+        # Field names from the query string, in output order; everything by default.
+        names = {name.strip() for name in args.get('fields', '').split(',') if name.strip()}
+        view = args.get('view')
+        if names and view:
+            raise ValidationError({"": "use either fields or view, not both"})
+        if names:
+            unknown = names - self.fields.keys()
+            if unknown:
+                raise ValidationError({"fields": f"has unknown names {', '.join(sorted(unknown))}"})
+            return tuple(name for name in self.fields if name in names)
+        view = view or FULL
+        if view not in self.views:
+            raise ValidationError({"view": f"must be one of {', '.join(self.views)}"})
+        return self.views[view]
+
+    def from_request(self):
+        # (names, None), or (None, 400 response) for a bad fields/view parameter
+        try:
+            return self.requested(request.args), None
+        except ValidationError as e:
+            return None, error_response(e.args[0])
+
+    def smallest_view(self, names: tuple) -> str:
+        # The view to load (and cache) when `names` will be projected from it.
+        summary = self.views.get(SUMMARY)
+        return SUMMARY if summary is not None and set(names) <= set(summary) else FULL
+
+    def load_options(self, names: tuple):
+        return load_only(*(getattr(self.model, self.fields[name][0]) for name in names))
+
+    def serialize(self, obj, names: tuple) -> dict:
+        item = {}
+        for name in names:
+            attribute, convert = self.fields[name]
+            value = getattr(obj, attribute)
+            item[name] = convert(value) if convert is not None and value is not None else value
+        return item
+
+    def project(self, items: list, names: tuple, loaded: tuple) -> list:
+        if names == loaded:
+            return items
+        return [{name: item[name] for name in names} for item in items]
@@ -0,0 +1,234 @@
+import inspect
+from datetime import date, datetime
+from functools import wraps
+
+from flask import jsonify, request
+
+MISSING = object()
+DEFAULT_MAX_BODY_BYTES = 64 * 1024
+DEFAULT_MAX_BATCH_ITEMS = 50
+
+
+class ValidationError(ValueError):
+    pass
+
+
+def parse_date(value) -> date:
+    # Plain YYYY-MM-DD is by far the most common input and takes the fast
+    # path; full ISO timestamps (e.g. from toISOString()) keep their date.
+    if not isinstance(value, str):
+        raise ValidationError("must be a date (YYYY-MM-DD)")
+    try:
+        if len(value) == 10:
+            return date.fromisoformat(value)
+        return datetime.fromisoformat(value).date()
+    except ValueError:
+        raise ValidationError("must be a date (YYYY-MM-DD)")
+
+
+class Field:
+    def __init__(self, kind, required: bool = False, nullable: bool = False, default=MISSING,
+                 max_length: int = None, max_bytes: int = None, min_value: int = None, max_value: int = None,
+                 choices: tuple = None, max_items: int = 20):
+        self.kind = kind
+        self.required = required
+        self.nullable = nullable
+        self.default = default
+        self.max_length = max_length
+        self.max_bytes = max_bytes
+        self.min_value = min_value
+        self.max_value = max_value
+        self.choices = frozenset(choices) if choices is not None else None
+        self.max_items = max_items
+
+    def compile(self):
+        # Returns one closure per field with only the checks it needs, so
+        # validating a body is a straight run over prebuilt functions.
+        checks = []
+        if self.kind is str:
+            checks.append(_check_str)
+            if self.max_length is not None:
+                checks.append(_check_max_length(self.max_length))
+            if self.max_bytes is not None:
+                checks.append(_check_max_bytes(self.max_bytes))
+            if self.choices is not None:
+                checks.append(_check_choice(self.choices))
+        elif self.kind is int:
+            checks.append(_check_int)
+            if self.min_value is not None or self.max_value is not None:
+                checks.append(_check_range(self.min_value, self.max_value))
+        elif self.kind is date:
+            checks.append(parse_date)
+        elif self.kind is list:
+            checks.append(_check_str_list(self.max_items, self.choices))
+        else:
+            raise TypeError(f"unsupported field kind {self.kind!r}")
+        nullable = self.nullable
+        # HTML inputs send "" for an empty date or number
+        blank_is_null = self.kind is not str
+
+        def validate(value):
+            if value is None or (blank_is_null and value == ''):
+                if nullable:
+                    return None
+                raise ValidationError("must not be null")
+            for check in checks:
+                value = check(value)
+            return value
+        return validate
+
+
+def _check_str(value):
+    if not isinstance(value, str):
+        raise ValidationError("must be a string")
+    return value
+
+
+def _check_max_length(limit: int):
+    def check(value):
+        if len(value) > limit:
+            raise ValidationError(f"must be at most {limit} characters")
+        return value
+    return check
+
+
+def _check_max_bytes(limit: int):
+    def check(value):
+        if len(value.encode('utf-8')) > limit:
+            raise ValidationError(f"must be at most {limit} bytes")
+        return value
+    return check
+
+
+def _check_choice(choices: frozenset):
+    def check(value):
+        if value not in choices:
+            raise ValidationError(f"must be one of {', '.join(sorted(c for c in choices if c))}")
+        return value
+    return check
+
+
+def _check_int(value):
+    # bool is an int subclass; "28" from a form field is accepted
+    if isinstance(value, bool):
+        raise ValidationError("must be an integer")
+    if isinstance(value, int):
+        return value
+    if isinstance(value, str) and value.strip().lstrip('-').isdigit():
+        return int(value)
+    raise ValidationError("must be an integer")
+
+
+def _check_range(low, high):
+    def check(value):
+        if (low is not None and value < low) or (high is not None and value > high):
+            raise ValidationError(f"must be between {low} and {high}")
+        return value
+    return check
+
+
+def _check_str_list(max_items: int, choices):
+    def check(value):
+        if not isinstance(value, list) or not all(isinstance(item, str) for item in value):
+            raise ValidationError("must be a list of strings")
+        if len(value) > max_items:
+            raise ValidationError(f"must have at most {max_items} items")
+        if choices is not None:
+            unknown = [item for item in value if item not in choices]
+            if unknown:
+                raise ValidationError(f"unknown values {', '.join(unknown)}")
+        return value
+    return check
+
+
+class Schema:
+    # partial=True is for updates: absent fields are left out of the result
+    # instead of being filled with defaults.
+    def __init__(self, fields: dict, partial: bool = False, max_bytes: int = DEFAULT_MAX_BODY_BYTES):
+        self.partial = partial
+        self.max_bytes = max_bytes
+        self._fields = [
+            (name, field.required, field.default, field.compile()) for name, field in fields.items()
+        ]
+
+    def validate(self, data) -> dict:
+        if not isinstance(data, dict):
+            raise ValidationError({"": "request body must be a JSON object"})
+        values, errors = {}, {}
+        for name, required, default, validate in self._fields:
+            value = data.get(name, MISSING)
+            if value is MISSING:
+                if required:
+                    errors[name] = "is required"
+                elif default is not MISSING and not self.partial:
+                    values[name] = default
+                continue
+            try:
+                values[name] = validate(value)
+            except ValidationError as e:
+                errors[name] = str(e)
+        if errors:
+            raise ValidationError(errors)
+        return values
+
+    def validate_many(self, items, name: str, max_items: int = DEFAULT_MAX_BATCH_ITEMS) -> list:
+        if not isinstance(items, list) or not items:
+            raise ValidationError({name: "must be a non-empty list"})
+        if len(items) > max_items:
+            raise ValidationError({name: f"must have at most {max_items} items"})
+        values, errors = [], {}
+        for index, item in enumerate(items):
+            if not isinstance(item, dict):
+                errors[f"{name}[{index}]"] = "must be an object"
+                continue
+            try:
+                values.append(self.validate(item))
+            except ValidationError as e:
+                errors.update({
+                    f"{name}[{index}].{field}" if field else f"{name}[{index}]": error
+                    for field, error in e.args[0].items()
+                })
+        if errors:
+            raise ValidationError(errors)
+        return values
+
+
+def error_response(errors: dict):
+    message = '; '.join(f"{name} {error}" if name else error for name, error in errors.items())
+    return jsonify({"error": message, "fields": {k: v for k, v in errors.items() if k}}), 400
+
+
+def validate_json(schema: Schema, many: str = None):
+    # Validates the JSON body before the view runs and passes the cleaned
+    # values as `data`. Oversized bodies are refused before being read.
+    # With `many`, a body of {many: [item, ...]} is accepted too and `data`
+    # is then the list of cleaned items.
+    def decorator(view):
+        def check():
+            if request.content_length is not None and request.content_length > schema.max_bytes:
+                return None, (jsonify({"error": f"Request body exceeds {schema.max_bytes} bytes"}), 413)
+            body = request.get_json(silent=True)
+            try:
+                if many is not None and isinstance(body, dict) and many in body:
+                    return schema.validate_many(body[many], many), None
+                return schema.validate(body), None
+            except ValidationError as e:
+                return None, error_response(e.args[0])
+
+        if inspect.iscoroutinefunction(view):
+            @wraps(view)
+            async def async_wrapper(*args, **kwargs):
+                body, error = check()
+                if error:
+                    return error
+                return await view(*args, data=body, **kwargs)
+            return async_wrapper
+
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            body, error = check()
+            if error:
+                return error
+            return view(*args, data=body, **kwargs)
+        return wrapper
+    return decorator
@@ -0,0 +1,172 @@
+import math
+import re
+import threading
+import time
+
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+STOPWORDS = frozenset("""
+a about after again all also am an and any are as at be because been before being
+but by can could did do does doing during each few for from had has have having
+he her here hers how i if in into is it its just me more most my no nor not of
+off on once only or other our out over own same she should so some such than that
+the their them then there these they this those through to too under until up very
+was we were what when where which while who why will with would you your yours
+feel feeling get getting really help tips any im ive dont
+""".split())
+
+PHASES = ('Menstrual', 'Follicular', 'Ovulation', 'Luteal')
+
+
+def stem(token: str) -> str:
+    if token.endswith('ies') and len(token) > 4:
+        token = token[:-3] + 'y'
+    elif token.endswith('s') and not token.endswith('ss') and len(token) > 3:
+        token = token[:-1]
+    for suffix in ('ation', 'ing', 'ness', 'ate'):
+        if token.endswith(suffix) and len(token) - len(suffix) >= 3:
+            return token[:-len(suffix)]
+    if token.endswith('y') and len(token) > 4:
+        return token[:-1]
+    return token
+
+
+def tokenize(text: str) -> list:
+    return [stem(t) for t in TOKEN_RE.findall(text.lower()) if t not in STOPWORDS]
+
+
+class Passage:
+    def __init__(self, source: str, title: str, text: str, phase: str = None):
+        self.source = source
+        self.title = title
+        self.text = text
+        self.phase = phase
+        self.tokens = tokenize(f"{title} {text}")
+
+
+class BM25Index:
+    def __init__(self, passages: list, k1: float = 1.5, b: float = 0.75):
+        self.passages = passages
+        self.k1 = k1
+        self.b = b
+        self.postings = {}
+        self.lengths = [len(p.tokens) for p in passages]
+        self.avg_length = (sum(self.lengths) / len(passages)) if passages else 0.0
+        for i, passage in enumerate(passages):
+            counts = {}
+            for token in passage.tokens:
+                counts[token] = counts.get(token, 0) + 1
+            for token, tf in counts.items():
+                self.postings.setdefault(token, []).append((i, tf))
+        n = len(passages)
+        self.idf = {
+            token: math.log(1 + (n - len(docs) + 0.5) / (len(docs) + 0.5))
+            for token, docs in self.postings.items()
+        }
+
+    def search(self, query: str, k: int = 3, phase: str = None, phase_boost: float = 1.25,
+               min_score: float = 0.0) -> list:
+        scores = {}
+        for token in set(tokenize(query)):
+            idf = self.idf.get(token)
+            if idf is None:
+                continue
+            for i, tf in self.postings[token]:
+                norm = self.k1 * (1 - self.b + self.b * self.lengths[i] / self.avg_length)
+                scores[i] = scores.get(i, 0.0) + idf * tf * (self.k1 + 1) / (tf + norm)
+        if phase:
+            for i in scores:
+                if self.passages[i].phase == phase:
+                    scores[i] *= phase_boost
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+        return [(score, self.passages[i]) for i, score in ranked[:k] if score > min_score]
+
+
+def detect_phase(text: str) -> str:
+    upper = text.upper()
+    for phase in PHASES:
+        if phase.upper() in upper:
+            return phase
+    return None
+
+
+def chunk_sections(text: str, source: str, skip_prefixes: tuple = ()) -> list:
+    # Splits "HEADER:" blocks followed by "- bullet" lines.
+    passages = []
+    title, lines = None, []
+
+    def close():
+        if title and lines and not title.startswith(skip_prefixes):
+            passages.append(Passage(source, title, "\n".join(lines), detect_phase(title)))
+
+    for raw in text.strip().splitlines():
+        line = raw.strip()
+        if not line:
+            continue
+        if line.endswith(':') and not line.startswith('-'):
+            close()
+            title, lines = line.rstrip(':'), []
+        elif title:
+            lines.append(line)
+    close()
+    return passages
+
+
+def chunk_article(title: str, body: str, source: str, phase: str = None) -> list:
+    # Keeps "**Heading:**" paragraphs attached to the list that follows them.
+    passages = []
+    pending = []
+    for paragraph in re.split(r"\n\s*\n", body.strip()):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+        pending.append(paragraph)
+        if paragraph.startswith('**') and paragraph.endswith('**') and '\n' not in paragraph:
+            continue
+        passages.append(Passage(source, title, "\n".join(pending), phase))
+        pending = []
+    if pending:
+        passages.append(Passage(source, title, "\n".join(pending), phase))
+    return passages
+
+
+def estimate_tokens(text: str) -> int:
+    # ~4 characters per token for English prose; close enough for budgeting
+    return (len(text) + 3) // 4
+
+
+def pack_passages(hits: list, budget: int) -> list:
+    # Greedy by rank; a passage that doesn't fit is skipped so a shorter,
+    # lower-ranked one can still use the remaining budget.
+    packed, used = [], 0
+    for _, passage in hits:
+        cost = estimate_tokens(passage.title) + estimate_tokens(passage.text) + 2
+        if used + cost > budget:
+            continue
+        packed.append(passage)
+        used += cost
+    return packed
+
+
+class RefreshingIndex:
+    # Rebuilds from loader() at most once per ttl. While one thread rebuilds,
+    # the others keep searching the previous index.
+    def __init__(self, loader, ttl: float = 300.0):
+        self.loader = loader
+        self.ttl = ttl
+        self._index = None
+        self._expires_at = 0.0
+        self._lock = threading.Lock()
+
+    def get(self) -> BM25Index:
+        if time.monotonic() >= self._expires_at and self._lock.acquire(blocking=self._index is None):
+            try:
+                if self._index is None or time.monotonic() >= self._expires_at:
+                    self._index = BM25Index(self.loader())
+                    self._expires_at = time.monotonic() + self.ttl
+            finally:
+                self._lock.release()
+        return self._index
+
+    def invalidate(self):
+        self._expires_at = 0.0
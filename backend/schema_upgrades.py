@@ -0,0 +1,41 @@
+from sqlalchemy import inspect, text
+
+
+def add_missing_columns(engine, metadata) -> list:
+    # db.create_all() only creates missing tables, so columns added to existing
+    # models are appended here. New columns are always added as nullable.
+    inspector = inspect(engine)
+    existing_tables = set(inspector.get_table_names())
+    added = []
+    with engine.begin() as conn:
+        for table in metadata.sorted_tables:
+            if table.name not in existing_tables:
+                continue
+            existing = {c['name'] for c in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing:
+                    continue
+                ddl = f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column.type.compile(dialect=engine.dialect)}'
+                if column.server_default is not None:
+                    ddl += f' DEFAULT {column.server_default.arg}'
+                conn.execute(text(ddl))
+                added.append(f'{table.name}.{column.name}')
+    return added
+
+
+def add_missing_indexes(engine, metadata) -> list:
+    # Indexes declared on columns added by add_missing_columns aren't created
+    # by db.create_all() either.
+    inspector = inspect(engine)
+    existing_tables = set(inspector.get_table_names())
+    added = []
+    with engine.begin() as conn:
+        for table in metadata.sorted_tables:
+            if table.name not in existing_tables:
+                continue
+            existing = {index['name'] for index in inspector.get_indexes(table.name)}
+            for index in table.indexes:
+                if index.name not in existing:
+                    index.create(conn)
+                    added.append(index.name)
+    return added
@@ -0,0 +1,46 @@
+import multiprocessing
+import os
+import runpy
+
+
+def default_workers() -> int:
+    configured = os.environ.get('WEB_CONCURRENCY')
+    if configured:
+        return max(1, int(configured))
+    # (2 x cores) + 1, capped so small containers that report the host's
+    # core count don't fork dozens of workers each holding a DB pool.
+    return min(multiprocessing.cpu_count() * 2 + 1, 9)
+
+
+def default_threads() -> int:
+    configured = os.environ.get('GUNICORN_THREADS')
+    if configured:
+        return max(1, int(configured))
+    # Chat requests spend almost all of their time waiting on Gemini, so each
+    # worker needs enough threads to keep many upstream calls in flight.
+    return 16
+
+
+def bind_address() -> str:
+    return f"{os.environ.get('HOST', '0.0.0.0')}:{os.environ.get('PORT', '5001')}"
+
+
+def run_gunicorn(flask_app) -> bool:
+    try:
+        from gunicorn.app.base import BaseApplication
+    except ImportError:
+        return False
+
+    config_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'gunicorn.conf.py')
+
+    class ArivaiApplication(BaseApplication):
+        def load_config(self):
+            for key, value in runpy.run_path(config_path).items():
+                if key in self.cfg.settings and value is not None:
+                    self.cfg.set(key, value)
+
+        def load(self):
+            return flask_app
+
+    ArivaiApplication().run()
+    return True
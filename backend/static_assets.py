@@ -0,0 +1,129 @@
+import gzip
+import hashlib
+import mimetypes
+import os
+import re
+
+from flask import Response, request
+from werkzeug.wsgi import wrap_file
+
+# Vite emits content-hashed bundles such as assets/index-B3kq9xZ1.js
+HASHED_ASSET_RE = re.compile(r'^assets/.+-[A-Za-z0-9_-]{8}\.[a-z0-9]+$')
+
+IMMUTABLE_CACHE = 'public, max-age=31536000, immutable'
+DEFAULT_CACHE = 'public, max-age=3600'
+INDEX_CACHE = 'no-cache'
+
+# Preferred first when the client accepts several.
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+
+class StaticAsset:
+    def __init__(self, path: str, rel_path: str):
+        stat = os.stat(path)
+        self.path = path
+        self.size = stat.st_size
+        self.etag = hashlib.md5(f"{rel_path}:{stat.st_size}:{stat.st_mtime_ns}".encode()).hexdigest()
+        self.mimetype = mimetypes.guess_type(rel_path)[0] or 'application/octet-stream'
+        self.cache_control = IMMUTABLE_CACHE if HASHED_ASSET_RE.search(rel_path) else DEFAULT_CACHE
+        self.variants = {}
+        for encoding, suffix in ENCODINGS:
+            variant_path = path + suffix
+            if os.path.isfile(variant_path):
+                self.variants[encoding] = (variant_path, os.path.getsize(variant_path))
+
+
+class StaticManifest:
+    def __init__(self, root: str):
+        self.root = root
+        self.assets = {}
+        self.index_body = None
+        self.index_variants = {}
+        self.index_etag = None
+        if os.path.isdir(root):
+            self._scan()
+
+    def _scan(self):
+        compressed_suffixes = tuple(suffix for _, suffix in ENCODINGS)
+        for dirpath, _, filenames in os.walk(self.root):
+            for filename in filenames:
+                if filename.endswith(compressed_suffixes):
+                    continue
+                path = os.path.join(dirpath, filename)
+                rel_path = os.path.relpath(path, self.root).replace(os.sep, '/')
+                self.assets[rel_path] = StaticAsset(path, rel_path)
+
+        index = self.assets.get('index.html')
+        if index:
+            with open(index.path, 'rb') as f:
+                self.index_body = f.read()
+            self.index_etag = index.etag
+            compressed = gzip.compress(self.index_body)
+            if len(compressed) < len(self.index_body):
+                self.index_variants['gzip'] = compressed
+            if 'br' in index.variants:
+                with open(index.variants['br'][0], 'rb') as f:
+                    self.index_variants['br'] = f.read()
+
+    @property
+    def has_frontend(self) -> bool:
+        return self.index_body is not None
+
+    def _accepted(self, available) -> str:
+        accept = request.accept_encodings
+        for encoding, _ in ENCODINGS:
+            if encoding in available and accept.quality(encoding) > 0:
+                return encoding
+        return None
+
+    def _not_modified(self, etag: str, cache_control: str) -> Response:
+        if etag in request.if_none_match:
+            response = Response(status=304)
+            response.set_etag(etag)
+            response.headers['Cache-Control'] = cache_control
+            return response
+        return None
+
+    def serve(self, path: str) -> Response:
+        asset = self.assets.get(path)
+        if asset is None or path == 'index.html':
+            return self.serve_index()
+
+        encoding = self._accepted(asset.variants)
+        etag = f"{asset.etag}-{encoding}" if encoding else asset.etag
+        not_modified = self._not_modified(etag, asset.cache_control)
+        if not_modified:
+            return not_modified
+
+        file_path, size = asset.variants[encoding] if encoding else (asset.path, asset.size)
+        response = Response(
+            wrap_file(request.environ, open(file_path, 'rb')),
+            mimetype=asset.mimetype,
+            direct_passthrough=True
+        )
+        response.content_length = size
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = asset.cache_control
+        if asset.variants:
+            response.vary.add('Accept-Encoding')
+        if encoding:
+            response.content_encoding = encoding
+        return response
+
+    def serve_index(self) -> Response:
+        encoding = self._accepted(self.index_variants)
+        etag = f"{self.index_etag}-{encoding}" if encoding else self.index_etag
+        not_modified = self._not_modified(etag, INDEX_CACHE)
+        if not_modified:
+            return not_modified
+
+        response = Response(
+            self.index_variants[encoding] if encoding else self.index_body,
+            mimetype='text/html'
+        )
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = INDEX_CACHE
+        response.vary.add('Accept-Encoding')
+        if encoding:
+            response.content_encoding = encoding
+        return response
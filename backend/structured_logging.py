@@ -0,0 +1,185 @@
+import atexit
+import contextvars
+import json
+import logging
+import os
+import queue
+import random
+import re
+import sys
+import time
+import uuid
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+
+from flask import g, request
+
+# Set per request (see install_request_logging); contextvars follow the
+# request into the event-loop thread of async views.
+request_id_var = contextvars.ContextVar('request_id', default=None)
+
+REQUEST_ID_RE = re.compile(r'^[A-Za-z0-9._-]{1,64}$')
+REDACTED = '[REDACTED]'
+SECRET_KEY_RE = re.compile(r'^(password|secret|(access|refresh)?_?token|api_?key|authorization|cookie)$', re.I)
+SECRET_VALUE_RES = (
+    re.compile(r'AIza[0-9A-Za-z_-]{35}'),                                    # Google API keys
+    re.compile(r'eyJ[0-9A-Za-z_-]+\.[0-9A-Za-z_-]+\.[0-9A-Za-z_-]+'),        # JWTs
+    re.compile(r'(?i)(bearer\s+)[^\s"\']+'),
+    re.compile(r'(?i)(postgres(?:ql)?://[^:/\s]+:)[^@\s]+'),                  # DB URL passwords
+)
+
+# Attributes every LogRecord has; anything else came in through extra=.
+_STANDARD_ATTRS = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+
+def redact(text: str) -> str:
+    for pattern in SECRET_VALUE_RES:
+        text = pattern.sub(lambda m: (m.group(1) if m.groups() else '') + REDACTED, text)
+    return text
+
+
+def _redact_value(key: str, value):
+    if SECRET_KEY_RE.search(key):
+        return REDACTED
+    if isinstance(value, str):
+        return redact(value)
+    if isinstance(value, dict):
+        return {k: _redact_value(str(k), v) for k, v in value.items()}
+    return value
+
+
+class JsonFormatter(logging.Formatter):
+    # One JSON object per line. Runs on the listener thread, so
+    # serialization and redaction stay off the request path.
+    def format(self, record) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            "level": record.levelname.lower(),
+            "logger": record.name,
+            "event": redact(record.getMessage()),
+        }
+        request_id = getattr(record, 'request_id', None)
+        if request_id:
+            entry["requestId"] = request_id
+        for key, value in vars(record).items():
+            if key not in _STANDARD_ATTRS and key != 'request_id':
+                entry[key] = _redact_value(key, value)
+        if record.exc_text:
+            entry["exception"] = redact(record.exc_text)
+        return json.dumps(entry, default=str)
+
+
+class SamplingFilter(logging.Filter):
+    # Keeps a fraction of the records for high-volume events, keyed by the
+    # event name (the log message). Warnings and errors are always kept.
+    def __init__(self, rates: dict):
+        super().__init__()
+        self.rates = rates
+
+    def filter(self, record) -> bool:
+        if record.levelno >= logging.WARNING:
+            return True
+        rate = self.rates.get(record.msg)
+        return rate is None or random.random() < rate
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    # The request thread only formats the exception text (tracebacks can't
+    # cross threads) and does a put_nowait; a full queue drops the record
+    # rather than blocking. The queue and listener are created per process,
+    # since threads started before a gunicorn fork don't exist in workers.
+    def __init__(self, target: logging.Handler, maxsize: int = 10000):
+        super().__init__(None)
+        self.target = target
+        self.maxsize = maxsize
+        self.dropped = 0
+        self._pid = None
+        self._listener = None
+
+    def _ensure_listener(self):
+        if self._pid == os.getpid():
+            return
+        self._pid = os.getpid()
+        self.queue = queue.Queue(self.maxsize)
+        self._listener = QueueListener(self.queue, self.target, respect_handler_level=True)
+        self._listener.start()
+        atexit.register(self._listener.stop)
+
+    def prepare(self, record):
+        record.request_id = request_id_var.get()
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+    def enqueue(self, record):
+        self._ensure_listener()
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def parse_sample_rates(spec: str) -> dict:
+    rates = {}
+    for item in (spec or '').split(','):
+        if '=' in item:
+            event, rate = item.split('=', 1)
+            rates[event.strip()] = float(rate)
+    return rates
+
+
+def configure_logging(level: str = 'INFO', sample_rates: dict = None, stream=None) -> NonBlockingQueueHandler:
+    # Routes the 'arivai' logger tree through the queue to a JSON stream handler.
+    target = logging.StreamHandler(stream or sys.stdout)
+    target.setFormatter(JsonFormatter())
+    handler = NonBlockingQueueHandler(target)
+    handler.addFilter(SamplingFilter(sample_rates or {}))
+    logger = logging.getLogger('arivai')
+    logger.handlers = [handler]
+    logger.setLevel(level.upper())
+    logger.propagate = False
+    return handler
+
+
+def request_id_from_header(value: str) -> str:
+    return value if value and REQUEST_ID_RE.match(value) else None
+
+
+def install_request_logging(flask_app, slow_ms: float = 1000.0):
+    # Tags every record logged during a request with its id (taken from
+    # X-Request-ID when the caller sends a sane one) and logs one
+    # http.request event per response; slow or failed requests are warnings
+    # or errors and so are never sampled away.
+    logger = logging.getLogger('arivai.http')
+
+    @flask_app.before_request
+    def start_request_log():
+        request_id = request_id_from_header(request.headers.get('X-Request-ID')) or uuid.uuid4().hex
+        g.request_log = (request_id_var.set(request_id), time.perf_counter())
+
+    @flask_app.after_request
+    def finish_request_log(response):
+        state = g.get('request_log')
+        if state is None:
+            return response
+        duration_ms = round((time.perf_counter() - state[1]) * 1000, 2)
+        level = logging.INFO
+        if response.status_code >= 500:
+            level = logging.ERROR
+        elif duration_ms >= slow_ms:
+            level = logging.WARNING
+        logger.log(level, 'http.request', extra={
+            "method": request.method, "path": request.path, "endpoint": request.endpoint,
+            "status": response.status_code, "durationMs": duration_ms,
+        })
+        response.headers['X-Request-ID'] = request_id_var.get()
+        return response
+
+    @flask_app.teardown_request
+    def clear_request_log(exc):
+        state = g.pop('request_log', None)
+        if state is not None:
+            request_id_var.reset(state[0])
@@ -0,0 +1,142 @@
+import threading
+import time
+from datetime import datetime, timezone
+
+PENDING_INFO_KEY = 'token_revocation.pending'
+
+
+def _epoch(expires_at: datetime) -> float:
+    # expiry times are stored as naive UTC
+    return expires_at.replace(tzinfo=timezone.utc).timestamp()
+
+
+class MemoryRevocationBackend:
+    # Process-local stand-in for the shared store, used in tests and
+    # single-process development.
+    def __init__(self):
+        self._entries = []
+        self._keys = set()
+        self._next_id = 1
+        self._lock = threading.Lock()
+
+    def add(self, key: str, expires_at: datetime, reason: str, on_commit=None) -> bool:
+        with self._lock:
+            added = key not in self._keys
+            if added:
+                self._keys.add(key)
+                self._entries.append((self._next_id, key, expires_at, reason))
+                self._next_id += 1
+        if on_commit is not None:
+            on_commit()
+        return added
+
+    def since(self, cursor: int) -> list:
+        with self._lock:
+            return [entry for entry in self._entries if entry[0] > cursor]
+
+    def purge_expired(self, now: datetime) -> int:
+        with self._lock:
+            before = len(self._entries)
+            self._entries = [entry for entry in self._entries if entry[2] > now]
+            self._keys = {entry[1] for entry in self._entries}
+            return before - len(self._entries)
+
+
+class SQLAlchemyRevocationBackend:
+    # Ids from concurrent transactions can commit out of order, so each sync
+    # re-reads a small window behind the cursor; replays are idempotent.
+    # Rows are added in the caller's transaction; on_commit callbacks wait
+    # for it to commit and are dropped if it rolls back.
+    def __init__(self, db, model, lookback: int = 256):
+        from sqlalchemy import event
+        self.db = db
+        self.model = model
+        self.lookback = lookback
+        event.listen(db.session, 'after_commit', self._committed)
+        event.listen(db.session, 'after_transaction_end', self._ended)
+
+    def add(self, key: str, expires_at: datetime, reason: str, on_commit=None) -> bool:
+        from sqlalchemy.exc import IntegrityError
+        try:
+            with self.db.session.begin_nested():
+                self.db.session.add(self.model(jti=key, expires_at=expires_at, reason=reason))
+            added = True
+        except IntegrityError:
+            added = False
+        if on_commit is not None:
+            self.db.session.info.setdefault(PENDING_INFO_KEY, []).append(on_commit)
+        return added
+
+    def _committed(self, session):
+        for callback in session.info.pop(PENDING_INFO_KEY, ()):
+            callback()
+
+    def _ended(self, session, transaction):
+        if transaction.parent is None:
+            session.info.pop(PENDING_INFO_KEY, None)
+
+    def since(self, cursor: int) -> list:
+        model = self.model
+        return self.db.session.query(model.id, model.jti, model.expires_at, model.reason).filter(
+            model.id > cursor - self.lookback,
+            model.expires_at > datetime.utcnow()
+        ).order_by(model.id).all()
+
+    def purge_expired(self, now: datetime) -> int:
+        deleted = self.model.query.filter(self.model.expires_at <= now).delete(synchronize_session=False)
+        self.db.session.commit()
+        return deleted
+
+
+class TokenDenylist:
+    # Lookups are a dict probe against a local mirror of the shared store;
+    # the store itself is only read once per sync_interval per process.
+    def __init__(self, backend, sync_interval: float = 2.0, prune_interval: float = 60.0):
+        self.backend = backend
+        self.sync_interval = sync_interval
+        self.prune_interval = prune_interval
+        self._revoked = {}
+        self._cursor = 0
+        self._next_sync = 0.0
+        self._next_prune = time.monotonic() + prune_interval
+        self._sync_lock = threading.Lock()
+
+    def revoke(self, key: str, expires_at: datetime, reason: str = 'revoked') -> bool:
+        # The local mirror takes the entry once it is committed, so a rolled
+        # back revocation isn't enforced by this process alone.
+        entry = (_epoch(expires_at), reason)
+
+        def mirror():
+            self._revoked[key] = entry
+        return self.backend.add(key, expires_at, reason, on_commit=mirror)
+
+    def reason(self, key: str) -> str:
+        entry = self._revoked.get(key)
+        if entry is None or entry[0] < time.time():
+            return None
+        return entry[1]
+
+    def is_revoked(self, *keys) -> bool:
+        if time.monotonic() >= self._next_sync:
+            self.sync()
+        now = time.time()
+        for key in keys:
+            entry = self._revoked.get(key)
+            if entry is not None and entry[0] >= now:
+                return True
+        return False
+
+    def sync(self):
+        if not self._sync_lock.acquire(blocking=False):
+            return
+        try:
+            self._next_sync = time.monotonic() + self.sync_interval
+            for entry_id, key, expires_at, reason in self.backend.since(self._cursor):
+                self._revoked[key] = (_epoch(expires_at), reason)
+                self._cursor = max(self._cursor, entry_id)
+            if time.monotonic() >= self._next_prune:
+                self._next_prune = time.monotonic() + self.prune_interval
+                now = time.time()
+                self._revoked = {k: v for k, v in self._revoked.items() if v[0] >= now}
+        finally:
+            self._sync_lock.release()
@@ -0,0 +1,142 @@
+import atexit
+import logging
+import os
+import threading
+from collections import deque
+from datetime import date
+
+logger = logging.getLogger('arivai.usage')
+
+
+class UsageLedger:
+    # Buffers one row per upstream model call and writes them in batches from
+    # a background thread, so accounting never adds a write to the request.
+    # The thread is started lazily in each process: with a preloaded app,
+    # threads started in the gunicorn master don't survive the fork.
+    def __init__(self, flask_app, write_rows, interval: float = 5.0, batch_size: int = 500,
+                 max_buffer: int = 50000, after_flush=None):
+        self.app = flask_app
+        self.write_rows = write_rows
+        # called with the rows written after every periodic flush, e.g.
+        # UsageBudget.flushed
+        self.after_flush = after_flush
+        self.interval = interval
+        self.batch_size = batch_size
+        self._buffer = deque(maxlen=max_buffer)
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._pid = None
+        self.dropped = 0
+
+    def record(self, **row):
+        with self._lock:
+            if len(self._buffer) == self._buffer.maxlen:
+                self.dropped += 1
+            self._buffer.append(row)
+            pending = len(self._buffer)
+        if self._pid != os.getpid():
+            self._start()
+        if pending >= self.batch_size:
+            self._wake.set()
+
+    def _start(self):
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+        threading.Thread(target=self._loop, name='usage-ledger', daemon=True).start()
+        atexit.register(self.flush)
+
+    def _loop(self):
+        while True:
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            written = self._flush()
+            if self.after_flush is not None:
+                with self.app.app_context():
+                    try:
+                        self.after_flush(written)
+                    except Exception:
+                        logger.exception('usage.after_flush_failed')
+
+    def flush(self) -> int:
+        return len(self._flush())
+
+    def _flush(self) -> list:
+        written = []
+        while True:
+            with self._lock:
+                rows = [self._buffer.popleft() for _ in range(min(self.batch_size, len(self._buffer)))]
+            if not rows:
+                return written
+            with self.app.app_context():
+                try:
+                    self.write_rows(rows)
+                    written.extend(rows)
+                except Exception:
+                    logger.exception('usage.flush_failed', extra={"droppedRows": len(rows)})
+                    return written
+
+
+class UsageBudget:
+    # Per-user daily token budgets checked against in-process counters: the
+    # user's total in the ledger table as last read, plus what this process
+    # has charged since that the ledger hasn't written yet. A user's first
+    # check reads their total. After each ledger flush, `flushed` moves the
+    # written rows out of the local part and re-reads every tracked total in
+    # one query, from the ledger thread, so other workers' spending shows up
+    # within a flush interval without the request path querying again.
+    def __init__(self, daily_tokens: int, load_used):
+        # load_used(user_ids, day) -> {user_id: tokens}
+        self.daily_tokens = daily_tokens
+        self.load_used = load_used
+        self._day = None
+        self._stored = {}
+        self._unwritten = {}
+        self._lock = threading.Lock()
+
+    def _roll(self, today: date):
+        if self._day != today:
+            self._day, self._stored, self._unwritten = today, {}, {}
+
+    def allow(self, user_id: int, today: date = None) -> bool:
+        if not self.daily_tokens:
+            return True
+        today = today or date.today()
+        with self._lock:
+            self._roll(today)
+            stored = self._stored.get(user_id)
+        if stored is None:
+            seeded = self.load_used([user_id], today).get(user_id, 0)
+            with self._lock:
+                self._roll(today)
+                stored = self._stored.setdefault(user_id, seeded)
+        with self._lock:
+            return stored + self._unwritten.get(user_id, 0) < self.daily_tokens
+
+    def charge(self, user_id: int, tokens: int, today: date = None):
+        if not self.daily_tokens or not tokens:
+            return
+        with self._lock:
+            self._roll(today or date.today())
+            self._unwritten[user_id] = self._unwritten.get(user_id, 0) + tokens
+
+    def flushed(self, rows: list):
+        # rows are the ledger rows just written (user_id, total_tokens, created_at)
+        if not self.daily_tokens:
+            return
+        with self._lock:
+            day, user_ids = self._day, list(self._stored)
+        totals = self.load_used(user_ids, day) if user_ids else {}
+        with self._lock:
+            if self._day != day:
+                return
+            # re-read after the write, so these rows are in the new totals
+            for row in rows:
+                user_id = row["user_id"]
+                if row["total_tokens"] and row["created_at"].date() == day and user_id in self._unwritten:
+                    self._unwritten[user_id] -= row["total_tokens"]
+                    if self._unwritten[user_id] <= 0:
+                        del self._unwritten[user_id]
+            for user_id in user_ids:
+                self._stored[user_id] = totals.get(user_id, 0)
@@ -0,0 +1,90 @@
+from sqlalchemy import insert, update
+from sqlalchemy.exc import IntegrityError
+
+
+class WriteBatch:
+    # Collects a request's writes and sends them together at commit: one
+    # multi-row INSERT ... RETURNING per table, one executemany UPDATE per
+    # table and one upsert per table, after flushing any ORM changes.
+    def __init__(self, session):
+        self.session = session
+        self._inserts = {}
+        self._updates = {}
+        self._upserts = {}
+
+    def insert(self, model, **values) -> dict:
+        row = dict(values)
+        self._inserts.setdefault(model, []).append(row)
+        return row
+
+    def update(self, model, **values):
+        self._updates.setdefault(model, []).append(values)
+
+    def upsert(self, model, key: tuple, increment: tuple = (), **values):
+        # Columns named in `increment` are added to an existing row's values
+        # instead of replacing them, in the same statement, so concurrent
+        # upserts of one key can't lose counts or race on the insert.
+        self._upserts.setdefault((model, key, increment), []).append(values)
+
+    def flush(self):
+        self.session.flush()
+        for model, rows in self._inserts.items():
+            result = self.session.execute(
+                insert(model).returning(model.id, sort_by_parameter_order=True),
+                rows
+            )
+            for row, (row_id,) in zip(rows, result):
+                row["id"] = row_id
+        for model, rows in self._updates.items():
+            self.session.execute(update(model), rows)
+        for (model, key, increment), rows in self._upserts.items():
+            self._execute_upsert(model, key, increment, rows)
+        self._inserts, self._updates, self._upserts = {}, {}, {}
+
+    def _execute_upsert(self, model, key: tuple, increment: tuple, rows: list):
+        dialect = self.session.get_bind(mapper=model).dialect.name
+        if dialect == 'postgresql':
+            from sqlalchemy.dialects.postgresql import insert as dialect_insert
+        elif dialect == 'sqlite':
+            from sqlalchemy.dialects.sqlite import insert as dialect_insert
+        elif increment:
+            for values in rows:
+                self._increment_row(model, key, increment, values)
+            return
+        else:
+            for values in rows:
+                self.session.merge(model(**values))
+            return
+        table = model.__table__
+        stmt = dialect_insert(model).values(rows)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=list(key),
+            set_={
+                name: table.c[name] + stmt.excluded[name] if name in increment else stmt.excluded[name]
+                for name in rows[0] if name not in key
+            }
+        )
+        self.session.execute(stmt)
+
+    def _increment_row(self, model, key: tuple, increment: tuple, values: dict):
+        # Without ON CONFLICT: update in place, else insert; an insert that
+        # loses the race to another writer falls back to the update.
+        table = model.__table__
+        matches = [table.c[name] == values[name] for name in key]
+        changes = {
+            name: table.c[name] + value if name in increment else value
+            for name, value in values.items() if name not in key
+        }
+        while True:
+            if self.session.execute(update(table).where(*matches).values(changes)).rowcount:
+                return
+            try:
+                with self.session.begin_nested():
+                    self.session.execute(insert(table).values(values))
+                return
+            except IntegrityError:
+                continue
+
+    def commit(self):
+        self.flush()
+        self.session.commit()
@@ -0,0 +1,3 @@
+from app import app
+
+# gunicorn -c backend/gunicorn.conf.py --chdir backend wsgi:app
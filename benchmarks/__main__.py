@@ -0,0 +1,103 @@
+import argparse
+import json
+import platform
+import sys
+import time
+from datetime import datetime
+
+from benchmarks.compare import compare, format_table, load
+from benchmarks.runner import SCENARIOS, HttpTarget, InProcessTarget, run_scenario
+
+
+def run(args) -> int:
+    from benchmarks.app_loader import load_app
+    from benchmarks.seed import seed
+
+    app_module = load_app(args.database_url, args.gemini_latency, args.gemini_jitter)
+
+    started = time.perf_counter()
+    dataset = seed(app_module, users=args.users, years=args.years, symptoms_per_cycle=args.symptoms_per_cycle,
+                   chat_messages=args.chat_messages, catalog_items=args.catalog_items)
+    seed_seconds = time.perf_counter() - started
+    user_ids = dataset.pop("userIds")
+    print(f"seeded {dataset} in {seed_seconds:.1f}s", file=sys.stderr)
+
+    with app_module.app.app_context():
+        tokens = [app_module.create_access_token(identity=str(user_id)) for user_id in user_ids[:args.active_users]]
+
+    target = HttpTarget(args.url) if args.url else InProcessTarget(app_module)
+    scenarios = args.scenario or list(SCENARIOS)
+    results = {}
+    for name in scenarios:
+        requests = args.chat_requests if name == "chat_send" else args.requests
+        results[name] = run_scenario(target, name, tokens, requests, args.concurrency)
+        r = results[name]
+        print(f"{name:<22} p50={r['p50Ms']:>8.2f}ms p99={r['p99Ms']:>8.2f}ms "
+              f"{r['throughputRps']:>8.1f} req/s errors={r['errors']}", file=sys.stderr)
+
+    report = {
+        "label": args.label,
+        "createdAt": datetime.utcnow().isoformat(),
+        "python": platform.python_version(),
+        "target": args.url or "in-process",
+        "database": app_module.app.config['SQLALCHEMY_DATABASE_URI'].split('@')[-1],
+        "concurrency": args.concurrency,
+        "geminiLatencySeconds": args.gemini_latency,
+        "dataset": dataset,
+        "scenarios": results,
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+    else:
+        print(output)
+    return 0
+
+
+def run_compare(args) -> int:
+    comparison = compare(load(args.before), load(args.after), args.threshold)
+    print(format_table(comparison))
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(comparison, f, indent=2)
+    return 1 if comparison["regressions"] and args.fail_on_regression else 0
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks", description="ARIVAI API benchmarks")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = sub.add_parser("run", help="seed a database and measure endpoint latency")
+    run_parser.add_argument("--label", default="run")
+    run_parser.add_argument("--database-url", help="defaults to a temporary SQLite file; point at a local Postgres to benchmark against it")
+    run_parser.add_argument("--url", help="benchmark a running server instead of the in-process app (it must share --database-url)")
+    run_parser.add_argument("--users", type=int, default=2000)
+    run_parser.add_argument("--years", type=int, default=3)
+    run_parser.add_argument("--symptoms-per-cycle", type=int, default=6)
+    run_parser.add_argument("--chat-messages", type=int, default=100)
+    run_parser.add_argument("--catalog-items", type=int, default=200)
+    run_parser.add_argument("--active-users", type=int, default=500)
+    run_parser.add_argument("--requests", type=int, default=500)
+    run_parser.add_argument("--chat-requests", type=int, default=100)
+    run_parser.add_argument("--concurrency", type=int, default=8)
+    run_parser.add_argument("--gemini-latency", type=float, default=0.8)
+    run_parser.add_argument("--gemini-jitter", type=float, default=0.2)
+    run_parser.add_argument("--scenario", action="append", choices=list(SCENARIOS))
+    run_parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    run_parser.set_defaults(func=run)
+
+    compare_parser = sub.add_parser("compare", help="compare two JSON reports")
+    compare_parser.add_argument("before")
+    compare_parser.add_argument("after")
+    compare_parser.add_argument("--threshold", type=float, default=0.10)
+    compare_parser.add_argument("--json", help="also write the comparison as JSON")
+    compare_parser.add_argument("--fail-on-regression", action="store_true")
+    compare_parser.set_defaults(func=run_compare)
+
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
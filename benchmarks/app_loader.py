@@ -0,0 +1,25 @@
+import os
+import pathlib
+import sys
+import tempfile
+
+BACKEND_DIR = pathlib.Path(__file__).parent.parent / 'backend'
+
+
+def load_app(database_url: str = None, gemini_latency: float = 0.8, gemini_jitter: float = 0.2):
+    if not database_url:
+        db_path = os.path.join(tempfile.mkdtemp(prefix='arivai-bench-'), 'bench.db')
+        database_url = f"sqlite:///{db_path}"
+
+    # app.py reads its configuration at import time
+    os.environ['DATABASE_URL'] = database_url
+    os.environ['GEMINI_API_KEY'] = 'benchmark-fake-key'
+    if str(BACKEND_DIR) not in sys.path:
+        sys.path.insert(0, str(BACKEND_DIR))
+
+    from google import genai
+    from benchmarks.fake_gemini import fake_client_factory
+    genai.Client = fake_client_factory(gemini_latency, gemini_jitter)
+
+    import app as app_module
+    return app_module
@@ -0,0 +1,40 @@
+import json
+
+METRICS = ("p50Ms", "p99Ms", "throughputRps")
+
+
+def load(path: str) -> dict:
+    with open(path) as f:
+        return json.load(f)
+
+
+def compare(before: dict, after: dict, threshold: float = 0.10) -> dict:
+    rows = {}
+    regressions = []
+    for name, after_result in after["scenarios"].items():
+        before_result = before["scenarios"].get(name)
+        if not before_result:
+            continue
+        row = {}
+        for metric in METRICS:
+            old, new = before_result[metric], after_result[metric]
+            change = (new - old) / old if old else 0.0
+            row[metric] = {"before": old, "after": new, "change": round(change, 4)}
+            # latency regresses upward, throughput regresses downward
+            worse = change < -threshold if metric == "throughputRps" else change > threshold
+            if worse:
+                regressions.append(f"{name}.{metric}")
+        rows[name] = row
+    return {"scenarios": rows, "regressions": regressions, "threshold": threshold}
+
+
+def format_table(comparison: dict) -> str:
+    lines = [f"{'scenario':<22}" + "".join(f"{metric:>26}" for metric in METRICS)]
+    for name, row in comparison["scenarios"].items():
+        cells = "".join(
+            f"{row[m]['before']:>9.1f} -> {row[m]['after']:>8.1f} {row[m]['change']:>+6.0%}" for m in METRICS
+        )
+        lines.append(f"{name:<22}{cells}")
+    if comparison["regressions"]:
+        lines.append("regressions: " + ", ".join(comparison["regressions"]))
+    return "\n".join(lines)
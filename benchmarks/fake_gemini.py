@@ -0,0 +1,58 @@
+import asyncio
+import random
+import time
+
+
+class FakeUsage:
+    def __init__(self, prompt_tokens: int, output_tokens: int):
+        self.prompt_token_count = prompt_tokens
+        self.candidates_token_count = output_tokens
+        self.total_token_count = prompt_tokens + output_tokens
+
+
+class FakeResponse:
+    def __init__(self, prompt: str):
+        self.text = (
+            "That sounds really uncomfortable. A warm compress, gentle stretching and "
+            "staying hydrated can help, and magnesium-rich foods like bananas and nuts "
+            "are a good choice today. If the pain feels severe or unusual, please check "
+            "in with a healthcare professional."
+        )
+        self.usage_metadata = FakeUsage(len(prompt) // 4, len(self.text) // 4)
+
+
+class FakeModels:
+    def __init__(self, latency: float, jitter: float):
+        self.latency = latency
+        self.jitter = jitter
+
+    def _delay(self) -> float:
+        return max(0.0, self.latency + random.uniform(-self.jitter, self.jitter))
+
+    def generate_content(self, model: str, contents: str, **kwargs):
+        time.sleep(self._delay())
+        return FakeResponse(contents)
+
+
+class FakeAsyncModels(FakeModels):
+    async def generate_content(self, model: str, contents: str, **kwargs):
+        await asyncio.sleep(self._delay())
+        return FakeResponse(contents)
+
+
+class FakeAio:
+    def __init__(self, latency: float, jitter: float):
+        self.models = FakeAsyncModels(latency, jitter)
+
+
+class FakeGeminiClient:
+    latency = 0.8
+    jitter = 0.2
+
+    def __init__(self, api_key: str = None, **kwargs):
+        self.models = FakeModels(self.latency, self.jitter)
+        self.aio = FakeAio(self.latency, self.jitter)
+
+
+def fake_client_factory(latency: float, jitter: float):
+    return type('FakeGeminiClient', (FakeGeminiClient,), {'latency': latency, 'jitter': jitter})
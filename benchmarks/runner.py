@@ -0,0 +1,110 @@
+import json
+import random
+import threading
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+
+SCENARIOS = {
+    "auth_user": ("GET", "/api/auth/user", None),
+    "insights": ("GET", "/api/insights", None),
+    "chat_send": ("POST", "/api/chat", {"content": "What should I eat to help with cramps?"}),
+    "chat_history": ("GET", "/api/chat", None),
+    "cycles": ("GET", "/api/cycles", None),
+    "symptoms": ("GET", "/api/symptoms", None),
+    "symptom_stats": ("GET", "/api/symptoms/stats?days=365", None),
+    "favorites": ("GET", "/api/favorites", None),
+    "onboarding": ("GET", "/api/onboarding", None),
+    "recipes": ("GET", "/api/recipes?phase=Luteal", None),
+    "meditation_videos": ("GET", "/api/meditation-videos?phase=Menstrual", None),
+    "educational_content": ("GET", "/api/educational-content?category=PMS", None),
+    "dashboard": ("GET", "/api/dashboard", None),
+    "symptom_create": ("POST", "/api/symptoms", {"date": date.today().isoformat(), "symptomType": "cramps", "severity": 2}),
+}
+
+
+def percentile(sorted_values: list, pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    rank = max(0, min(len(sorted_values) - 1, int(round(pct / 100 * len(sorted_values))) - 1))
+    return sorted_values[rank]
+
+
+def summarize(latencies: list, errors: int, elapsed: float) -> dict:
+    latencies = sorted(latencies)
+    count = len(latencies)
+    return {
+        "requests": count,
+        "errors": errors,
+        "elapsedSeconds": round(elapsed, 4),
+        "throughputRps": round(count / elapsed, 2) if elapsed else 0.0,
+        "meanMs": round(sum(latencies) / count * 1000, 3) if count else 0.0,
+        "p50Ms": round(percentile(latencies, 50) * 1000, 3),
+        "p90Ms": round(percentile(latencies, 90) * 1000, 3),
+        "p99Ms": round(percentile(latencies, 99) * 1000, 3),
+        "maxMs": round(latencies[-1] * 1000, 3) if count else 0.0,
+    }
+
+
+class InProcessTarget:
+    def __init__(self, app_module):
+        self.app = app_module.app
+        self._local = threading.local()
+
+    def request(self, method: str, path: str, body, token: str) -> int:
+        client = getattr(self._local, 'client', None)
+        if client is None:
+            client = self._local.client = self.app.test_client()
+        response = client.open(path, method=method, json=body, headers={"Authorization": f"Bearer {token}"})
+        response.close()
+        return response.status_code
+
+
+class HttpTarget:
+    def __init__(self, base_url: str):
+        self.base_url = base_url.rstrip('/')
+
+    def request(self, method: str, path: str, body, token: str) -> int:
+        data = json.dumps(body).encode('utf-8') if body is not None else None
+        req = urllib.request.Request(self.base_url + path, data=data, method=method, headers={
+            "Authorization": f"Bearer {token}",
+            "Content-Type": "application/json",
+        })
+        try:
+            with urllib.request.urlopen(req, timeout=60) as response:
+                response.read()
+                return response.status
+        except urllib.error.HTTPError as e:
+            return e.code
+
+
+def run_scenario(target, name: str, tokens: list, requests: int, concurrency: int, warmup: int = 10) -> dict:
+    method, path, body = SCENARIOS[name]
+    rng = random.Random(name)
+
+    for _ in range(warmup):
+        target.request(method, path, body, rng.choice(tokens))
+
+    latencies = []
+    errors = 0
+    lock = threading.Lock()
+
+    def one(_):
+        nonlocal errors
+        token = rng.choice(tokens)
+        started = time.perf_counter()
+        try:
+            status = target.request(method, path, body, token)
+        except Exception:
+            status = 599
+        elapsed = time.perf_counter() - started
+        with lock:
+            latencies.append(elapsed)
+            if status >= 400:
+                errors += 1
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(one, range(requests)))
+    return summarize(latencies, errors, time.perf_counter() - started)
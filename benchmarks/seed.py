@@ -0,0 +1,135 @@
+import random
+from datetime import date, datetime, timedelta
+
+import bcrypt
+
+SYMPTOM_TYPES = [
+    'cramps', 'bloating', 'headache', 'fatigue', 'mood_swing', 'breast_tenderness',
+    'acne', 'cravings', 'nausea', 'back_pain', 'insomnia', 'anxiety', 'irritability',
+]
+PHASES = ['Menstrual', 'Follicular', 'Ovulation', 'Luteal']
+CATEGORIES = ['PMS', 'Pregnancy', 'Menopause', 'Sexual Wellness', 'Nutrition', 'Sleep']
+CHAT_PROMPTS = [
+    "Why do I get so tired before my period?",
+    "What should I eat to help with cramps?",
+    "Is it normal for my cycle to be 35 days?",
+    "I feel anxious this week, any tips?",
+    "Which exercises are good during my luteal phase?",
+]
+BATCH_SIZE = 5000
+
+
+def _insert(app_module, model, rows):
+    db = app_module.db
+    for start in range(0, len(rows), BATCH_SIZE):
+        db.session.execute(db.insert(model), rows[start:start + BATCH_SIZE])
+    db.session.commit()
+
+
+def seed(app_module, users: int = 2000, years: int = 3, symptoms_per_cycle: int = 6,
+         chat_messages: int = 100, catalog_items: int = 200, seed_value: int = 42) -> dict:
+    rng = random.Random(seed_value)
+    m = app_module
+    today = date.today()
+    # bcrypt is deliberately slow; every benchmark user shares one hash
+    password_hash = bcrypt.hashpw(b'benchmark', bcrypt.gensalt(rounds=4)).decode('utf-8')
+
+    with m.app.app_context():
+        m.db.drop_all()
+        m.db.create_all()
+
+        _insert(m, m.User, [{
+            "email": f"bench{i}@arivai.test",
+            "password_hash": password_hash,
+            "first_name": f"Bench{i}",
+            "last_name": "User",
+            "date_of_birth": today - timedelta(days=rng.randint(18, 52) * 365),
+            "avg_cycle_length": rng.randint(24, 35),
+            "avg_period_length": rng.randint(3, 7),
+            "created_at": datetime.utcnow(),
+        } for i in range(users)])
+        user_ids = [row[0] for row in m.db.session.execute(m.db.select(m.User.id).order_by(m.User.id))]
+
+        cycles, symptoms, chat = [], [], []
+        for user_id in user_ids:
+            start = today - timedelta(days=years * 365)
+            while start <= today:
+                length = rng.randint(24, 36)
+                period = rng.randint(3, 7)
+                cycles.append({
+                    "user_id": user_id,
+                    "start_date": start,
+                    "end_date": start + timedelta(days=period - 1),
+                    "cycle_length": length,
+                    "period_length": period,
+                    "notes": None,
+                    "created_at": datetime.utcnow(),
+                })
+                for _ in range(symptoms_per_cycle):
+                    symptoms.append({
+                        "user_id": user_id,
+                        "date": start + timedelta(days=rng.randrange(length)),
+                        "symptom_type": rng.choice(SYMPTOM_TYPES),
+                        "severity": rng.randint(1, 5),
+                        "notes": None,
+                        "created_at": datetime.utcnow(),
+                    })
+                start += timedelta(days=length)
+
+            sent_at = datetime.utcnow() - timedelta(days=years * 365)
+            step = timedelta(days=years * 365) / max(chat_messages, 1)
+            for i in range(chat_messages):
+                chat.append({
+                    "user_id": user_id,
+                    "role": 'user' if i % 2 == 0 else 'assistant',
+                    "content": rng.choice(CHAT_PROMPTS) if i % 2 == 0 else "Here is some gentle guidance for this phase. " * 8,
+                    "cycle_phase": rng.choice(PHASES),
+                    "created_at": sent_at + step * i,
+                })
+
+        _insert(m, m.Cycle, cycles)
+        _insert(m, m.Symptom, symptoms)
+        _insert(m, m.ChatHistory, chat)
+
+        # bulk inserts bypass the request path, so build rollups the way the backfill command does
+        for user_id in user_ids:
+            m.rebuild_symptom_rollups(user_id)
+        m.db.session.commit()
+
+        _insert(m, m.Recipe, [{
+            "title": f"Recipe {i}",
+            "description": "A nourishing recipe for your cycle.",
+            "image_url": "https://images.unsplash.com/photo-1546069901-ba9599a7e63c?w=400",
+            "ingredients": ["spinach", "banana", "almond milk", "chia seeds"],
+            "instructions": "Combine all ingredients and serve. " * 10,
+            "phase": PHASES[i % len(PHASES)],
+            "category": rng.choice(['Smoothie', 'Bowl', 'Snack', 'Beverage']),
+            "prep_time": rng.randint(5, 45),
+            "calories": rng.randint(80, 600),
+        } for i in range(catalog_items)])
+        _insert(m, m.MeditationVideo, [{
+            "title": f"Meditation {i}",
+            "description": "A calming guided practice.",
+            "url": "https://www.youtube.com/watch?v=inpok4MKVLM",
+            "thumbnail_url": "https://img.youtube.com/vi/inpok4MKVLM/hqdefault.jpg",
+            "category": rng.choice(['Yoga', 'Sleep', 'Breathing', 'Pain Relief']),
+            "duration_seconds": rng.randint(300, 1800),
+            "phase": PHASES[i % len(PHASES)],
+        } for i in range(catalog_items)])
+        _insert(m, m.EducationalContent, [{
+            "title": f"Article {i}",
+            "summary": "Learn more about your cycle.",
+            "body": "Understanding your body helps you care for it. " * 120,
+            "category": CATEGORIES[i % len(CATEGORIES)],
+            "phase": PHASES[i % len(PHASES)],
+            "image_url": "https://images.unsplash.com/photo-1559757175-5700dde675bc?w=400",
+        } for i in range(catalog_items)])
+
+    return {
+        "users": len(user_ids),
+        "cycles": len(cycles),
+        "symptoms": len(symptoms),
+        "chatMessages": len(chat),
+        "catalogItems": catalog_items * 3,
+        "userIds": user_ids,
+    }
@@ -39,7 +39,7 @@ export function SymptomLogger({ onClose }: SymptomLoggerProps) {
   const queryClient = useQueryClient();
 
   const logSymptomMutation = useMutation({
-    mutationFn: async (symptoms: { symptomType: SymptomType; severity: number; notes: string }[]) => {
+    mutationFn: async (symptoms: { date: string; symptomType: SymptomType; severity: number; notes: string }[]) => {
       const response = await apiRequest("POST", "/api/symptoms", { symptoms });
       return response;
     },
@@ -81,7 +81,9 @@ export function SymptomLogger({ onClose }: SymptomLoggerProps) {
       return;
     }
 
+    const date = new Date().toISOString().split("T")[0];
     const symptoms = selectedSymptoms.map((symptom) => ({
+      date,
       symptomType: symptom,
       severity,
       notes,
@@ -14,6 +14,15 @@ export function setTokens(accessToken: string, refreshToken: string): void {
   localStorage.setItem(REFRESH_TOKEN_KEY, refreshToken);
 }
 
+// Profile and onboarding saves return an access token carrying the new
+// profile; keep it so later requests don't send the old one.
+export async function storeReturnedAccessToken(response: Response): Promise<void> {
+  const data = await response.clone().json().catch(() => null);
+  if (data?.accessToken) {
+    localStorage.setItem(TOKEN_KEY, data.accessToken);
+  }
+}
+
 export function clearTokens(): void {
   localStorage.removeItem(TOKEN_KEY);
   localStorage.removeItem(REFRESH_TOKEN_KEY);
@@ -27,7 +36,20 @@ export function isUnauthorizedError(error: Error): boolean {
   return /^401: .*Unauthorized/.test(error.message);
 }
 
-export async function refreshAccessToken(): Promise<string | null> {
+// Parallel requests that all get a 401 share one refresh; sending the same
+// refresh token twice looks like token theft to the server.
+let refreshInFlight: Promise<string | null> | null = null;
+
+export function refreshAccessToken(): Promise<string | null> {
+  if (!refreshInFlight) {
+    refreshInFlight = doRefreshAccessToken().finally(() => {
+      refreshInFlight = null;
+    });
+  }
+  return refreshInFlight;
+}
+
+async function doRefreshAccessToken(): Promise<string | null> {
   const refreshToken = getRefreshToken();
   if (!refreshToken) return null;
 
@@ -43,6 +65,10 @@ export async function refreshAccessToken(): Promise<string | null> {
     if (response.ok) {
       const data = await response.json();
       localStorage.setItem(TOKEN_KEY, data.accessToken);
+      // refresh tokens are single-use; reusing the old one revokes the session
+      if (data.refreshToken) {
+        localStorage.setItem(REFRESH_TOKEN_KEY, data.refreshToken);
+      }
       return data.accessToken;
     }
   } catch (error) {
@@ -11,6 +11,7 @@ import { Textarea } from "@/components/ui/textarea";
 import { Progress } from "@/components/ui/progress";
 import { useToast } from "@/hooks/use-toast";
 import { apiRequest } from "@/lib/queryClient";
+import { storeReturnedAccessToken } from "@/lib/authUtils";
 import { Heart, Calendar, Activity, Sparkles, ArrowRight, ArrowLeft, Check } from "lucide-react";
 
 interface OnboardingData {
@@ -50,6 +51,7 @@ export default function Onboarding() {
   const saveMutation = useMutation({
     mutationFn: async (onboardingData: OnboardingData) => {
       const response = await apiRequest("POST", "/api/onboarding", onboardingData);
+      await storeReturnedAccessToken(response);
       return response;
     },
     onSuccess: () => {
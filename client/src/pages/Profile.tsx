@@ -10,7 +10,7 @@ import { Avatar, AvatarFallback, AvatarImage } from "@/components/ui/avatar";
 import { Separator } from "@/components/ui/separator";
 import { apiRequest } from "@/lib/queryClient";
 import { useToast } from "@/hooks/use-toast";
-import { isUnauthorizedError } from "@/lib/authUtils";
+import { isUnauthorizedError, storeReturnedAccessToken } from "@/lib/authUtils";
 import type { User } from "@shared/schema";
 import { User as UserIcon, Calendar, Save, LogOut } from "lucide-react";
 
@@ -42,6 +42,7 @@ export default function Profile() {
   const updateProfileMutation = useMutation({
     mutationFn: async (data: typeof formData) => {
       const response = await apiRequest("PATCH", "/api/user/profile", data);
+      await storeReturnedAccessToken(response);
       return response;
     },
     onSuccess: () => {
@@ -1,6 +1,8 @@
 import { build as esbuild } from "esbuild";
 import { build as viteBuild } from "vite";
-import { rm, readFile } from "fs/promises";
+import { rm, readFile, readdir, writeFile } from "fs/promises";
+import path from "path";
+import { brotliCompressSync, gzipSync, constants as zlibConstants } from "zlib";
 
 // server deps to bundle to reduce openat(2) syscalls
 // which helps cold start times
@@ -32,12 +34,43 @@ const allowlist = [
   "zod-validation-error",
 ];
 
+// the Flask static handler serves these .br/.gz siblings directly instead of
+// compressing on every request
+const compressibleExtensions = new Set([
+  ".html", ".js", ".css", ".svg", ".json", ".txt", ".map", ".webmanifest",
+]);
+
+async function precompress(dir: string) {
+  for (const entry of await readdir(dir, { withFileTypes: true })) {
+    const file = path.join(dir, entry.name);
+    if (entry.isDirectory()) {
+      await precompress(file);
+      continue;
+    }
+    if (!compressibleExtensions.has(path.extname(entry.name))) continue;
+
+    const contents = await readFile(file);
+    if (contents.length < 1024) continue;
+
+    await writeFile(`${file}.gz`, gzipSync(contents, { level: 9 }));
+    await writeFile(
+      `${file}.br`,
+      brotliCompressSync(contents, {
+        params: { [zlibConstants.BROTLI_PARAM_QUALITY]: 11 },
+      }),
+    );
+  }
+}
+
 async function buildAll() {
   await rm("dist", { recursive: true, force: true });
 
   console.log("building client...");
   await viteBuild();
 
+  console.log("precompressing client assets...");
+  await precompress("dist/public");
+
   console.log("building server...");
   const pkg = JSON.parse(await readFile("package.json", "utf-8"));
   const allDeps = [
@@ -22,17 +22,27 @@ function startFlask(): Promise<void> {
       stdio: ['pipe', 'pipe', 'pipe'],
     });
 
-    flaskProcess.stdout?.on('data', (data) => {
-      const output = data.toString();
-      if (output.includes('Running on')) {
+    // gunicorn ("Listening at") and the Flask dev server ("Running on")
+    // both log to stderr, so either stream can announce readiness.
+    let ready = false;
+    const checkReady = (output: string) => {
+      if (!ready && (output.includes('Running on') || output.includes('Listening at'))) {
+        ready = true;
         console.log('Flask backend started successfully');
         resolve();
       }
+    };
+
+    flaskProcess.stdout?.on('data', (data) => {
+      const output = data.toString();
+      checkReady(output);
       console.log(`[Flask] ${output.trim()}`);
     });
 
     flaskProcess.stderr?.on('data', (data) => {
-      console.error(`[Flask Error] ${data.toString().trim()}`);
+      const output = data.toString();
+      checkReady(output);
+      console.error(`[Flask Error] ${output.trim()}`);
     });
 
     flaskProcess.on('close', (code) => {